@@ -0,0 +1,45 @@
+import numpy as np
+
+def transform_sweeps(sweeps, transforms):
+    '''
+    Applies one rigid transform per sweep in a single batched matmul.
+
+    Args:
+        sweeps: list of K (N_k, C) arrays, the first three columns being x,y,z
+        transforms: (K, 4, 4) array mapping each sweep into the target frame
+    Returns:
+        (sum N_k, C) float32 array, extra columns (e.g. reflectance) carried through
+    '''
+    counts = np.array(list(map(len, sweeps)))
+    if len(sweeps) == 0 or counts.sum() == 0:
+        channels = sweeps[0].shape[1] if len(sweeps) else 3
+        return np.zeros((0, channels), dtype=np.float32)
+    padded = np.zeros((len(sweeps), counts.max(), 3))
+    for k, sweep in enumerate(sweeps):
+        padded[k, :counts[k]] = sweep[:, :3]
+    transforms = np.asarray(transforms, dtype=np.float64)
+    moved = padded @ transforms[:, :3, :3].transpose(0, 2, 1) + transforms[:, None, :3, 3]
+
+    valid = np.arange(counts.max())[None, :] < counts[:, None]
+    points = np.concatenate(sweeps, axis=0).astype(np.float32)
+    points[:, :3] = moved[valid]
+    return points
+
+def voxel_downsample(points, voxel_size):
+    '''
+    Keeps the first point of every occupied voxel, hashing integer voxel
+    coordinates into a single int64 key. Earlier rows win, so put the points
+    to preserve (e.g. the current sweep) first.
+    '''
+    if voxel_size is None or voxel_size <= 0 or len(points) == 0:
+        return points
+    voxels = np.floor(points[:, :3] / voxel_size).astype(np.int64)
+    voxels -= voxels.min(axis=0)
+    dims = voxels.max(axis=0) + 1
+    keys = (voxels[:, 0] * dims[1] + voxels[:, 1]) * dims[2] + voxels[:, 2]
+    _, first = np.unique(keys, return_index=True)
+    return points[np.sort(first)]
+
+def accumulate_sweeps(sweeps, transforms, voxel_size=None):
+    '''Transforms sweeps into a common frame, concatenates and voxel-deduplicates them'''
+    return voxel_downsample(transform_sweeps(sweeps, transforms), voxel_size)
@@ -0,0 +1,164 @@
+import os
+import glob
+import json
+import mmap
+import zlib
+import struct
+import zipfile
+import threading
+
+from .file_source import read_file
+
+ARCHIVE_INDEX_VERSION = 1
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+def archive_index_path(archive_path):
+    return os.path.join(os.path.dirname(archive_path), "." + os.path.basename(archive_path) + ".index.json")
+
+def read_archive_index(archive_path):
+    '''
+    Central directory of a zip archive as [name, header_offset, compress_type,
+    compress_size, file_size] rows. Cached in a hidden JSON file beside the
+    archive and re-read from the archive when its size or mtime changed.
+    '''
+    stat = os.stat(archive_path)
+    key = {'version': ARCHIVE_INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    index_path = archive_index_path(archive_path)
+    try:
+        with open(index_path, 'r') as handle:
+            index = json.load(handle)
+        if all(map(lambda name: index.get(name) == key[name], key)):
+            return index['members']
+    except (OSError, ValueError):
+        pass
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [
+            [info.filename, info.header_offset, info.compress_type, info.compress_size, info.file_size]
+            for info in archive.infolist() if not info.is_dir()
+        ]
+    try:
+        with open(index_path + '.tmp', 'w') as handle:
+            json.dump(dict(key, members=members), handle)
+        os.replace(index_path + '.tmp', index_path)
+    except OSError: # read-only dataset folder, parse again next time
+        pass
+    return members
+
+class ZipArchiveSource:
+    '''
+    File source reading the official KITTI zip archives in place.
+
+    Every *.zip directly under the given base paths (the per-drive *_sync.zip
+    and per-date *_calib.zip of KITTI raw, data_depth_annotated.zip of KITTI
+    depth) is indexed from its central directory, and its members are seen
+    at base_path/<member name>, i.e. where extraction would have put them.
+    Paths outside the archives fall back to the local filesystem, so caches
+    and partly extracted trees keep working.
+
+    Archives are memory-mapped once per process (forked or spawned workers
+    open their own maps). Stored members are returned as memoryviews of the
+    map without any copy, deflated ones are decompressed in one call.
+    '''
+
+    def __init__(self, *base_paths):
+        self.base_paths = list(map(os.path.abspath, base_paths))
+        self.archives = sorted(set(
+            archive for base_path in self.base_paths
+            for archive in glob.glob(os.path.join(base_path, "*.zip"))
+        ))
+        self.lock = threading.Lock()
+        self.index = None
+        self.handles = None
+
+    def load_index(self):
+        with self.lock:
+            if self.index is None:
+                members = dict()
+                directories = dict()
+                for number, archive in enumerate(self.archives):
+                    root = os.path.dirname(archive)
+                    for name, header_offset, compress_type, compress_size, file_size in read_archive_index(archive):
+                        path = os.path.normpath(os.path.join(root, name))
+                        members[path] = (number, name, header_offset, compress_type, compress_size, file_size)
+                        child = path
+                        while True:
+                            parent = os.path.dirname(child)
+                            children = directories.setdefault(parent, set())
+                            if parent == root or os.path.basename(child) in children:
+                                children.add(os.path.basename(child))
+                                break
+                            children.add(os.path.basename(child))
+                            child = parent
+                self.members, self.directories = members, directories
+                self.index = True
+        return self.members, self.directories
+
+    def member(self, path):
+        members, _ = self.load_index()
+        return members.get(os.path.normpath(os.path.abspath(path)))
+
+    def mapping(self, number):
+        # Handles are per process: a forked worker opens the archives again
+        with self.lock:
+            if self.handles is None or self.handles[0] != os.getpid():
+                self.handles = (os.getpid(), dict())
+            handles = self.handles[1]
+            if number not in handles:
+                with open(self.archives[number], 'rb') as handle:
+                    handles[number] = memoryview(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+            return handles[number]
+
+    def read(self, path):
+        member = self.member(path)
+        if member is None:
+            return read_file(path)
+        number, name, header_offset, compress_type, compress_size, file_size = member
+        if file_size == 0:
+            return b""
+        view = self.mapping(number)
+        signature, *fields = LOCAL_HEADER.unpack_from(view, header_offset)
+        assert signature == b'PK\x03\x04', "Bad local header: " + name
+        start = header_offset + LOCAL_HEADER.size + fields[-2] + fields[-1]
+        data = view[start:start + compress_size]
+        if compress_type == zipfile.ZIP_STORED:
+            return data
+        if compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS, file_size)
+        with zipfile.ZipFile(self.archives[number]) as archive:
+            return archive.read(name)
+
+    def exists(self, path):
+        return self.member(path) is not None or self.isdir(path) or os.path.exists(path)
+
+    def isdir(self, path):
+        _, directories = self.load_index()
+        return os.path.normpath(os.path.abspath(path)) in directories or os.path.isdir(path)
+
+    def listdir(self, path):
+        _, directories = self.load_index()
+        names = set(directories.get(os.path.normpath(os.path.abspath(path)), ()))
+        if os.path.isdir(path):
+            names |= set(os.listdir(path))
+        elif not names:
+            raise FileNotFoundError(path)
+        return list(names)
+
+    def stat(self, path):
+        member = self.member(path)
+        if member is None:
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        return member[-1], os.stat(self.archives[member[0]]).st_mtime_ns
+
+    def __getstate__(self):
+        # Workers load the cached index and map the archives themselves
+        state = self.__dict__.copy()
+        for key in ('lock', 'index', 'handles', 'members', 'directories'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.index = None
+        self.handles = None
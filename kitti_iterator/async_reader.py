@@ -0,0 +1,228 @@
+import copy
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .file_source import LocalFileSource
+
+class AsyncFileSource:
+    '''
+    File source issuing reads concurrently from an asyncio event loop.
+
+    The loop runs in a background thread; every read awaits a slot of a
+    semaphore of max_in_flight and is then performed by an I/O thread, so at
+    most max_in_flight requests are outstanding at once. `prefetch(paths)`
+    starts reads ahead of time, `read(path)` returns a prefetched file once it
+    arrived or reads it now. A path prefetched n times is kept until read n
+    times (accumulated sweeps are shared between neighbouring frames).
+
+    Reads and listings go to the wrapped source (the local filesystem by
+    default). latency (seconds) is slept before every read, to emulate network
+    storage against a local directory. Loop and threads are started on first
+    use and are not pickled.
+    '''
+
+    def __init__(self, source=None, max_in_flight=16, latency=0.0):
+        assert max_in_flight >= 1, max_in_flight
+        self.source = LocalFileSource() if source is None else source
+        self.max_in_flight = max_in_flight
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pending = dict()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.loop = None
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.io_pool = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="kitti_io")
+                loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=loop.run_forever, name="kitti_io_loop", daemon=True)
+                self.thread.start()
+                self.semaphore = asyncio.run_coroutine_threadsafe(self.make_semaphore(), loop).result()
+                self.loop = loop
+
+    async def make_semaphore(self):
+        return asyncio.Semaphore(self.max_in_flight)
+
+    async def fetch(self, path):
+        async with self.semaphore:
+            with self.lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                return await asyncio.get_running_loop().run_in_executor(self.io_pool, self.source.read, path)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+
+    def submit(self, path):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.fetch(path), self.loop)
+
+    def prefetch(self, paths):
+        for path in paths:
+            with self.lock:
+                entry = self.pending.get(path)
+                if entry is not None:
+                    entry[1] += 1
+                    continue
+            future = self.submit(path)
+            with self.lock:
+                entry = self.pending.setdefault(path, [future, 0])
+                entry[1] += 1
+
+    def record_reads(self, reads):
+        '''Appends the paths the calling thread reads to the list reads from now on, None stops'''
+        self.local.reads = reads
+
+    def read(self, path):
+        reads = getattr(self.local, 'reads', None)
+        if reads is not None:
+            reads.append(path)
+        with self.lock:
+            entry = self.pending.get(path)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.pending[path]
+        future = self.submit(path) if entry is None else entry[0]
+        return future.result()
+
+    def exists(self, path):
+        return self.source.exists(path)
+
+    def isdir(self, path):
+        return self.source.isdir(path)
+
+    def listdir(self, path):
+        return self.source.listdir(path)
+
+    def stat(self, path):
+        return self.source.stat(path)
+
+    def discard(self, paths):
+        '''Forgets prefetches that will not be read, e.g. after a random jump'''
+        for path in paths:
+            with self.lock:
+                entry = self.pending.get(path)
+                if entry is None:
+                    continue
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.pending[path]
+                    entry[0].cancel()
+
+    def close(self):
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self.thread.join()
+            self.io_pool.shutdown(wait=False, cancel_futures=True)
+            loop.close()
+        self.pending = dict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('lock', 'local', 'loop', 'thread', 'io_pool', 'semaphore'):
+            state.pop(key, None)
+        state['pending'] = dict()
+        state['in_flight'] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.loop = None
+
+class AsyncKittiReader:
+    '''
+    Map-style facade over a KittiRaw or KittiDepth dataset for high-latency storage.
+
+    `reader[index]` returns the same sample as `dataset[index]`. Behind it all
+    files of the frame (images, sweeps, depth maps) and of the next `prefetch`
+    frames are requested concurrently through an AsyncFileSource, and the
+    frames are decoded by a pool of decode_workers threads (OpenCV and numpy
+    release the GIL), so reading in order overlaps I/O and decoding of
+    upcoming frames with the consumer. Works as a DataLoader dataset, each
+    worker starting its own loop and threads.
+
+    Prefetched files a frame did not read (e.g. served by the frame cache)
+    are released when its decode finishes, frames already in the frame cache
+    are not prefetched. The dataset is shallow-copied and given the
+    asynchronous file source, the original keeps reading synchronously. Ground removal and the in-process
+    frame cache are not thread-safe and need decode_workers=1.
+    '''
+
+    def __init__(self, dataset, prefetch=2, max_in_flight=16, decode_workers=4, latency=0.0):
+        assert prefetch >= 0 and decode_workers >= 1, (prefetch, decode_workers)
+        assert decode_workers == 1 or not (dataset.ground_removal or dataset.frame_cache is not None), \
+            "ground removal and the frame cache need decode_workers=1"
+        self.dataset = copy.copy(dataset)
+        self.dataset.file_source = AsyncFileSource(dataset.file_source, max_in_flight, latency)
+        self.prefetch = prefetch
+        self.decode_workers = decode_workers
+        self.decode_pool = None
+        self.jobs = dict()
+
+    @property
+    def file_source(self):
+        return self.dataset.file_source
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def schedule(self, index):
+        if index in self.jobs or not 0 <= index < len(self.dataset):
+            return
+        if self.decode_pool is None:
+            self.decode_pool = ThreadPoolExecutor(self.decode_workers, thread_name_prefix="kitti_decode")
+        frame_cache = self.dataset.frame_cache
+        paths = [] if frame_cache is not None and index in frame_cache else self.dataset.frame_paths(index)
+        self.file_source.prefetch(paths)
+        self.jobs[index] = (self.decode_pool.submit(self.load, index, paths), paths)
+
+    def load(self, index, paths):
+        """dataset[index] in a decode thread, then drops the prefetches of paths it did not read"""
+        reads = []
+        self.file_source.record_reads(reads)
+        try:
+            return self.dataset[index]
+        finally:
+            self.file_source.record_reads(None)
+            self.file_source.discard(list((Counter(paths) - Counter(reads)).elements()))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        for upcoming in range(index, index + self.prefetch + 1):
+            self.schedule(upcoming)
+        job, _ = self.jobs.pop(index)
+        # Frames before index or past the prefetch window were skipped by a jump
+        for stale in list(filter(lambda i: not index < i <= index + self.prefetch, self.jobs)):
+            stale_job, paths = self.jobs.pop(stale)
+            if stale_job.cancel():
+                self.file_source.discard(paths)
+        return job.result()
+
+    def close(self):
+        if self.decode_pool is not None:
+            self.decode_pool.shutdown(wait=True, cancel_futures=True)
+            self.decode_pool = None
+        self.jobs = dict()
+        self.file_source.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['decode_pool'] = None
+        state['jobs'] = dict()
+        return state
@@ -0,0 +1,144 @@
+import os
+import threading
+import types
+
+import numpy as np
+
+from .helper import lazy_import
+from .file_source import read_text
+
+cv2 = lazy_import('cv2')
+yaml = lazy_import('yaml')
+
+CAMERAS = ('00', '01', '02', '03')
+GRAY_CAMERAS = ('00', '01') # the two grayscale cameras, stored as single channel PNGs
+CALIB_FILES = ("calib_cam_to_cam.txt", "calib_imu_to_velo.txt", "calib_velo_to_cam.txt")
+
+def open_yaml(settings_doc, file_source=None):
+    settings_doc = settings_doc
+    cam_settings = {}
+    if file_source is None:
+        with open(settings_doc, 'r') as stream:
+            text = stream.read()
+    else:
+        text = read_text(file_source, settings_doc)
+    try:
+        cam_settings = yaml.load(text, Loader=yaml.FullLoader)
+    except yaml.YAMLError as exc:
+        print(exc)
+    return cam_settings
+
+def open_calib(calib_file, file_source=None):
+    data = open_yaml(calib_file, file_source)
+    for k in data:
+        try:
+            data[k] = np.array(list(map(float, data[k].split(" "))))
+        except:
+            pass
+    return data
+
+def scale_intrinsics(K, sx, sy):
+    '''
+    K, or a (3, 4) projection, of the image resampled by sx, sy: pixel centres
+    map onto pixel centres, as with cv2.resize and the reduced decodes
+    '''
+    S = np.array([
+        [sx, 0.0, 0.5*sx - 0.5],
+        [0.0, sy, 0.5*sy - 0.5],
+        [0.0, 0.0, 1.0]
+    ])
+    return S @ K
+
+def freeze(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    return value
+
+def freeze_calib(calib):
+    return types.MappingProxyType({k: freeze(v) for k, v in calib.items()})
+
+class KittiCalibration:
+    '''
+    Parsed calibration of one KITTI raw date folder, shared by all of its drives.
+
+    Holds the three calibration files as read-only mappings, the per-camera
+    K, D, R, T and S matrices and the derived undistortion matrices
+    (new_K_0x, roi_0x) computed once. Instances are immutable; get them through
+    get_calibration() rather than constructing them directly. The files are
+    read through file_source when given (e.g. from the calib zip archives).
+    '''
+
+    def __init__(self, kitti_raw_path, file_source=None):
+        set_ = super().__setattr__
+        set_('kitti_raw_path', kitti_raw_path)
+        set_('file_source', file_source)
+        for name in CALIB_FILES:
+            calib_file = os.path.join(kitti_raw_path, name)
+            set_(name.split(".txt")[0], freeze_calib(open_calib(calib_file, file_source)))
+
+        set_('R', freeze(np.reshape(self.calib_velo_to_cam['R'], (3,3))))
+        set_('T', freeze(np.reshape(self.calib_velo_to_cam['T'], (3,1))))
+
+        for cam in CAMERAS:
+            set_('K_' + cam, freeze(np.reshape(self.calib_cam_to_cam['K_' + cam], (3,3))))
+            set_('S_' + cam + '_unrect', freeze(np.reshape(self.calib_cam_to_cam['S_' + cam], (1,2))))
+            set_('S_' + cam, freeze(np.reshape(self.calib_cam_to_cam['S_rect_' + cam], (1,2))))
+            set_('D_' + cam, freeze(np.reshape(self.calib_cam_to_cam['D_' + cam], (1,5))))
+            set_('R_' + cam, freeze(np.reshape(self.calib_cam_to_cam['R_' + cam], (3,3))))
+            set_('T_' + cam, freeze(np.reshape(self.calib_cam_to_cam['T_' + cam], (3,1))))
+
+        set_('width', int(self.S_00[0][0]))
+        set_('height', int(self.S_00[0][1]))
+        for cam in CAMERAS:
+            new_K, roi = cv2.getOptimalNewCameraMatrix(
+                getattr(self, 'K_' + cam), getattr(self, 'D_' + cam),
+                (self.width, self.height), 1, (self.width, self.height)
+            )
+            set_('new_K_' + cam, freeze(new_K))
+            set_('roi_' + cam, tuple(roi))
+
+        intrinsic_mat = np.vstack((
+            np.hstack((
+                self.new_K_02, np.zeros((3,1))
+            )),
+            np.zeros((1,4))
+        ))
+        set_('intrinsic_mat', freeze(intrinsic_mat))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("KittiCalibration is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("KittiCalibration is immutable")
+
+    def __reduce__(self):
+        # Pickled as a handle, the receiving process parses or reuses its own copy
+        return get_calibration, (self.kitti_raw_path, self.file_source)
+
+calibration_registry = dict()
+calibration_registry_lock = threading.Lock()
+
+def calibration_key(kitti_raw_path, file_source=None):
+    kitti_raw_path = os.path.abspath(kitti_raw_path)
+    if file_source is None:
+        stat = lambda path: os.stat(path).st_mtime_ns
+    else:
+        stat = lambda path: file_source.stat(path)[1]
+    mtimes = tuple(map(
+        lambda name: stat(os.path.join(kitti_raw_path, name)),
+        CALIB_FILES
+    ))
+    return kitti_raw_path, mtimes
+
+def get_calibration(kitti_raw_path, file_source=None):
+    '''
+    Returns the shared KittiCalibration of a date folder, parsing the
+    calibration files only the first time or after any of them changed
+    '''
+    path, mtimes = calibration_key(kitti_raw_path, file_source)
+    with calibration_registry_lock:
+        entry = calibration_registry.get(path)
+        if entry is None or entry[0] != mtimes:
+            entry = (mtimes, KittiCalibration(path, file_source))
+            calibration_registry[path] = entry
+        return entry[1]
@@ -0,0 +1,108 @@
+import random
+
+from .frame_cache import copy_value
+
+class KittiClips:
+    '''
+    Temporal clips over a KittiRaw (or KittiDepth) dataset.
+
+    Clip `i` is the list of `window` samples
+        dataset[i*stride], dataset[i*stride + dilation], ..., dataset[i*stride + (window-1)*dilation]
+
+    Loaded samples that fall inside the span of the current clip are kept in a
+    sliding window, so stepping to the next clip only loads the frames it does
+    not share with the previous ones. The window lives in the instance, so with
+    a DataLoader reuse happens within each worker (for example across the clips
+    of one batch); use ClipSampler to keep neighbouring clips together when
+    shuffling. Clips hold copies of the kept samples' arrays, so editing a
+    clip in place never reaches the frames of the next one.
+
+    Args:
+        dataset: map-style dataset returning one sample per frame
+        window(int): number of frames per clip
+        stride(int): frame offset between the starts of consecutive clips
+        dilation(int): frame offset between consecutive frames of a clip
+    '''
+
+    def __init__(self, dataset, window=4, stride=1, dilation=1):
+        assert window >= 1 and stride >= 1 and dilation >= 1, (window, stride, dilation)
+        self.dataset = dataset
+        self.window = window
+        self.stride = stride
+        self.dilation = dilation
+        self.span = (window - 1) * dilation + 1
+        self.frames = dict()
+        self.hits = 0
+        self.misses = 0
+        self.index = 0
+
+    def __len__(self):
+        return max(0, (len(self.dataset) - self.span) // self.stride + 1)
+
+    def __iter__(self):
+        self.index = 0
+        return self
+
+    def __next__(self):
+        if self.index >= self.__len__():
+            raise StopIteration
+        data = self[self.index]
+        self.index += 1
+        return data
+
+    def clip_indices(self, index):
+        start = index * self.stride
+        return range(start, start + self.span, self.dilation)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        indices = self.clip_indices(index)
+        start, stop = indices.start, indices.start + self.span
+
+        # Forget frames outside the current span, they belong to earlier clips
+        frames = {i: sample for i, sample in self.frames.items() if start <= i < stop}
+        clip = []
+        for frame_index in indices:
+            sample = frames.get(frame_index)
+            if sample is None:
+                sample = self.dataset[frame_index]
+                frames[frame_index] = sample
+                self.misses += 1
+            else:
+                self.hits += 1
+            clip.append(copy_value(sample))
+        self.frames = frames
+        return clip
+
+class ClipSampler:
+    '''
+    Sampler over KittiClips indices that shuffles chunks of `chunk_size`
+    consecutive clips and visits each chunk in order, so most clips still reuse
+    the frames of the previous one. chunk_size=1 is a plain shuffle.
+    '''
+
+    def __init__(self, clips, shuffle=True, chunk_size=8, seed=0):
+        self.clips = clips
+        self.shuffle = shuffle
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.clips)
+
+    def __iter__(self):
+        chunks = [
+            range(start, min(start + self.chunk_size, len(self.clips)))
+            for start in range(0, len(self.clips), self.chunk_size)
+        ]
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(chunks)
+        for chunk in chunks:
+            yield from chunk
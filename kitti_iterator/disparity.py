@@ -0,0 +1,67 @@
+import numpy as np
+
+from .calibration import scale_intrinsics
+
+DISPARITY_FIELDS = ['disparity', 'disparity_mask']
+
+def velodyne_to_rectified_projection(calib_cam_to_cam, calib_velo_to_cam, cam='02'):
+    '''(3, 4) matrix P_rect_<cam> @ R_rect_00 @ [R|T] taking homogeneous velodyne points to camera cam pixels'''
+    velo_to_cam = np.eye(4)
+    velo_to_cam[:3, :3] = np.reshape(calib_velo_to_cam['R'], (3, 3))
+    velo_to_cam[:3, 3] = np.reshape(calib_velo_to_cam['T'], (3,))
+    rectification = np.eye(4)
+    rectification[:3, :3] = np.reshape(calib_cam_to_cam['R_rect_00'], (3, 3))
+    return np.reshape(calib_cam_to_cam['P_rect_' + cam], (3, 4)) @ rectification @ velo_to_cam
+
+def stereo_baseline(calib_cam_to_cam, left='02', right='03'):
+    '''f * B in pixel metres: disparity = f * B / depth for the rectified pair left/right'''
+    P_left = np.reshape(calib_cam_to_cam['P_rect_' + left], (3, 4))
+    P_right = np.reshape(calib_cam_to_cam['P_rect_' + right], (3, 4))
+    return P_left[0, 3] - P_right[0, 3]
+
+def project_depth(velodyine_points, projection, shape, min_depth=0.1):
+    '''
+    Projects velodyne points with a (3, 4) projection into a z-buffered
+    (h, w) float32 depth map, 0 where no point lands (nearest point kept)
+    '''
+    height, width = shape
+    xyz = np.asarray(velodyine_points)[:, :3].astype(np.float64)
+    image_points = xyz @ projection[:, :3].T + projection[:, 3]
+    depth = image_points[:, 2]
+    front = depth > min_depth
+    u = np.round(image_points[front, 0] / depth[front]).astype(np.int64)
+    v = np.round(image_points[front, 1] / depth[front]).astype(np.int64)
+    depth = depth[front]
+    inside = (0 <= u) & (u < width) & (0 <= v) & (v < height)
+    pixels = v[inside] * width + u[inside]
+    depth = depth[inside]
+
+    # Nearest point first, np.unique keeps the first occurrence of every pixel
+    order = np.argsort(depth, kind='stable')
+    pixels, first = np.unique(pixels[order], return_index=True)
+    depth_map = np.zeros(height * width, dtype=np.float32)
+    depth_map[pixels] = depth[order][first]
+    return depth_map.reshape(height, width)
+
+def lidar_disparity(velodyine_points, calib_cam_to_cam, calib_velo_to_cam, shape, left='02', right='03', image_scale=(1.0, 1.0)):
+    '''
+    Sparse disparity ground truth of the rectified pair left/right from a
+    LiDAR sweep: the sweep is z-buffered into the rectified left camera and
+    depth converted with the baseline of P_rect_<left> / P_rect_<right>.
+    image_scale = (sx, sy) gives the disparity of images resampled by sx, sy.
+
+    Returns
+        disparity       (h, w) float32, 0 where invalid
+        disparity_mask  (h, w) bool
+    '''
+    sx, sy = image_scale
+    projection = velodyne_to_rectified_projection(calib_cam_to_cam, calib_velo_to_cam, left)
+    projection = scale_intrinsics(projection, sx, sy)
+    depth = project_depth(velodyine_points, projection, shape)
+    mask = depth > 0
+    disparity = np.zeros(depth.shape, dtype=np.float32)
+    disparity[mask] = sx * stereo_baseline(calib_cam_to_cam, left, right) / depth[mask]
+    return {
+        'disparity': disparity,
+        'disparity_mask': mask,
+    }
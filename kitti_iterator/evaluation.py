@@ -0,0 +1,152 @@
+import numpy as np
+
+DEPTH_METRICS = ('silog', 'log10', 'abs_rel', 'sq_rel', 'rmse', 'rmse_log', 'd1', 'd2', 'd3')
+
+# Running sums over valid pixels, the metrics of compute_errors are derived from them
+DEPTH_SUMS = (
+    'pixels',       # number of valid pixels
+    'log_err',      # sum(log(pred) - log(gt))
+    'log_err_sq',   # sum((log(pred) - log(gt))**2)
+    'log10_abs',    # sum(|log10(pred) - log10(gt)|)
+    'abs_rel',      # sum(|gt - pred| / gt)
+    'sq_rel',       # sum((gt - pred)**2 / gt)
+    'sq',           # sum((gt - pred)**2)
+    'd1', 'd2', 'd3',   # number of pixels with max(gt/pred, pred/gt) below 1.25, 1.25**2, 1.25**3
+    'frames',       # number of frames with at least one valid pixel
+)
+FRAME_METRICS_OFFSET = len(DEPTH_SUMS)
+
+def depth_error_sums(gt, pred):
+    '''DEPTH_SUMS of already masked 1D gt and pred arrays'''
+    gt = np.asarray(gt, dtype=np.float64)
+    pred = np.asarray(pred, dtype=np.float64)
+    log_err = np.log(pred) - np.log(gt)
+    diff = gt - pred
+    thresh = np.maximum(gt / pred, pred / gt)
+    return np.array([
+        len(gt),
+        log_err.sum(),
+        (log_err ** 2).sum(),
+        np.abs(log_err / np.log(10)).sum(),
+        (np.abs(diff) / gt).sum(),
+        (diff ** 2 / gt).sum(),
+        (diff ** 2).sum(),
+        (thresh < 1.25).sum(),
+        (thresh < 1.25 ** 2).sum(),
+        (thresh < 1.25 ** 3).sum(),
+        1.0 if len(gt) else 0.0,
+    ])
+
+def metrics_from_sums(sums):
+    '''compute_errors metrics (in DEPTH_METRICS order) from DEPTH_SUMS, NaN without valid pixels'''
+    pixels = sums[0]
+    if pixels == 0:
+        return np.full(len(DEPTH_METRICS), np.nan)
+    mean = sums / pixels
+    rmse_log = np.sqrt(mean[2])
+    silog = np.sqrt(max(0.0, mean[2] - mean[1] ** 2)) * 100
+    return np.array([silog, mean[3], mean[4], mean[5], np.sqrt(mean[6]), rmse_log, mean[7], mean[8], mean[9]])
+
+class DepthEvaluator:
+    '''
+    Streaming depth evaluation over a dataset.
+
+    Every update only adds to a fixed-size vector of sums, overall and per
+    drive, so memory stays constant however many frames are evaluated. Pixels
+    are valid where min_depth < gt < max_depth and the prediction is finite;
+    predictions are clipped to [min_depth, max_depth] as in the KITTI benchmark.
+
+    `metrics('pixels')` pools all valid pixels, `metrics('frames')` averages the
+    per-frame compute_errors metrics. Evaluators filled in different processes
+    are combined with `merge()`, `state()` / `from_state()` give a plain
+    picklable form.
+    '''
+
+    def __init__(self, min_depth=1e-3, max_depth=80.0):
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.totals = np.zeros(FRAME_METRICS_OFFSET + len(DEPTH_METRICS))
+        self.drives = dict()
+
+    def frame_sums(self, gt, pred):
+        valid = (gt > self.min_depth) & (gt < self.max_depth) & np.isfinite(pred)
+        pred = np.clip(pred[valid], self.min_depth, self.max_depth)
+        sums = depth_error_sums(gt[valid], pred)
+        frame_metrics = metrics_from_sums(sums) if sums[0] else np.zeros(len(DEPTH_METRICS))
+        return np.concatenate((sums, frame_metrics))
+
+    def add(self, sums, drive=None):
+        self.totals += sums
+        if drive is not None:
+            self.add_drive(drive, sums)
+
+    def update(self, gt, pred, drive=None):
+        '''
+        Adds a frame (h, w) or a batch (b, h, w) of ground truth and predicted
+        metric depth. drive is a name, or one name per frame of the batch.
+        '''
+        gt = np.asarray(gt)
+        pred = np.asarray(pred)
+        assert gt.shape == pred.shape, (gt.shape, pred.shape)
+        if gt.ndim == 2:
+            gt, pred, drive = gt[None], pred[None], [drive]
+        elif drive is None or isinstance(drive, str):
+            drive = [drive] * len(gt)
+        for frame_gt, frame_pred, frame_drive in zip(gt, pred, drive):
+            self.add(self.frame_sums(frame_gt, frame_pred), frame_drive)
+
+    def update_sparse(self, sparse_gt, pred, drive=None):
+        '''Adds a frame whose ground truth comes from sparse_depth.sparsify_depth or a SparseDepthStore'''
+        pred = np.asarray(pred)
+        assert pred.shape == tuple(sparse_gt['shape']), (pred.shape, sparse_gt['shape'])
+        self.add(self.frame_sums(sparse_gt['depth'], pred.reshape(-1)[sparse_gt['indices']]), drive)
+
+    def merge(self, other):
+        assert (self.min_depth, self.max_depth) == (other.min_depth, other.max_depth), "evaluators use different depth ranges"
+        self.totals += other.totals
+        for drive, sums in other.drives.items():
+            self.add_drive(drive, sums)
+        return self
+
+    def add_drive(self, drive, sums):
+        if drive not in self.drives:
+            self.drives[drive] = np.zeros_like(self.totals)
+        self.drives[drive] += sums
+
+    def state(self):
+        return {
+            'min_depth': self.min_depth,
+            'max_depth': self.max_depth,
+            'totals': self.totals.copy(),
+            'drives': {drive: sums.copy() for drive, sums in self.drives.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        evaluator = cls(state['min_depth'], state['max_depth'])
+        evaluator.totals += state['totals']
+        for drive, sums in state['drives'].items():
+            evaluator.add_drive(drive, sums)
+        return evaluator
+
+    @staticmethod
+    def reduce(sums, reduction):
+        if reduction == 'pixels':
+            return dict(zip(DEPTH_METRICS, metrics_from_sums(sums[:FRAME_METRICS_OFFSET])))
+        assert reduction == 'frames', reduction
+        frames = sums[FRAME_METRICS_OFFSET - 1]
+        frame_metrics = sums[FRAME_METRICS_OFFSET:] / frames if frames else np.full(len(DEPTH_METRICS), np.nan)
+        return dict(zip(DEPTH_METRICS, frame_metrics))
+
+    def metrics(self, reduction='pixels'):
+        return self.reduce(self.totals, reduction)
+
+    def drive_metrics(self, reduction='pixels'):
+        return {drive: self.reduce(sums, reduction) for drive, sums in sorted(self.drives.items())}
+
+def evaluate_depth(samples, min_depth=1e-3, max_depth=80.0):
+    '''Streams (drive, gt, pred) tuples from any iterable into a DepthEvaluator'''
+    evaluator = DepthEvaluator(min_depth, max_depth)
+    for drive, gt, pred in samples:
+        evaluator.update(gt, pred, drive)
+    return evaluator
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+from .helper import lazy_import
+
+cv2 = lazy_import('cv2')
+
+def read_file(path):
+    '''Whole file into a writable bytearray, read in place without an extra copy'''
+    with open(path, 'rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        offset = 0
+        while offset < size:
+            count = handle.readinto(view[offset:])
+            if not count:
+                break
+            offset += count
+        view.release()
+    if offset < size: # file shrank while reading
+        del buffer[offset:]
+    return buffer
+
+def decode_image(buffer, flags, path=""):
+    '''cv2.imread of an encoded image already in memory'''
+    image = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags)
+    assert image is not None, "Could not decode image: " + path
+    return image
+
+def image_decode_flag(grayscale=False, reduction=1):
+    '''cv2.imread flag decoding to 1/reduction (1, 2, 4 or 8) of the full resolution'''
+    assert reduction in (1, 2, 4, 8), reduction
+    if reduction == 1:
+        return cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    return getattr(cv2, 'IMREAD_REDUCED_' + ('GRAYSCALE_' if grayscale else 'COLOR_') + str(reduction))
+
+def decode_velodyne(buffer):
+    '''
+    (N, 4) float32 x,y,z,reflectance points of a velodyne .bin file in memory,
+    writable whatever the file source (read-only buffers, e.g. stored zip
+    members, are copied)
+    '''
+    points = np.frombuffer(buffer, dtype=np.float32).reshape(-1, 4)
+    return points if points.flags.writeable else points.copy()
+
+def read_text(file_source, path):
+    return bytes(file_source.read(path)).decode()
+
+class LocalFileSource:
+    '''
+    Blocking reads from the local filesystem, the default file source of the
+    datasets. A file source reads whole files (read) and lists folders
+    (exists, isdir, listdir, stat -> (size, mtime_ns)); see archive and
+    async_reader for the other ones.
+    '''
+
+    def read(self, path):
+        return read_file(path)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def stat(self, path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,253 @@
+import os
+import sys
+import glob
+import json
+import uuid
+import pickle
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+SHARED_CACHE_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def value_nbytes(value):
+    '''Approximate memory held by a sample field'''
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, 'element_size') and hasattr(value, 'numel'): # torch.Tensor
+        return value.element_size() * value.numel()
+    if isinstance(value, dict):
+        return sum(map(value_nbytes, value.values()))
+    if isinstance(value, (list, tuple)):
+        return sum(map(value_nbytes, value))
+    return sys.getsizeof(value)
+
+def copy_value(value):
+    '''Copy of the arrays and tensors of a sample field, other values are shared'''
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if hasattr(value, 'clone'): # torch.Tensor
+        return value.clone()
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(map(copy_value, value))
+    return value
+
+def field_nbytes(data):
+    return {key: value_nbytes(value) for key, value in data.items()}
+
+class FrameCache:
+    '''
+    In-process LRU cache of samples keyed by frame index, bounded by max_bytes.
+
+    Byte usage is accounted per field so `stats()` shows which outputs dominate
+    the budget. Samples larger than the whole budget are not cached. Arrays are
+    copied in and out, so editing a returned sample never alters the cache.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.field_nbytes = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return copy_value(entry[0])
+
+    def put(self, key, data):
+        sizes = field_nbytes(data)
+        nbytes = sum(sizes.values())
+        if nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        while self.nbytes + nbytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+        self.entries[key] = (copy_value(data), sizes)
+        self.nbytes += nbytes
+        for field, size in sizes.items():
+            self.field_nbytes[field] = self.field_nbytes.get(field, 0) + size
+
+    def remove(self, key):
+        data, sizes = self.entries.pop(key)
+        self.nbytes -= sum(sizes.values())
+        for field, size in sizes.items():
+            self.field_nbytes[field] -= size
+            if self.field_nbytes[field] == 0:
+                del self.field_nbytes[field]
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.field_nbytes = dict()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'field_nbytes': dict(self.field_nbytes),
+        }
+
+    def __getstate__(self):
+        # Each DataLoader worker starts with an empty private cache
+        state = self.__dict__.copy()
+        state['entries'] = OrderedDict()
+        state['nbytes'] = 0
+        state['field_nbytes'] = dict()
+        return state
+
+def remove_shared_cache(path, owner_pid):
+    # Forked workers inherit the finalizer; only the creating process cleans up
+    if os.getpid() == owner_pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+class SharedFrameCache:
+    '''
+    LRU cache of samples shared by every process holding it, e.g. DataLoader
+    workers. Entries are pickled into a folder on shared memory (/dev/shm),
+    recency is tracked through file mtimes and a lock file serialises
+    insertions and evictions across processes. The folder is removed when the
+    creating process drops the cache.
+
+    Hit/miss counters are per process. Every entry has a <key>.pkl.json
+    sidecar with the in-memory size of each of its fields, summed over the
+    entries present into field_nbytes; nbytes is the size of the pickles.
+    '''
+
+    def __init__(self, max_bytes, path=None):
+        self.max_bytes = int(max_bytes)
+        if path is None:
+            path = os.path.join(SHARED_CACHE_ROOT, "kitti_frame_cache_" + uuid.uuid4().hex)
+            os.makedirs(path)
+            self._finalizer = weakref.finalize(self, remove_shared_cache, path, os.getpid())
+        self.path = path
+        self.lock_path = os.path.join(path, "lock")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def entry_path(self, key):
+        return os.path.join(self.path, str(key) + ".pkl")
+
+    def remove_entry(self, path):
+        os.remove(path)
+        try:
+            os.remove(path + ".json")
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'rb') as handle:
+                data = pickle.load(handle)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError: # evicted meanwhile by another process
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        import fcntl
+        sizes = field_nbytes(data)
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = []
+            for path in glob.glob(os.path.join(self.path, "*.pkl")):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime_ns, path, stat.st_size))
+            entries.sort()
+            nbytes = sum(map(lambda entry: entry[2], entries))
+            for _, path, size in entries:
+                if nbytes + len(payload) <= self.max_bytes:
+                    break
+                self.remove_entry(path)
+                nbytes -= size
+                self.evictions += 1
+            tmp_path = self.entry_path(key) + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_path, 'w') as handle:
+                json.dump(sizes, handle)
+            os.replace(tmp_path, self.entry_path(key) + ".json")
+            with open(tmp_path, 'wb') as handle:
+                handle.write(payload)
+            os.replace(tmp_path, self.entry_path(key))
+
+    @property
+    def field_nbytes(self):
+        '''Per-field bytes of the entries currently in the cache'''
+        totals = dict()
+        for path in glob.glob(os.path.join(self.path, "*.pkl")):
+            try:
+                with open(path + ".json", 'r') as handle:
+                    sizes = json.load(handle)
+            except (FileNotFoundError, ValueError): # evicted or being written meanwhile
+                continue
+            for field, size in sizes.items():
+                totals[field] = totals.get(field, 0) + size
+        return totals
+
+    @property
+    def nbytes(self):
+        return sum(map(os.path.getsize, glob.glob(os.path.join(self.path, "*.pkl"))))
+
+    def __len__(self):
+        return len(glob.glob(os.path.join(self.path, "*.pkl")))
+
+    def __contains__(self, key):
+        return os.path.exists(self.entry_path(key))
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.path, "*.pkl")):
+            self.remove_entry(path)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'field_nbytes': self.field_nbytes,
+        }
+
+    def __getstate__(self):
+        # Workers attach to the same folder but never delete it
+        state = self.__dict__.copy()
+        state.pop('_finalizer', None)
+        return state
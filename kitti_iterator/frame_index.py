@@ -0,0 +1,111 @@
+import numpy as np
+
+def frame_numbers(ids):
+    '''Zero padded KITTI frame ids ('0000000005') as an int64 array'''
+    return np.array(list(map(int, ids)), dtype=np.int64)
+
+class FrameIdIndex:
+    '''
+    Bidirectional integer mapping between the raw frames of a drive and its
+    depth ground truth frames.
+
+        raw_to_depth    (raw_count,) int64 depth position of every raw frame, -1 without ground truth
+        depth_to_raw    (depth_count,) int64 raw position of every depth frame
+        presence        camera -> (raw_count,) bool, whether that camera has ground truth
+
+    Args:
+        raw_ids: sorted raw frame ids of the drive
+        depth_ids: sorted ids of the depth frames, in dataset order
+        camera_ids: camera -> ids of its ground truth maps, defaults to {'02': depth_ids}
+    '''
+
+    def __init__(self, raw_ids, depth_ids, camera_ids=None):
+        raw_numbers = frame_numbers(raw_ids)
+        assert np.all(np.diff(raw_numbers) > 0), "raw frame ids must be sorted and unique"
+        if camera_ids is None:
+            camera_ids = {'02': depth_ids}
+
+        self.depth_to_raw = self.raw_positions(raw_numbers, depth_ids)
+        self.raw_to_depth = np.full(len(raw_numbers), -1, dtype=np.int64)
+        self.raw_to_depth[self.depth_to_raw] = np.arange(len(self.depth_to_raw))
+        self.presence = dict()
+        for camera, ids in camera_ids.items():
+            present = np.zeros(len(raw_numbers), dtype=bool)
+            present[self.raw_positions(raw_numbers, ids)] = True
+            self.presence[camera] = present
+
+    @staticmethod
+    def raw_positions(raw_numbers, ids):
+        numbers = frame_numbers(ids)
+        positions = np.searchsorted(raw_numbers, numbers)
+        missing = positions >= len(raw_numbers)
+        missing[~missing] = raw_numbers[positions[~missing]] != numbers[~missing]
+        assert not np.any(missing), "Depth frames without a raw frame: " + str(numbers[missing])
+        return positions.astype(np.int64)
+
+    @property
+    def raw_count(self):
+        return len(self.raw_to_depth)
+
+    @property
+    def depth_count(self):
+        return len(self.depth_to_raw)
+
+    def has_depth(self, cameras=None):
+        '''(raw_count,) bool mask of raw frames with ground truth for all of cameras (default: any depth frame)'''
+        if cameras is None:
+            return self.raw_to_depth >= 0
+        return np.logical_and.reduce(list(map(lambda camera: self.presence[camera], cameras)))
+
+class CollectionFrameIndex:
+    '''
+    FrameIdIndex of several drives concatenated in dataset order, so frames
+    with or without ground truth can be selected over a whole collection at once.
+
+        drive           (raw_total,) drive number of every raw frame
+        raw_offsets     (drives + 1,) start of each drive in the concatenated raw frames
+        depth_offsets   (drives + 1,) start of each drive in the concatenated depth frames
+        raw_to_depth    (raw_total,) global depth position, -1 without ground truth
+        depth_to_raw    (depth_total,) global raw position
+        presence        camera -> (raw_total,) bool
+    '''
+
+    def __init__(self, indexes):
+        self.indexes = list(indexes)
+        raw_counts = list(map(lambda index: index.raw_count, self.indexes))
+        depth_counts = list(map(lambda index: index.depth_count, self.indexes))
+        self.raw_offsets = np.concatenate(([0], np.cumsum(raw_counts))).astype(np.int64)
+        self.depth_offsets = np.concatenate(([0], np.cumsum(depth_counts))).astype(np.int64)
+        self.drive = np.repeat(np.arange(len(self.indexes)), raw_counts)
+
+        self.depth_to_raw = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            index.depth_to_raw + offset for index, offset in zip(self.indexes, self.raw_offsets)
+        ])
+        self.raw_to_depth = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            np.where(index.raw_to_depth >= 0, index.raw_to_depth + offset, -1)
+            for index, offset in zip(self.indexes, self.depth_offsets)
+        ])
+        cameras = set.intersection(*map(lambda index: set(index.presence), self.indexes)) if self.indexes else set()
+        self.presence = {
+            camera: np.concatenate(list(map(lambda index: index.presence[camera], self.indexes)))
+            for camera in sorted(cameras)
+        }
+
+    def has_depth(self, cameras=None):
+        if cameras is None:
+            return self.raw_to_depth >= 0
+        return np.logical_and.reduce(list(map(lambda camera: self.presence[camera], cameras)))
+
+    def raw_frames(self, has_depth=True, cameras=None):
+        '''Global raw positions of the frames with (or, has_depth=False, without) ground truth'''
+        mask = self.has_depth(cameras)
+        return np.flatnonzero(mask if has_depth else ~mask)
+
+    def depth_frames(self, cameras):
+        '''Global depth positions (KittiDepth collection indices) whose ground truth exists for all of cameras'''
+        return np.flatnonzero(self.has_depth(cameras)[self.depth_to_raw])
+
+def get_frame_index(datasets):
+    '''CollectionFrameIndex of a list or ConcatDataset of KittiDepth datasets'''
+    datasets = getattr(datasets, 'datasets', datasets)
+    return CollectionFrameIndex(map(lambda dataset: dataset.frame_index, datasets))
@@ -0,0 +1,181 @@
+import os
+import json
+import hashlib
+
+from multiprocessing.pool import Pool
+
+import numpy as np
+
+from .trajectory import write_header, load_oxts_packets
+from .sparse_depth import save_array
+from .helper import velo_points_filter
+from .kitti_raw_iterator import v_fov, h_fov
+
+FRAME_STATS_CACHE_DIR = ".frame_stats"
+FRAME_STATS_VERSION = 1
+FRAME_STATS_HEADER = "header.json"
+
+FRAME_STATS = (
+    'point_count',      # points of the (accumulated, cropped) sweep
+    'points_in_grid',   # of them inside the camera field of view and the occupancy grid
+    'occupied_voxels',  # occupied cells of the (unblurred) occupancy grid
+    'ground_fraction',  # share of the points removed by ground removal
+    'mean_depth',       # mean range of the points (m), NaN without points
+    'speed',            # forward/lateral speed from OXTS (m/s), NaN without a packet
+)
+
+def frame_stats_params(dataset):
+    '''Settings the statistics of a drive depend on, normalised through JSON'''
+    return json.loads(json.dumps({
+        'dataset': type(dataset).__name__,
+        'grid_size': list(dataset.grid_size),
+        'scale': list(dataset.scale),
+        'accumulate_sweeps': list(dataset.accumulate_sweeps),
+        'accumulate_voxel_size': dataset.accumulate_voxel_size,
+        'roi_crop': repr(dataset.roi_crop),
+        'frame_digest': hashlib.sha1("\n".join(dataset.img_list).encode()).hexdigest(),
+    }))
+
+def frame_stats_path(dataset, params):
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(dataset.raw_data_path, FRAME_STATS_CACHE_DIR, type(dataset).__name__ + "_" + key)
+
+def compute_frame_stats(dataset):
+    '''FRAME_STATS columns of every frame of a KittiRaw or KittiDepth dataset'''
+    columns = {name: np.zeros(len(dataset), dtype=np.float64) for name in FRAME_STATS}
+    for index in range(len(dataset)):
+        sweep = dataset.load_velodyne_points(index)
+        fov_points, _ = velo_points_filter(sweep, v_fov, h_fov)
+        indices, inside = dataset.camera_points_to_occupancy_indices(dataset.transform_points_to_camera(fov_points[:3].T))
+        non_ground = dataset.process(sweep * np.array([1.0, 1.0, -1.0, 1.0])) if len(sweep) else sweep
+        columns['point_count'][index] = len(sweep)
+        columns['points_in_grid'][index] = np.count_nonzero(inside)
+        columns['occupied_voxels'][index] = len(np.unique(indices[inside], axis=0))
+        columns['ground_fraction'][index] = 1.0 - len(non_ground) / len(sweep) if len(sweep) else np.nan
+        columns['mean_depth'][index] = np.linalg.norm(sweep[:, :3], axis=1).mean() if len(sweep) else np.nan
+
+    raw_positions = list(map(dataset.raw_frame_position, range(len(dataset))))
+    oxts = load_oxts_packets(dataset.oxts_path, dataset.raw_img_list, dataset.file_source)[raw_positions]
+    columns['speed'][:] = np.hypot(oxts[:, 8], oxts[:, 9]) # vf, vl
+    return columns
+
+class FrameStatsStore:
+    '''
+    Columnar per-frame statistics of one drive, next to its frames.
+
+    A store is a folder holding header.json (version, frame ids, the
+    parameters used) and one <column>.npy (frame_count,) float64 array per
+    FRAME_STATS column, memory-mapped on open.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, FRAME_STATS_HEADER), 'r') as handle:
+            self.header = json.load(handle)
+        assert self.header['version'] == FRAME_STATS_VERSION, self.header
+        self.columns = {
+            name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+            for name in self.header['columns']
+        }
+        assert all(map(lambda column: column.shape == (len(self.ids),), self.columns.values())), path
+
+    @classmethod
+    def build(cls, path, dataset, params=dict()):
+        os.makedirs(path, exist_ok=True)
+        columns = compute_frame_stats(dataset)
+        for name, column in columns.items():
+            save_array(os.path.join(path, name + ".npy"), column)
+        write_header(path, {
+            'version': FRAME_STATS_VERSION,
+            'ids': dataset.img_list,
+            'columns': list(columns),
+            'params': params,
+        })
+        return cls(path)
+
+    @property
+    def ids(self):
+        return self.header['ids']
+
+    @property
+    def params(self):
+        return self.header['params']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+def open_frame_stats(dataset, invalidate_cache=False):
+    '''FrameStatsStore of a dataset, computed first when missing or outdated'''
+    params = frame_stats_params(dataset)
+    path = frame_stats_path(dataset, params)
+    if not invalidate_cache and os.path.exists(os.path.join(path, FRAME_STATS_HEADER)):
+        try:
+            store = FrameStatsStore(path)
+            if store.params == params and set(store.columns) == set(FRAME_STATS):
+                return store
+        except (OSError, ValueError, KeyError, AssertionError) as exc:
+            print("Frame statistics unreadable, recomputing: ", path, exc)
+    return FrameStatsStore.build(path, dataset, params)
+
+def open_frame_stats_job(job):
+    """Pool worker: opens or computes the statistics of one drive"""
+    dataset, invalidate_cache = job
+    return open_frame_stats(dataset, invalidate_cache).path
+
+class FrameStatsTable:
+    '''
+    FRAME_STATS columns of a collection of drives concatenated in dataset
+    (ConcatDataset) order, plus `drive`, the drive number of every frame.
+    Columns are numpy arrays, so selections are vectorized expressions:
+
+        table = get_frame_stats(datasets, num_workers=8)
+        indices = table.indices((table['points_in_grid'] > 20000) & (table['speed'] > 2.0))
+        sampler = DistributedDriveSampler(datasets, indices=indices)
+    '''
+
+    def __init__(self, stores):
+        self.stores = list(stores)
+        counts = list(map(len, self.stores))
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.columns = {
+            name: np.concatenate([np.zeros(0)] + list(map(lambda store: np.asarray(store[name]), self.stores)))
+            for name in FRAME_STATS
+        }
+        self.columns['drive'] = np.repeat(np.arange(len(self.stores)), counts)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def indices(self, mask):
+        '''ConcatDataset indices of the frames selected by a boolean mask'''
+        return np.flatnonzero(mask)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns)
+
+def get_frame_stats(datasets, num_workers=None, invalidate_cache=False):
+    '''
+    FrameStatsTable of a list or ConcatDataset of drives. Missing statistics
+    are computed in a process pool, one drive per task; num_workers=0 computes
+    them in this process.
+    '''
+    datasets = list(getattr(datasets, 'datasets', datasets))
+    if num_workers == 0:
+        paths = list(map(lambda dataset: open_frame_stats_job((dataset, invalidate_cache)), datasets))
+    else:
+        with Pool(num_workers) as pool:
+            paths = pool.map(open_frame_stats_job, [(dataset, invalidate_cache) for dataset in datasets])
+    return FrameStatsTable(map(FrameStatsStore, paths))
@@ -73,6 +73,8 @@ class Processor:
 
         self.seg_list = np.int16(np.unique(point5D[:, 3]))
 
+        # Ground lines are fitted per scan
+        self.segments = []
         for seg_idx in self.seg_list:
             segment = Segmentation(self.max_slope, self.max_error, self.long_threshold,
                                    self.max_start_height, self.sensor_height)
@@ -113,16 +115,18 @@ class Processor:
 
             label[slice_list[i]:slice_list[i + 1]] = non_ground == 0
 
-        vel_non_ground = point5D[label == 1][:, :3]
+        vel_non_ground = point5D[label == 1]
+        vel_non_ground = np.concatenate((vel_non_ground[:, :3], vel_non_ground[:, 5:]), axis=1)
 
         return vel_non_ground
 
     def project_5D(self, point3D):
         '''
         Args:
-            point3D: shapes (n_row, 3), while 3 represent x,y,z axis in order.
+            point3D: shapes (n_row, 3+c), while 3 represent x,y,z axis in order,
+                followed by c extra columns (e.g. reflectance) carried through.
         Returns:
-            point5D: shapes (n_row, 3+2), while 5 represent x,y,z,seg,bin axis in order.
+            point5D: shapes (n_row, 3+2+c), while 5 represent x,y,z,seg,bin axis in order.
         '''
         x = point3D[:, 0]
         y = point3D[:, 1]
@@ -135,7 +139,7 @@ class Processor:
         radius = np.sqrt(x ** 2 + y ** 2)
         bin_index = np.int32(np.floor((radius - self.r_min) / self.bin_step))  # bin
 
-        point5D = np.vstack([point3D.T, segment_index, bin_index]).T
+        point5D = np.vstack([point3D[:, :3].T, segment_index, bin_index, point3D[:, 3:].T]).T
 
         return point5D
 
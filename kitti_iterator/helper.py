@@ -1,5 +1,28 @@
+import importlib
+
 import numpy as np
 
+class LazyModule:
+    """
+    Stand-in for a heavy module (torch, cv2, pandas, ...) that is only
+    imported the first time one of its attributes is used
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return "<lazy module '" + self._name + "' (" + state + ")>"
+
+def lazy_import(name):
+    return LazyModule(name)
+
 def depth_color(val, heights, min_d=0, max_d=70):
     """ 
     print Color(HSV's H value) corresponding to distance(m) 
@@ -149,9 +172,12 @@ def velo3d_2_camera2d_points(points, R_vc, T_vc, P_, v_fov=(-24.9, 2.0), h_fov=(
     
     return ans, c_
 
-def compute_errors(gt, pred):
+def compute_errors(gt, pred, mask=None):
     """Computation of error metrics between predicted and ground truth depths
+    Pass mask (e.g. gt > 0) to skip invalid pixels; evaluation.DepthEvaluator streams these over a dataset
     """
+    if mask is not None:
+        gt, pred = gt[mask], pred[mask]
     thresh = np.maximum((gt / pred), (pred / gt))
     d1 = (thresh < 1.25).mean()
     d2 = (thresh < 1.25 ** 2).mean()
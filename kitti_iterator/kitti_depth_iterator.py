@@ -5,32 +5,31 @@ import pathlib
 from multiprocessing.pool import Pool
 
 import time
-import yaml
 import numpy as np
-import pandas as pd
-import scipy
-
-from torch.utils.data import Dataset
-from torch.multiprocessing import Process, Queue, set_start_method
-import torch
 
 import pickle
-import cv2
 import itertools
 import glob
-import tqdm
-import open3d as o3d
 
 from .ground_removal import Processor
 
 from .helper import *
-from .kitti_raw_iterator import KittiRaw
+from .kitti_raw_iterator import KittiRaw, RANGE_IMAGE_FIELDS, list_folders
+from .disparity import DISPARITY_FIELDS
+from .calibration import CAMERAS, scale_intrinsics
+from .frame_index import FrameIdIndex
+from .sparse_depth import SPARSE_DEPTH_CACHE_DIR, sparsify_depth, densify_depth, resample_sparse_depth, open_sparse_depth_store
+from .file_source import decode_image
+
+cv2 = lazy_import('cv2')
+o3d = lazy_import('open3d')
 
 plot3d = False
 plot2d = False
 point_cloud_array = None
 if __name__ == '__main__':
     if plot3d:
+        from torch.multiprocessing import Queue, set_start_method
         set_start_method('spawn')
         point_cloud_array = Queue()
 
@@ -48,8 +47,27 @@ class KittiDepth(KittiRaw):
         gaus_n = 4,
         ground_removal=False,
         compute_trajectory=False,
-        invalidate_cache=True,
-        scale_factor=1.0, plot_3D_x=250, plot_3D_y=500, num_features=5000
+        invalidate_cache=False,
+        scale_factor=1.0, plot_3D_x=250, plot_3D_y=500, num_features=5000,
+        tracker_config="LK_SHI_TOMASI",
+        frame_cache_bytes=0,
+        frame_cache_shared=False,
+        accumulate_sweeps=0,
+        accumulate_voxel_size=0.1,
+        pose_source='oxts',
+        bev_channels=None,
+        range_image_shape=None,
+        roi_crop=None,
+        output_format='numpy',
+        tensor_dtype=None,
+        tensor_scale=None,
+        tensor_rgb=False,
+        pinned_pool_size=0,
+        file_source=None,
+        stereo_disparity=False,
+        image_scale=1.0,
+        gray_cameras_bgr=False,
+        sparse_depth=False
     ) -> None:
         super(KittiDepth, self).__init__(
             kitti_raw_base_path=kitti_raw_base_path,
@@ -63,203 +81,220 @@ class KittiDepth(KittiRaw):
             ground_removal=ground_removal,
             compute_trajectory=compute_trajectory,
             invalidate_cache=invalidate_cache,
-            scale_factor=scale_factor, plot_3D_x=plot_3D_x, plot_3D_y=plot_3D_y, num_features=num_features
+            scale_factor=scale_factor, plot_3D_x=plot_3D_x, plot_3D_y=plot_3D_y, num_features=num_features,
+            tracker_config=tracker_config,
+            frame_cache_bytes=frame_cache_bytes,
+            frame_cache_shared=frame_cache_shared,
+            accumulate_sweeps=accumulate_sweeps,
+            accumulate_voxel_size=accumulate_voxel_size,
+            pose_source=pose_source,
+            bev_channels=bev_channels,
+            range_image_shape=range_image_shape,
+            roi_crop=roi_crop,
+            output_format=output_format,
+            tensor_dtype=tensor_dtype,
+            tensor_scale=tensor_scale,
+            tensor_rgb=tensor_rgb,
+            pinned_pool_size=pinned_pool_size,
+            file_source=file_source,
+            stereo_disparity=stereo_disparity,
+            image_scale=image_scale,
+            gray_cameras_bgr=gray_cameras_bgr
         )
         self.kitti_depth_path = os.path.join(kitti_depth_base_path, 'train', sub_folder, 'proj_depth', 'groundtruth')
         self.depth_02_path = os.path.join(self.kitti_depth_path, "image_02")
         self.depth_03_path = os.path.join(self.kitti_depth_path, "image_03")
 
-        self.img_list = sorted(os.listdir(self.depth_02_path))
+        self.img_list = sorted(self.file_source.listdir(self.depth_02_path))
         self.img_list = list(map(lambda x: x.split(".png")[0], self.img_list))
         self.index = 0
 
-        print(self.depth_02_path)
-        print(self.img_list)
+        # Depth ground truth skips the first and last frames of each drive
+        self.frame_index = FrameIdIndex(self.raw_img_list, self.img_list, {
+            '02': self.img_list,
+            '03': list(map(lambda x: x.split(".png")[0], sorted(self.file_source.listdir(self.depth_03_path)))),
+        })
 
         self.frame_count = len(self)
-
-        self.intrinsics = o3d.camera.PinholeCameraIntrinsic(
-            width=self.width, height=self.height,
-            intrinsic_matrix=self.intrinsic_mat[:3,:3]
-        ) 
+        self._intrinsics = None
+        self._depth_rays = None
+
+        # Valid depth pixels of every frame packed per camera, returned instead of the dense maps
+        self.sparse_depth = sparse_depth
+        self.sparse_depth_stores = dict()
+        if self.sparse_depth:
+            for cam, depth_path in (('02', self.depth_02_path), ('03', self.depth_03_path)):
+                store = open_sparse_depth_store(
+                    os.path.join(self.kitti_depth_path, SPARSE_DEPTH_CACHE_DIR, "image_" + cam),
+                    list(map(lambda id: os.path.join(depth_path, id + ".png"), self.img_list)),
+                    invalidate_cache=invalidate_cache,
+                    file_source=file_source
+                )
+                assert store.ids == self.img_list, store.path
+                self.sparse_depth_stores[cam] = store
+
+    def raw_frame_position(self, index):
+        return int(self.frame_index.depth_to_raw[index])
+
+    def depth_frame_position(self, raw_index):
+        """Depth index of a raw frame position, -1 when it has no ground truth"""
+        return int(self.frame_index.raw_to_depth[raw_index])
+
+    def __getstate__(self):
+        # open3d intrinsics and the cached rays are rebuilt on first use
+        state = super(KittiDepth, self).__getstate__()
+        state['_intrinsics'] = None
+        state['_depth_rays'] = None
+        return state
+
+    @property
+    def intrinsics(self):
+        # Built on first use so that open3d is only imported by callers that need it
+        if self._intrinsics is None:
+            self._intrinsics = o3d.camera.PinholeCameraIntrinsic(
+                width=self.width, height=self.height,
+                intrinsic_matrix=self.intrinsic_mat[:3,:3]
+            )
+        return self._intrinsics
 
     def transform_voxel_grid_to_occupancy_grid(self, voxel_grid):
         occupancy_grid = np.zeros(self.occupancy_shape, dtype=bool)
-        for i in range(voxel_grid.shape[0]):
-            y, z, x = voxel_grid[i, :]
-            if (
-                0 <= x < self.occupancy_shape[0] and
-                0 <= y < self.occupancy_shape[1] and
-                0 <= z < self.occupancy_shape[2]
-            ):
-                occupancy_grid[x,y,z] = True
-            else:
-                pass # Warning
+        y, z, x = np.asarray(voxel_grid, dtype=np.int64).reshape(-1, 3).T
+        inside = (
+            (0 <= x) & (x < self.occupancy_shape[0]) &
+            (0 <= y) & (y < self.occupancy_shape[1]) &
+            (0 <= z) & (z < self.occupancy_shape[2])
+        )
+        occupancy_grid[x[inside], y[inside], z[inside]] = True
         return occupancy_grid
 
-    def __getitem__(self, index):
+    def depth_rays(self, shape):
+        """
+        (h, w, 3) camera-02 rays K^-1 [u, v, 1] of the rectified depth maps,
+        with the camera-02 offset to the rectified camera-00 frame from P_rect_02.
+        Both are rotated by R_rect_00^T into the unrectified camera-00 frame of
+        transform_points_to_camera, so depth and LiDAR grids line up. Maps
+        smaller than the images (image_scale) use P_rect_02 scaled to match.
+        Cached per image shape.
+        """
+        if self._depth_rays is None or self._depth_rays[0] != shape:
+            h, w = shape
+            P_rect = scale_intrinsics(self.calib_cam_to_cam['P_rect_02'].reshape(3, 4), w / self.width, h / self.height)
+            R_rect = self.calib_cam_to_cam['R_rect_00'].reshape(3, 3)
+            K_inv = np.linalg.inv(P_rect[:3,:3])
+            u, v = np.meshgrid(np.arange(w, dtype=np.float64), np.arange(h, dtype=np.float64))
+            rays = np.stack((u, v, np.ones_like(u)), axis=-1) @ K_inv.T @ R_rect
+            offset = R_rect.T @ K_inv @ P_rect[:,3]
+            self._depth_rays = (shape, rays, offset)
+        return self._depth_rays[1:]
+
+    def transform_depth_to_occupancy_grid(self, depth):
+        """
+        Back-projects a metric depth map of camera 02 and voxelizes it into
+        occupancy_shape with the grid indexing of transform_points_to_occupancy_grid.
+        Returns the boolean occupancy grid and the (M, 3) unique occupied indices.
+        """
+        return self.transform_sparse_depth_to_occupancy_grid(sparsify_depth(depth))
+
+    def transform_sparse_depth_to_occupancy_grid(self, sparse_depth):
+        """transform_depth_to_occupancy_grid for the output of sparsify_depth"""
+        rays, offset = self.depth_rays(tuple(sparse_depth['shape']))
+        rays = rays.reshape(-1, 3)[sparse_depth['indices']]
+        points_camera = rays * sparse_depth['depth'][:, None] - offset
+        indices, inside = self.camera_points_to_occupancy_indices(points_camera)
+        voxel_grid = np.unique(indices[inside], axis=0)
+        occupancy_grid = np.zeros(self.occupancy_shape, dtype=bool)
+        occupancy_grid[voxel_grid[:,0], voxel_grid[:,1], voxel_grid[:,2]] = True
+        return occupancy_grid, voxel_grid
+
+    def available_fields(self):
+        fields = []
+        for cam in CAMERAS:
+            fields += ['image_' + cam, 'image_' + cam + '_raw', 'roi_' + cam, 'K_' + cam, 'R_' + cam, 'T_' + cam]
+        fields += ['calib_cam_to_cam', 'calib_imu_to_velo', 'calib_velo_to_cam']
+        fields += ['occupancy_grid', 'velodyine_points', 'voxel_grid']
+        if self.sparse_depth:
+            fields += ['depth_sparse_02', 'depth_sparse_03']
+        else:
+            fields += ['depth_image_02', 'depth_image_03']
+        if self.bev_channels is not None:
+            fields += ['bev']
+        if self.range_image_shape is not None:
+            fields += RANGE_IMAGE_FIELDS
+        if self.stereo_disparity:
+            fields += DISPARITY_FIELDS
+        return fields
+
+    def depth_path(self, cam, index):
+        return os.path.join(getattr(self, 'depth_' + cam + '_path'), self.img_list[index] + ".png")
+
+    def depth_fields(self, cam):
+        fields = ['depth_image_' + cam, 'depth_sparse_' + cam]
+        if cam == '02':
+            fields += ['occupancy_grid', 'voxel_grid']
+        return fields
+
+    def wants_lidar(self):
+        return self.wants('velodyine_points', 'bev', *(RANGE_IMAGE_FIELDS + DISPARITY_FIELDS))
+
+    def frame_paths(self, index):
+        paths = super(KittiDepth, self).frame_paths(index)
+        if not self.sparse_depth:
+            paths += list(map(
+                lambda cam: self.depth_path(cam, index),
+                filter(lambda cam: self.wants(*self.depth_fields(cam)), ('02', '03'))
+            ))
+        return paths
+
+    def load_depth(self, index, cam):
+        """Full resolution sparse metric depth of camera cam"""
+        if self.sparse_depth:
+            return self.sparse_depth_stores[cam][index]
+        depth_path = self.depth_path(cam, index)
+        # KITTI depth maps are uint16 PNGs holding depth * 256, 0 where unknown
+        depth_png = decode_image(self.file_source.read(depth_path), cv2.IMREAD_ANYDEPTH, depth_path)
+        return sparsify_depth(depth_png.astype(np.float32) / 256.0)
+
+    def scaled_depth(self, depth_sparse):
+        """Sparse depth at the size of the camera images decoded with image_scale"""
+        if self.image_reduction == 1:
+            return depth_sparse
+        h, w = depth_sparse['shape']
+        return resample_sparse_depth(depth_sparse, (h // self.image_reduction, w // self.image_reduction))
+
+    def legacy_depth_image(self, depth_sparse):
+        """Legacy 3-channel uint8 depth image: whole metres, i.e. the depth PNG >> 8"""
+        return np.repeat(densify_depth(depth_sparse).astype(np.uint8)[:,:,None], 3, axis=2)
+
+    def load_frame(self, index):
         id = self.img_list[index]
-        depth_02 = os.path.join(self.depth_02_path, id + ".png")
-        depth_03 = os.path.join(self.depth_03_path, id + ".png")
-        
-        image_00 = os.path.join(self.image_00_path, 'data', id + ".png")
-        image_01 = os.path.join(self.image_01_path, 'data', id + ".png")
-        image_02 = os.path.join(self.image_02_path, 'data', id + ".png")
-        image_03 = os.path.join(self.image_03_path, 'data', id + ".png")
-        velodyine_points = os.path.join(self.velodyne_points_path, 'data', id + ".bin")
-        
-        assert os.path.exists(depth_02), depth_02
-        assert os.path.exists(depth_03), depth_03
-
-        assert os.path.exists(image_00), image_00
-        assert os.path.exists(image_01), image_01
-        assert os.path.exists(image_02), image_02
-        assert os.path.exists(image_03), image_03
-        assert os.path.exists(velodyine_points), velodyine_points
-
-        depth_02_raw = cv2.imread(depth_02)
-        depth_03_raw = cv2.imread(depth_03)
-
-        image_00_raw = cv2.imread(image_00)
-        image_01_raw = cv2.imread(image_01)
-        image_02_raw = cv2.imread(image_02)
-        image_03_raw = cv2.imread(image_03)
-        
-        x, y, w, h = self.roi_00
-        image_00 = cv2.undistort(image_00_raw, self.K_00, self.D_00, None, self.new_K_00)
-        image_00 = image_00[y:y+h, x:x+w]
-
-        x, y, w, h = self.roi_01
-        image_01 = cv2.undistort(image_01_raw, self.K_01, self.D_01, None, self.new_K_01)
-        image_01 = image_01[y:y+h, x:x+w]
-
-        x, y, w, h = self.roi_02
-        image_02 = cv2.undistort(image_02_raw, self.K_02, self.D_02, None, self.new_K_02)
-        image_02 = image_02[y:y+h, x:x+w]
-
-        x, y, w, h = self.roi_03
-        image_03 = cv2.undistort(image_03_raw, self.K_03, self.D_03, None, self.new_K_03)
-        image_03 = image_03[y:y+h, x:x+w]
-
-
-        # velodyine_points = np.fromfile(velodyine_points, dtype=np.float32)
-        # velodyine_points = np.reshape(velodyine_points, (velodyine_points.shape[0]//4, 4))
-        velodyine_points = np.fromfile(velodyine_points, dtype=np.float32).reshape(-1, 4)[:,:3]
-
-        if self.ground_removal:
-            velodyine_points = velodyine_points * np.array([1.0,1.0,-1.0]) # revert the z axis
-            velodyine_points = self.process(velodyine_points)
-            velodyine_points = velodyine_points * np.array([1.0,1.0,-1.0]) # revert the z axis
-        
-        rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
-            o3d.geometry.Image(image_02_raw), o3d.geometry.Image(depth_02_raw),
-            convert_rgb_to_intensity=False
-        )
-        occupancy_grid_pcd = o3d.geometry.PointCloud.create_from_rgbd_image(
-            rgbd, self.intrinsics
-        )
-        
-        occupancy_grid_pcd.remove_non_finite_points()
-        occupancy_grid_data = o3d.geometry.VoxelGrid.create_from_point_cloud(occupancy_grid_pcd,
-                                                                voxel_size=0.00000075)
-
-        voxels = occupancy_grid_data.get_voxels()  # returns list of voxels
-        voxel_grid = np.stack(list(vx.grid_index for vx in voxels))
-        voxel_grid_colors = np.stack(list(vx.color for vx in voxels))
-
-        print('voxels range', occupancy_grid_data.get_min_bound(), occupancy_grid_data.get_max_bound())
-        print('voxel_grid range', np.min(voxel_grid), np.max(voxel_grid))
-        print('voxel_grid_x range', np.min(voxel_grid[:,0]), np.max(voxel_grid[:,0]))
-        print('voxel_grid_y range', np.min(voxel_grid[:,1]), np.max(voxel_grid[:,1]))
-        print('voxel_grid_z range', np.min(voxel_grid[:,2]), np.max(voxel_grid[:,2]))
-        print('voxel_size, origin', occupancy_grid_data.voxel_size, occupancy_grid_data.origin)
-
-        occupancy_grid = self.transform_voxel_grid_to_occupancy_grid(voxel_grid)
-
-        print(occupancy_grid.shape)
-
-
-        # P_rect = self.calib_cam_to_cam['P_rect_00'].reshape(3, 4)[:3,:3]
-        # image_points = self.transform_points_to_image_space(velodyine_points, self.roi_00, self.K_00, self.R_00, self.T_00, P_rect, color_fn=depth_color)
-        # image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        # dilatation_size = 3
-        # dilation_shape = cv2.MORPH_ELLIPSE
-        # element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-        #                                 (dilatation_size, dilatation_size))
-        # depth_image_00 = cv2.dilate(image_points, element)
-
-        # P_rect = self.calib_cam_to_cam['P_rect_01'].reshape(3, 4)[:3,:3]
-        # image_points = self.transform_points_to_image_space(velodyine_points, self.roi_01, self.K_01, self.R_01, self.T_01, P_rect, color_fn=depth_color)
-        # image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        # dilatation_size = 3
-        # dilation_shape = cv2.MORPH_ELLIPSE
-        # element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-        #                                 (dilatation_size, dilatation_size))
-        # depth_image_01 = cv2.dilate(image_points, element)
-
-        # P_rect = self.calib_cam_to_cam['P_rect_02'].reshape(3, 4)[:3,:3]
-        # image_points = self.transform_points_to_image_space(velodyine_points, self.roi_02, self.K_02, self.R_02, self.T_02, P_rect, color_fn=depth_color)
-        # image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        # dilatation_size = 3
-        # dilation_shape = cv2.MORPH_ELLIPSE
-        # element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-        #                                 (dilatation_size, dilatation_size))
-        # depth_image_02 = cv2.dilate(image_points, element)
-
-        # P_rect = self.calib_cam_to_cam['P_rect_03'].reshape(3, 4)[:3,:3]
-        # image_points = self.transform_points_to_image_space(velodyine_points, self.roi_03, self.K_03, self.R_03, self.T_03, P_rect, color_fn=depth_color)
-        # image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        # dilatation_size = 3
-        # dilation_shape = cv2.MORPH_ELLIPSE
-        # element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-        #                                 (dilatation_size, dilatation_size))
-        # depth_image_03 = cv2.dilate(image_points, element)
-
-        data = {
-            'image_00': image_00, 
-            'image_01': image_01, 
-            'image_02': image_02, 
-            'image_03': image_03,
-            'image_00_raw': image_00_raw, 
-            'image_01_raw': image_01_raw, 
-            'image_02_raw': image_02_raw, 
-            'image_03_raw': image_03_raw,
-            'roi_00': self.roi_00,
-            'roi_01': self.roi_01,
-            'roi_02': self.roi_02,
-            'roi_03': self.roi_03,
-            'K_00': self.K_00,
-            'K_01': self.K_01,
-            'K_02': self.K_02,
-            'K_03': self.K_03,
-            
-            'R_00': self.R_00,
-            'R_01': self.R_01,
-            'R_02': self.R_02,
-            'R_03': self.R_03,
-
-            'T_00': self.T_00,
-            'T_01': self.T_01,
-            'T_02': self.T_02,
-            'T_03': self.T_03,
-
-            'calib_cam_to_cam': self.calib_cam_to_cam,
-            'calib_imu_to_velo': self.calib_imu_to_velo,
-            'calib_velo_to_cam': self.calib_velo_to_cam,
-
-            'occupancy_grid': occupancy_grid,
-            'velodyine_points': velodyine_points,
-            'voxel_grid': voxel_grid,
-
-            'depth_image_02': depth_02_raw,
-            'depth_image_03': depth_03_raw,
-        }
-        for key in self.transform:
-            data[key] = self.transform[key](data[key])
-        return data
-
-def get_kitti_tree(kitti_depth_base_path):
-    date_folder_list = list(filter(os.path.isdir, glob.glob(os.path.join(kitti_depth_base_path, 'train', '*'))))
+        data = self.load_images(id)
+        data.update(self.calibration_fields())
+
+        for cam in ('02', '03'):
+            if not self.wants(*self.depth_fields(cam)):
+                continue
+            depth_sparse = self.load_depth(index, cam)
+            # Voxelized at full resolution, the grid does not depend on image_scale
+            if cam == '02' and self.wants('occupancy_grid', 'voxel_grid'):
+                data['occupancy_grid'], data['voxel_grid'] = self.transform_sparse_depth_to_occupancy_grid(depth_sparse)
+            depth_sparse = self.scaled_depth(depth_sparse)
+            if self.sparse_depth:
+                data['depth_sparse_' + cam] = depth_sparse
+            elif self.wants('depth_image_' + cam):
+                data['depth_image_' + cam] = self.legacy_depth_image(depth_sparse)
+
+        if self.wants_lidar():
+            velodyine_sweep = self.load_velodyne_points(index)
+            velodyine_scan = self.remove_ground(velodyine_sweep)
+            data['velodyine_points'] = velodyine_scan[:,:3]
+            data.update(self.lidar_raster_fields(velodyine_scan, velodyine_sweep))
+
+        return self.finish_frame(data)
+
+def get_kitti_tree(kitti_depth_base_path, file_source=None):
+    drive_folder_list = list_folders(os.path.join(kitti_depth_base_path, 'train'), file_source)
+    date_folder_list = drive_folder_list
     # print('date_folder_list', date_folder_list)
     date_folder_list = list(filter(lambda i: len(i.split('_'))==7, date_folder_list))
     kitti_tree = dict()
@@ -270,12 +305,9 @@ def get_kitti_tree(kitti_depth_base_path):
         def folder_filter(folder):
             fold_date_id = folder.split('/')[-1]
             fold_date_id = fold_date_id.split('_drive_')[0]
-            return (
-                os.path.isdir(folder) and
-                fold_date_id == date_id
-            )
+            return fold_date_id == date_id
         # print(date_id)
-        sub_folder_list = list(filter(folder_filter, glob.glob(os.path.join(kitti_depth_base_path, 'train', '*')) ))
+        sub_folder_list = list(filter(folder_filter, drive_folder_list))
         sub_folder_list = list(filter(lambda i: len(i.split('/')[-1].split('_'))==6, sub_folder_list))
         sub_folder_list = list(map(lambda i: i.split('/')[-1], sub_folder_list))
 
@@ -286,7 +318,7 @@ def get_kitti_tree(kitti_depth_base_path):
 def get_kitti_depth(**kwargs):
     kitti_raw_base_path=kwargs['kitti_raw_base_path']
     kitti_depth_base_path=kwargs['kitti_depth_base_path']
-    kitti_tree = get_kitti_tree(kitti_depth_base_path)
+    kitti_tree = get_kitti_tree(kitti_depth_base_path, kwargs.get('file_source'))
     kitti_raw = []
     for date_folder in kitti_tree:
         for sub_folder in kitti_tree[date_folder]:
@@ -519,6 +551,7 @@ if __name__ == "__main__":
     main(None)
     exit()
     if plot3d:
+        from torch.multiprocessing import Process
         image_loop_proc = Process(target=main, args=(point_cloud_array, ))
         image_loop_proc.start()
         
@@ -3,32 +3,48 @@ import os
 import pathlib
 
 from multiprocessing.pool import Pool
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 import time
-import yaml
 import numpy as np
-import pandas as pd
-import scipy
-
-from torch.utils.data import Dataset
-from torch.multiprocessing import Process, Queue, set_start_method
-import torch
 
 import pickle
-import cv2
 import itertools
 import glob
-import tqdm
+import numbers
 
 from .ground_removal import Processor
+from .calibration import open_yaml, open_calib, get_calibration, scale_intrinsics
+from .frame_cache import FrameCache, SharedFrameCache
+from .trajectory import TrajectoryStore, trajectory_params, trajectory_key, open_valid_trajectory, prune_stale_trajectories, load_oxts_poses
+from .accumulation import accumulate_sweeps
+from .range_image import spherical_projection
+from .calibration import CAMERAS, GRAY_CAMERAS
+from .tensor_output import PinnedBufferPool, TensorWriter
+from .transforms import as_pipeline, apply_image_ops, Crop, Resize, Grayscale
+from .file_source import LocalFileSource, decode_image, decode_velodyne, image_decode_flag
+from .disparity import DISPARITY_FIELDS, lidar_disparity
 
 from .helper import *
 
+# Heavy dependencies are imported on first use, keeping `import kitti_iterator` cheap
+cv2 = lazy_import('cv2')
+pd = lazy_import('pandas')
+scipy = lazy_import('scipy')
+torch = lazy_import('torch')
+tqdm = lazy_import('tqdm')
+
 TRAJECTORY_CACHE_DIR = ".trajectory_cache"
 # Z_OFFSET = 1.5
 # Z_OFFSET = 3.0
 # Z_OFFSET = 2.5
 Z_OFFSET = 1.1
+
+BEV_CHANNELS = ('max_height', 'min_height', 'density', 'reflectance')
+RANGE_IMAGE_FIELDS = ['range_image', 'range_mask', 'range_point_index', 'range_pixel_index']
+LIDAR_FIELDS = ['velodyine_points', 'occupancy_grid', 'occupancy_mask_2d', 'velodyine_points_camera', 'bev'] + \
+    RANGE_IMAGE_FIELDS + DISPARITY_FIELDS + list(map(lambda cam: 'depth_image_' + cam, CAMERAS))
 v_fov=(-24.9, 4.0)
 h_fov=(-85,85)
 # Sensor Setup: https://www.cvlibs.net/datasets/kitti/setup.php
@@ -38,31 +54,28 @@ plot2d = False
 point_cloud_array = None
 if __name__ == '__main__':
     if plot3d:
+        from torch.multiprocessing import Queue, set_start_method
         set_start_method('spawn')
         point_cloud_array = Queue()
 
-def open_yaml(settings_doc):
-    settings_doc = settings_doc
-    cam_settings = {}
-    with open(settings_doc, 'r') as stream:
-        try:
-            cam_settings = yaml.load(stream, Loader=yaml.FullLoader)
-        except yaml.YAMLError as exc:
-            print(exc)
-    return cam_settings
-
-def open_calib(calib_file):
-    data = open_yaml(calib_file)
-    for k in data:
-        try:
-            data[k] = np.array(list(map(float, data[k].split(" "))))
-        except:
-            pass
-    return data
-
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-
-def gaus_blur_3D(data, sigma = 1.0, n=5, device = device):
+_device = None
+
+def get_device():
+    """torch.device to run on, probed on first call instead of at import"""
+    global _device
+    if _device is None:
+        _device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    return _device
+
+def __getattr__(name):
+    # `device` used to be a module level constant
+    if name == 'device':
+        return get_device()
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+
+def gaus_blur_3D(data, sigma = 1.0, n=5, device = None):
+    if device is None:
+        device = get_device()
     # first build the smoothing kernel
     x = np.arange(-n,n+1,1)
     y = np.arange(-n,n+1,1)
@@ -126,7 +139,36 @@ def convert_voxel_chunk_to_point(chunk_id, grid_x, grid_y, grid_z, occ_x, occ_y,
     )]
     return points
 
-class KittiRaw(Dataset):
+def is_velodyne_bounds(value):
+    """Whether a roi_crop value is one ((x_min, x_max), (y_min, y_max), (z_min, z_max)) box rather than a list of stages"""
+    def is_pair(item):
+        return not isinstance(item, str) and len(item) == 2 and all(map(lambda bound: isinstance(bound, numbers.Real), item))
+    try:
+        return not isinstance(value, str) and len(value) == 3 and all(map(is_pair, value))
+    except TypeError: # unsized items
+        return False
+
+def calibration_attributes(calibration):
+    """Attributes KittiRaw mirrors from its KittiCalibration, omitted from its pickled state"""
+    attributes = {
+        'calib_cam_to_cam': calibration.calib_cam_to_cam,
+        'calib_imu_to_velo': calibration.calib_imu_to_velo,
+        'calib_velo_to_cam': calibration.calib_velo_to_cam,
+        'R': calibration.R, 'T': calibration.T,
+        'w': calibration.width, 'h': calibration.height,
+        'width': calibration.width, 'height': calibration.height,
+        'intrinsic_mat': calibration.intrinsic_mat,
+    }
+    for cam in CAMERAS:
+        for name in ('K_', 'D_', 'R_', 'T_', 'S_', 'new_K_', 'roi_'):
+            attributes[name + cam] = getattr(calibration, name + cam)
+        attributes['S_' + cam + '_unrect'] = getattr(calibration, 'S_' + cam + '_unrect')
+        x, y, w, h = getattr(calibration, 'roi_' + cam)
+        attributes.update({'x_' + cam: x, 'y_' + cam: y, 'w_' + cam: w, 'h_' + cam: h})
+    return attributes
+
+class KittiRaw:
+    # Map-style dataset: usable with torch.utils.data.DataLoader without importing torch here
 
     def __init__(self, 
         kitti_raw_base_path="kitti_raw_mini",
@@ -139,12 +181,36 @@ class KittiRaw(Dataset):
         gaus_n = 4,
         ground_removal=False,
         compute_trajectory=False,
-        invalidate_cache=True,
-        scale_factor=1.0, plot_3D_x=250, plot_3D_y=500, num_features=5000
+        invalidate_cache=False,
+        scale_factor=1.0, plot_3D_x=250, plot_3D_y=500, num_features=5000,
+        tracker_config="LK_SHI_TOMASI",
+        frame_cache_bytes=0,
+        frame_cache_shared=False,
+        accumulate_sweeps=0,
+        accumulate_voxel_size=0.1,
+        pose_source='oxts',
+        bev_channels=None,
+        range_image_shape=None,
+        roi_crop=None,
+        output_format='numpy',
+        tensor_dtype=None,
+        tensor_scale=None,
+        tensor_rgb=False,
+        pinned_pool_size=0,
+        file_source=None,
+        stereo_disparity=False,
+        image_scale=1.0,
+        gray_cameras_bgr=False
     ) -> None:
         self.gaus_n = gaus_n
         self.sigma = sigma
-        self.transform = transform
+        # Pipeline of Transform stages; the legacy {field: fn} dict is still accepted
+        self.transform = as_pipeline(transform)
+        self._field_plan = None
+        self._undistortion_maps = dict()
+        # Where files are read from: the local filesystem, zip archives (archive) or
+        # prefetched over slow storage (async_reader)
+        self.file_source = LocalFileSource() if file_source is None else file_source
         self.plot3d = True
         self.plot2d = True
         if type(scale) == float:
@@ -153,9 +219,7 @@ class KittiRaw(Dataset):
         self.grid_size = grid_size
         self.ground_removal = ground_removal
         
-        if self.ground_removal:
-            self.process = Processor(n_segments=70, n_bins=80, line_search_angle=0.3, max_dist_to_line=0.15,
-                sensor_height=1.73, max_start_height=0.5, long_threshold=8)
+        self._process = None
 
         self.occupancy_shape = list(map(lambda ind: int(self.grid_size[ind]*self.scale[ind]), range(len(self.grid_size))))
         # self.occupancy_mask_2d_shape = list(map(lambda i: int(i*self.scale), self.grid_size[:2]))
@@ -175,93 +239,139 @@ class KittiRaw(Dataset):
         self.calib_imu_to_velo_txt = os.path.join(self.kitti_raw_path, "calib_imu_to_velo.txt")
         self.calib_velo_to_cam_txt = os.path.join(self.kitti_raw_path, "calib_velo_to_cam.txt")
 
-        self.calib_cam_to_cam = open_calib(self.calib_cam_to_cam_txt)
-        self.calib_imu_to_velo = open_calib(self.calib_imu_to_velo_txt)
-        self.calib_velo_to_cam = open_calib(self.calib_velo_to_cam_txt)
+        self.set_calibration(get_calibration(self.kitti_raw_path, file_source))
 
-        self.R = np.reshape(self.calib_velo_to_cam['R'], (3,3))
-        self.T = np.reshape(self.calib_velo_to_cam['T'], (3,1))
-
-        self.K_00 = np.reshape(self.calib_cam_to_cam['K_00'], (3,3))
-        self.S_00_unrect = np.reshape(self.calib_cam_to_cam['S_00'], (1,2))
-        self.S_00 = np.reshape(self.calib_cam_to_cam['S_rect_00'], (1,2))
-        
-        self.D_00 = np.reshape(self.calib_cam_to_cam['D_00'], (1,5))
-        self.R_00 = np.reshape(self.calib_cam_to_cam['R_00'], (3,3))
-        self.T_00 = np.reshape(self.calib_cam_to_cam['T_00'], (3,1))
-
-        self.K_01 = np.reshape(self.calib_cam_to_cam['K_01'], (3,3))
-        self.S_01_unrect = np.reshape(self.calib_cam_to_cam['S_01'], (1,2))
-        self.S_01 = np.reshape(self.calib_cam_to_cam['S_rect_01'], (1,2))
-        self.D_01 = np.reshape(self.calib_cam_to_cam['D_01'], (1,5))
-        self.R_01 = np.reshape(self.calib_cam_to_cam['R_01'], (3,3))
-        self.T_01 = np.reshape(self.calib_cam_to_cam['T_01'], (3,1))
-
-        self.K_02 = np.reshape(self.calib_cam_to_cam['K_02'], (3,3))
-        self.S_02_unrect = np.reshape(self.calib_cam_to_cam['S_02'], (1,2))
-        self.S_02 = np.reshape(self.calib_cam_to_cam['S_rect_02'], (1,2))
-        self.D_02 = np.reshape(self.calib_cam_to_cam['D_02'], (1,5))
-        self.R_02 = np.reshape(self.calib_cam_to_cam['R_02'], (3,3))
-        self.T_02 = np.reshape(self.calib_cam_to_cam['T_02'], (3,1))
-
-        self.K_03 = np.reshape(self.calib_cam_to_cam['K_03'], (3,3))
-        self.S_03_unrect = np.reshape(self.calib_cam_to_cam['S_03'], (1,2))
-        self.S_03 = np.reshape(self.calib_cam_to_cam['S_rect_03'], (1,2))
-        self.D_03 = np.reshape(self.calib_cam_to_cam['D_03'], (1,5))
-        self.R_03 = np.reshape(self.calib_cam_to_cam['R_03'], (3,3))
-        self.T_03 = np.reshape(self.calib_cam_to_cam['T_03'], (3,1))
-
-        self.w, self.h = list(map(int, (self.S_00[0][0], self.S_00[0][1])))
-        self.width, self.height = list(map(int, (self.S_00[0][0], self.S_00[0][1])))
-        self.new_K_00, self.roi_00 = cv2.getOptimalNewCameraMatrix(self.K_00, self.D_00, (self.w, self.h), 1, (self.w, self.h))
-        self.x_00, self.y_00, self.w_00, self.h_00 = self.roi_00
-
-        self.new_K_01, self.roi_01 = cv2.getOptimalNewCameraMatrix(self.K_01, self.D_01, (self.w, self.h), 1, (self.w, self.h))
-        self.x_01, self.y_01, self.w_01, self.h_01 = self.roi_01
-
-        self.new_K_02, self.roi_02 = cv2.getOptimalNewCameraMatrix(self.K_02, self.D_02, (self.w, self.h), 1, (self.w, self.h))
-        self.x_02, self.y_02, self.w_02, self.h_02 = self.roi_02
-
-        self.new_K_03, self.roi_03 = cv2.getOptimalNewCameraMatrix(self.K_03, self.D_03, (self.w, self.h), 1, (self.w, self.h))
-        self.x_03, self.y_03, self.w_03, self.h_03 = self.roi_03
-
-        self.intrinsic_mat = self.new_K_02
-        self.intrinsic_mat = np.vstack((
-            np.hstack((
-                self.intrinsic_mat, np.zeros((3,1))
-            )), 
-            np.zeros((1,4))
-        ))
-
-        self.img_list = sorted(os.listdir(os.path.join(self.image_00_path, 'data')))
+        self.img_list = sorted(self.file_source.listdir(os.path.join(self.image_00_path, 'data')))
         self.img_list = list(map(lambda x: x.split(".png")[0], self.img_list))
+        self.raw_img_list = self.img_list
         self.index = 0
 
         self.frame_count = len(self)
 
+        # Neighbouring sweeps merged into each frame's point cloud, as (past, future) frame counts
+        if type(accumulate_sweeps) == int:
+            accumulate_sweeps = (accumulate_sweeps, 0)
+        assert pose_source in ('oxts', 'trajectory'), pose_source
+        assert pose_source != 'trajectory' or compute_trajectory or accumulate_sweeps == (0, 0), "pose_source='trajectory' needs compute_trajectory=True"
+        self.accumulate_sweeps = tuple(accumulate_sweeps)
+        self.accumulate_voxel_size = accumulate_voxel_size
+        self.pose_source = pose_source
+        self.sweep_poses = None
+
+        # Bird's-eye-view raster returned as 'bev' when channels are given
+        assert bev_channels is None or set(bev_channels) <= set(BEV_CHANNELS), bev_channels
+        self.bev_channels = None if bev_channels is None else tuple(bev_channels)
+        # Camera images written into (C, H, W) tensors, other arrays turned into tensors
+        assert output_format in ('numpy', 'tensor'), output_format
+        self.output_format = output_format
+        self.tensor_writer = None
+        if output_format == 'tensor':
+            assert not (pinned_pool_size > 0 and frame_cache_bytes > 0), "pooled buffers are recycled, they cannot be cached"
+            pool = PinnedBufferPool(pinned_pool_size) if pinned_pool_size > 0 else None
+            self.tensor_writer = TensorWriter(tensor_dtype, tensor_scale, tensor_rgb, pool)
+
+        # Pre-crop of every sweep right after loading: 'fov', 'grid', bounds or a list of them
+        if roi_crop is None or isinstance(roi_crop, str) or is_velodyne_bounds(roi_crop):
+            roi_crop = [] if roi_crop is None else [roi_crop]
+        self.roi_crop = list(roi_crop)
+
+        # LiDAR disparity of the rectified 02/03 pair (image_02_raw, image_03_raw)
+        self.stereo_disparity = stereo_disparity
+
+        # Camera images decoded and undistorted at 1, 1/2, 1/4 or 1/8 of the full resolution,
+        # with K_0x, roi_0x and the LiDAR projections scaled to match
+        assert image_scale in (1.0, 0.5, 0.25, 0.125), image_scale
+        self.image_scale = image_scale
+        self.image_reduction = int(round(1.0 / image_scale))
+        # Cameras 00/01 are kept single channel (h, w) unless the 3-channel BGR layout is asked for
+        self.gray_cameras_bgr = gray_cameras_bgr
+
+        # (height, width) of the spherical range image returned with its mask and indices
+        self.range_image_shape = None if range_image_shape is None else tuple(range_image_shape)
+
+        self.frame_cache = None
         self.compute_trajectory = compute_trajectory
 
         if self.compute_trajectory:
             cached_trajectory_folder = os.path.join(self.raw_data_path, TRAJECTORY_CACHE_DIR)
             os.makedirs(cached_trajectory_folder, exist_ok=True)
-            self.cached_trajectory_path = os.path.join(cached_trajectory_folder, os.path.basename(self.raw_data_path) + ".pkl")
-            
-            if not os.path.exists(self.cached_trajectory_path) or invalidate_cache:
-                self.compute_slam(scale_factor, plot_3D_x, plot_3D_y, num_features)
+            self.trajectory_params = trajectory_params(self.img_list, scale_factor, num_features, tracker_config)
+            self.cached_trajectory_path = os.path.join(
+                cached_trajectory_folder, 
+                os.path.basename(self.raw_data_path) + "_" + trajectory_key(self.trajectory_params)
+            )
+
+            store = None
+            if not invalidate_cache:
+                store = open_valid_trajectory(self.cached_trajectory_path, self.trajectory_params)
+
+            if store is None:
+                self.compute_slam(scale_factor, plot_3D_x, plot_3D_y, num_features, tracker_config, resume=False)
+            elif not store.complete:
+                print("Resuming trajectory from frame", store.tracked, ":", self.cached_trajectory_path)
+                self.compute_slam(scale_factor, plot_3D_x, plot_3D_y, num_features, tracker_config, resume=True)
             else:
                 print("Loading trajectory from cache: ", self.cached_trajectory_path)
-                with open(self.cached_trajectory_path, 'rb') as handle:
-                    self.trajectory = pickle.load(handle)
-
-                # self.trajectory = pd.read_csv(self.cached_trajectory_path)
+                self.trajectory = store
         else: 
-            self.trajectory = pd.DataFrame({
+            self.trajectory = None
+
+        # Byte-budgeted LRU cache of finished samples, disabled by default
+        self.frame_cache = None
+        if frame_cache_bytes > 0:
+            if frame_cache_shared:
+                self.frame_cache = SharedFrameCache(frame_cache_bytes)
+            else:
+                self.frame_cache = FrameCache(frame_cache_bytes)
+
+    def set_calibration(self, calibration):
+        """Binds the shared KittiCalibration and its per-camera aliases (K_02, roi_02, x_02, ...)"""
+        self.calibration = calibration
+        self.__dict__.update(calibration_attributes(calibration))
+
+    def __getstate__(self):
+        # Slim state for DataLoader workers: paths, manifest and a calibration handle.
+        # Stores pickle by path; caches, aliases and helper objects are rebuilt lazily.
+        state = self.__dict__.copy()
+        for key in calibration_attributes(self.calibration):
+            state.pop(key)
+        state['_process'] = None
+        state['_field_plan'] = None
+        state['_undistortion_maps'] = dict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.set_calibration(self.calibration)
+
+    @property
+    def process(self):
+        # Ground removal Processor, built on first use in each process
+        if self._process is None:
+            self._process = Processor(n_segments=70, n_bins=80, line_search_angle=0.3, max_dist_to_line=0.15,
+                sensor_height=1.73, max_start_height=0.5, long_threshold=8)
+        return self._process
+
+    @property
+    def trajectory(self):
+        # TrajectoryStore when computed, else an empty DataFrame made on access
+        if self._trajectory is None:
+            return pd.DataFrame({
                 'x':[], 'y':[], 'z': [], 'rot': []
             })
+        return self._trajectory
+
+    @trajectory.setter
+    def trajectory(self, trajectory):
+        self._trajectory = trajectory
 
     def __len__(self):
         return len(self.img_list)
 
+    def __add__(self, other):
+        from torch.utils.data import ConcatDataset
+        return ConcatDataset([self, other])
+
     def __iter__(self):
         self.index = 0
         return self
@@ -273,7 +383,7 @@ class KittiRaw(Dataset):
         self.index += 1
         return data
 
-    def compute_slam(self, scale_factor=0.25, plot_3D_x=250, plot_3D_y=500, num_features=2000):
+    def compute_slam(self, scale_factor=0.25, plot_3D_x=250, plot_3D_y=500, num_features=2000, tracker_config="LK_SHI_TOMASI", resume=False, checkpoint_interval=50):
         # from extras.pyslam.visual_odometry import VisualOdometry
         from .pyslam.visual_odometry import VisualOdometry
         # from .pyslam.visual_imu_gps_odometry import Visual_IMU_GPS_Odometry
@@ -282,9 +392,22 @@ class KittiRaw(Dataset):
         from .pyslam.feature_tracker_configs import FeatureTrackerConfigs
         from .pyslam.feature_tracker import feature_tracker_factory
 
-        self.trajectory = {
-            'x':[], 'y':[], 'z': [], 'rot': []
-        }
+        params = trajectory_params(self.img_list, scale_factor, num_features, tracker_config)
+        if resume and TrajectoryStore.exists(self.cached_trajectory_path):
+            self.trajectory = TrajectoryStore(self.cached_trajectory_path, mode='r+')
+            assert self.trajectory.frame_count == self.frame_count, (self.trajectory.frame_count, self.frame_count)
+        else:
+            self.trajectory = TrajectoryStore.create(self.cached_trajectory_path, self.frame_count, params)
+            prune_stale_trajectories(self.cached_trajectory_path)
+
+        # Visual odometry state cannot be restored, so a resumed run starts a
+        # fresh tracker on the last tracked frame and chains its poses onto it
+        start_id = self.trajectory.tracked
+        if start_id > 0:
+            anchor_t, anchor_R = map(np.array, self.trajectory.get_pose(start_id - 1))
+            start_id -= 1
+        else:
+            anchor_t, anchor_R = np.zeros(3), np.eye(3,3)
 
         cam = PinholeCamera(
             round(self.width * scale_factor),
@@ -300,7 +423,7 @@ class KittiRaw(Dataset):
         # select your tracker configuration (see the file feature_tracker_configs.py) 
         # LK_SHI_TOMASI, LK_FAST
         # SHI_TOMASI_ORB, FAST_ORB, ORB, BRISK, AKAZE, FAST_FREAK, SIFT, ROOT_SIFT, SURF, SUPERPOINT, FAST_TFEAT
-        tracker_config = FeatureTrackerConfigs.LK_SHI_TOMASI
+        tracker_config = dict(getattr(FeatureTrackerConfigs, tracker_config))
         tracker_config['num_features'] = num_features
         
         feature_tracker = feature_tracker_factory(**tracker_config)
@@ -309,13 +432,15 @@ class KittiRaw(Dataset):
         self.vo = VisualOdometry(cam, None, feature_tracker)
         print("Computing Trajectory")
         plot_3D = np.zeros((plot_3D_x, plot_3D_y, 3))
-        for img_id in tqdm.tqdm(range(0, self.frame_count, 1)):
+        img_id = start_id - 1
+        for img_id in tqdm.tqdm(range(start_id, self.frame_count, 1), desc=os.path.basename(self.raw_data_path)):
             data_frame = self.__getitem__(img_id)
 
             image_data_frame = data_frame['image_00_raw']
 
             image_data_frame_scaled = cv2.resize(image_data_frame, (round(self.width * scale_factor), round(self.height * scale_factor)))
-            image_data_frame_scaled = cv2.cvtColor(image_data_frame_scaled, cv2.COLOR_RGB2GRAY)
+            if image_data_frame_scaled.ndim == 3: # gray_cameras_bgr
+                image_data_frame_scaled = cv2.cvtColor(image_data_frame_scaled, cv2.COLOR_RGB2GRAY)
 
             # print('image_data_frame.shape', image_data_frame.shape)
             # print('image_data_frame_scaled.shape', image_data_frame_scaled.shape)
@@ -324,9 +449,10 @@ class KittiRaw(Dataset):
             # cv2.imshow('img', image_data_frame_scaled)
             # cv2.waitKey()
 
-            self.vo.track(image_data_frame_scaled, img_id)
+            track_id = img_id - start_id
+            self.vo.track(image_data_frame_scaled, track_id)
             
-            if img_id>2:
+            if track_id>2:
                 x, y, z = self.vo.traj3d_est[-1]
                 rot = np.array(self.vo.cur_R, copy=True)
             else:
@@ -341,10 +467,11 @@ class KittiRaw(Dataset):
             if type(z)!=float:
                 z = float(z[0])
 
-            self.trajectory['x'] += [x]
-            self.trajectory['y'] += [y]
-            self.trajectory['z'] += [z]
-            self.trajectory['rot'] += [rot]
+            position = anchor_R @ np.array([x, y, z]) + anchor_t
+            self.trajectory.write(img_id, position, anchor_R @ rot)
+            if (img_id + 1) % checkpoint_interval == 0:
+                self.trajectory.checkpoint(img_id + 1)
+            x, y, z = position
 
             if plot2d:
                 p3x = int(x / 10 + plot_3D_x//2)
@@ -359,10 +486,109 @@ class KittiRaw(Dataset):
                 if key == ord('q'):
                     break
 
-        self.trajectory = pd.DataFrame(self.trajectory)
-        # self.trajectory.to_csv(self.cached_trajectory_p]ath, index=False)
-        with open(self.cached_trajectory_path, 'wb') as handle:
-            pickle.dump(self.trajectory, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        self.trajectory.checkpoint(img_id + 1)
+        self.trajectory = TrajectoryStore(self.cached_trajectory_path)
+
+    def raw_frame_position(self, index):
+        """Position of frame index in raw_img_list"""
+        return index
+
+    def velodyne_path(self, id):
+        return os.path.join(self.velodyne_points_path, 'data', id + ".bin")
+
+    def image_path(self, cam, id):
+        return os.path.join(getattr(self, 'image_' + cam + '_path'), 'data', id + ".png")
+
+    def read_velodyne_points(self, id):
+        return decode_velodyne(self.file_source.read(self.velodyne_path(id)))
+
+    def get_sweep_poses(self):
+        """(len(self.raw_img_list), 4, 4) velodyne-to-world poses from OXTS or the cached trajectory, NaN where unknown"""
+        if self.sweep_poses is None:
+            if self.pose_source == 'oxts':
+                T_velo_imu = np.eye(4)
+                T_velo_imu[:3, :3] = np.reshape(self.calib_imu_to_velo['R'], (3,3))
+                T_velo_imu[:3, 3] = np.reshape(self.calib_imu_to_velo['T'], (3,))
+                poses = load_oxts_poses(self.oxts_path, self.raw_img_list, self.file_source) @ np.linalg.inv(T_velo_imu)
+            else:
+                T_cam_velo = np.eye(4)
+                T_cam_velo[:3, :3], T_cam_velo[:3, 3:] = self.R, self.T
+                poses = np.tile(np.eye(4), (len(self.raw_img_list), 1, 1))
+                poses[:, :3, :3] = self.trajectory.rotations
+                poses[:, :3, 3] = self.trajectory.positions
+                poses = poses @ T_cam_velo
+            self.sweep_poses = poses
+        return self.sweep_poses
+
+    def load_velodyne_points(self, index):
+        """
+        (N, 4) x,y,z,reflectance points of a frame. With accumulate_sweeps, the
+        neighbouring raw sweeps with a known pose are moved into this frame's
+        velodyne coordinates, concatenated after it and voxel-deduplicated.
+        The roi_crop stages are applied last.
+        """
+        neighbours = self.sweep_positions(index)
+        if len(neighbours) == 1:
+            return self.crop_velodyne_points(self.read_velodyne_points(self.raw_img_list[neighbours[0]]))
+        poses = self.get_sweep_poses()
+        transforms = np.linalg.inv(poses[neighbours[0]]) @ poses[neighbours]
+        sweeps = list(map(lambda i: self.read_velodyne_points(self.raw_img_list[i]), neighbours))
+        return self.crop_velodyne_points(accumulate_sweeps(sweeps, transforms, self.accumulate_voxel_size))
+
+    def sweep_positions(self, index):
+        """Raw positions of the sweeps merged into frame index, the frame's own first"""
+        # Neighbours are taken from the raw sequence, KittiDepth only keeps a subset of its frames
+        raw_index = self.raw_frame_position(index)
+        past, future = self.accumulate_sweeps
+        if past == 0 and future == 0:
+            return [raw_index]
+        known = np.all(np.isfinite(self.get_sweep_poses()), axis=(1, 2))
+        if not known[raw_index]:
+            return [raw_index]
+        return [raw_index] + list(filter(
+            lambda i: i != raw_index and known[i],
+            range(max(0, raw_index - past), min(len(self.raw_img_list), raw_index + future + 1))
+        ))
+
+    def grid_velodyne_bounds(self):
+        """
+        Axis-aligned velodyne-frame box ((x_min, x_max), (y_min, y_max), (z_min, z_max))
+        enclosing the occupancy grid, i.e. grid x in [0, grid_x], y in [-grid_y, grid_y]
+        and z in [-grid_z, grid_z] moved through the velodyne-to-camera extrinsics
+        """
+        corners = np.array(list(itertools.product(
+            (0.0, self.grid_x), (-self.grid_y, self.grid_y), (-self.grid_z, self.grid_z)
+        )))
+        # Grid (x, y, z) = (Z_c, -X_c, -Y_c + Z_OFFSET)
+        corners_camera = np.stack((-corners[:, 1], -(corners[:, 2] - Z_OFFSET), corners[:, 0]), axis=1)
+        corners_velodyne = (corners_camera - self.T.T) @ self.R
+        return tuple(zip(corners_velodyne.min(axis=0), corners_velodyne.max(axis=0)))
+
+    def crop_velodyne_points(self, velodyine_points):
+        """
+        Cheap pre-crop of a sweep, before any projection, by the roi_crop stages:
+            'fov'   horizontal wedge of h_fov, tested with cross products instead of arctan2;
+                    the occupancy grid applies the same filter, the BEV and range images do not
+            'grid'  axis-aligned box around the occupancy grid (grid_velodyne_bounds)
+            bounds  explicit ((x_min, x_max), (y_min, y_max), (z_min, z_max)) velodyne box
+        """
+        if not self.roi_crop:
+            return velodyine_points
+        keep = np.ones(len(velodyine_points), dtype=bool)
+        x, y, z = velodyine_points[:, 0], velodyine_points[:, 1], velodyine_points[:, 2]
+        for stage in self.roi_crop:
+            if stage == 'fov':
+                # Same wedge as in_h_range_points: -h_fov[1] < atan2(y, x) < -h_fov[0]
+                start, stop = np.radians(-h_fov[1]), np.radians(-h_fov[0])
+                if stop - start < np.pi:
+                    keep &= (np.cos(start) * y - np.sin(start) * x > 0) & (x * np.sin(stop) - y * np.cos(stop) > 0)
+                else:
+                    keep &= in_h_range_points(velodyine_points, x, y, h_fov)
+                continue
+            bounds = self.grid_velodyne_bounds() if stage == 'grid' else stage
+            (x_min, x_max), (y_min, y_max), (z_min, z_max) = bounds
+            keep &= (x_min <= x) & (x <= x_max) & (y_min <= y) & (y <= y_max) & (z_min <= z) & (z <= z_max)
+        return velodyine_points[keep]
 
     def transform_occupancy_grid_to_points_serial(self, occupancy_grid, threshold=0.5):
         occupancy_grid = occupancy_grid.squeeze()
@@ -387,7 +613,7 @@ class KittiRaw(Dataset):
         final_points = np.array(final_points, dtype=np.float32)
         return final_points
     
-    def transform_occupancy_grid_to_points_starmap(self, occupancy_grid, threshold=0.5, device=device, skip=1, n_chunks = 12):
+    def transform_occupancy_grid_to_points_starmap(self, occupancy_grid, threshold=0.5, device=None, skip=1, n_chunks = 12):
         start_time = time.time()
         occupancy_grid = occupancy_grid.squeeze()
         sh = occupancy_grid.shape
@@ -404,7 +630,7 @@ class KittiRaw(Dataset):
 
         return final_points
 
-    def transform_occupancy_grid_to_points(self, occupancy_grid, threshold=0.5, device=device, skip=3):
+    def transform_occupancy_grid_to_points(self, occupancy_grid, threshold=0.5, device=None, skip=3):
         occupancy_grid = occupancy_grid.squeeze()
         # occupancy_grid = torch.tensor(occupancy_grid, device=device)
         def f(xi):
@@ -434,7 +660,7 @@ class KittiRaw(Dataset):
         final_points = np.array(final_points, dtype=np.float32)
         return final_points
 
-    def transform_occupancy_grid_to_points_world_coords(self, occupancy_grid, threshold=0.5, device=device, skip=3):
+    def transform_occupancy_grid_to_points_world_coords(self, occupancy_grid, threshold=0.5, device=None, skip=3):
         occupancy_grid = occupancy_grid.squeeze()
         # occupancy_grid = torch.tensor(occupancy_grid, device=device)
         def f(xi):
@@ -464,9 +690,9 @@ class KittiRaw(Dataset):
         final_points = np.array(final_points, dtype=np.float32)
         return final_points
 
-    def transform_points_to_image_space(self, velodyine_points, roi, intrinsic_mat, R_cam, T_cam, P_rect, color_fn=depth_color):
+    def transform_points_to_image_space(self, velodyine_points, roi, intrinsic_mat, R_cam, T_cam, P_rect, color_fn=depth_color, shape=None):
         # x, y, w, h = roi
-        w, h = self.width, self.height
+        w, h = (self.width, self.height) if shape is None else shape[::-1]
         # intrinsic_mat = intrinsic_mat
         intrinsic_mat = np.vstack((
             np.hstack((
@@ -497,12 +723,34 @@ class KittiRaw(Dataset):
         return image_points
         
 
+    def camera_points_to_occupancy_indices(self, points_camera):
+        """
+        Vectorized form of the grid indexing in transform_points_to_occupancy_grid.
+        Maps (N, 3) camera coordinates to (N, 3) int64 (i, j, k) occupancy indices
+        and returns them with the mask of points strictly inside occupancy_shape.
+        """
+        points_camera = np.asarray(points_camera, dtype=np.float64)
+        x = points_camera[:, 2]
+        y = -points_camera[:, 0]
+        z = -points_camera[:, 1] + Z_OFFSET
+
+        finite = np.all(np.isfinite(points_camera), axis=1)
+        x, y, z = np.where(finite, x, 0.0), np.where(finite, y, 0.0), np.where(finite, z, 0.0)
+        indices = np.stack((
+            ((x*self.occ_x//2)//self.grid_x)*2,
+            (y*self.occ_y//2)//self.grid_y + self.occ_y//2,
+            (z*self.occ_z//2)//self.grid_z + self.occ_z//2
+        ), axis=1).astype(np.int64)
+        inside = finite & np.all((0 < indices) & (indices < np.array(self.occupancy_shape)), axis=1)
+        return indices, inside
+
+    def transform_points_to_camera(self, velodyine_points):
+        """(N, 3) velodyne points in camera coordinates (X_c, Y_c, Z_c)"""
+        return np.asarray(velodyine_points, dtype=np.float64)[:, :3] @ self.R.T + self.T.T
+
     def transform_points_to_occupancy_grid(self, velodyine_points):
         occupancy_grid = np.zeros(self.occupancy_shape, dtype=np.float32)
         occupancy_mask_2d = np.zeros(self.occupancy_mask_2d_shape, dtype=np.uint8)
-        x, y, w, h = self.roi_02
-
-        P_rect = self.calib_cam_to_cam['P_rect_02'].reshape(3, 4)[:3,:3]
 
         # ans, color = velo3d_2_camera2d_points(velodyine_points, self.R, self.T, P_rect, v_fov=(-24.9, 2.0), h_fov=(-45,45))
 
@@ -510,83 +758,97 @@ class KittiRaw(Dataset):
         # h_fov=(-45,45)
 
         velodyine_points, c_ = velo_points_filter(velodyine_points, v_fov, h_fov)
-        velodyine_points_orig = velodyine_points.copy()
-
-        velodyine_points_camera = []
 
-        RT_ = np.concatenate((self.R, self.T),axis = 1)
-    
         # convert velodyne coordinates(X_v, Y_v, Z_v) to camera coordinates(X_c, Y_c, Z_c) 
-        for i in range(velodyine_points.shape[1]):
-            velodyine_points[:3,i] = np.matmul(RT_, velodyine_points[:,i])
-
-        velodyine_points = np.delete(velodyine_points, 3, axis=0)
-        image_points = velodyine_points.copy()
-        # print(image_points.shape, velodyine_points.shape)
-        # convert camera coordinates(X_c, Y_c, Z_c) image(pixel) coordinates(x,y) 
-        for i in range(image_points.shape[1]):
-            image_points[:,i] = np.matmul(P_rect, image_points[:,i])
-
-        image_points = image_points[::]/image_points[::][2]
-        image_points = np.delete(image_points, 2, axis=0)
-        # print(image_points.shape, velodyine_points.shape)
-
-        for index in range(image_points.shape[1]):
-            img_x, img_y = image_points[:, index]
-            x, y, z = velodyine_points[:, index]
-    
-            # x, y, z = x, z, y # Half
-            # x, y, z = y, x, z # N
-            # x, y, z = y, z, x # N
-            x, y, z = z, x, -y # Inverted
-            # x, y, z = z, y, x
-
-            y = -y
-
-            z += Z_OFFSET
-
-            xv, yv, zv = velodyine_points_orig[:3, index]
-            i, j, k = [
-                # int((p[0]*self.occ_x//2)//self.grid_x + self.occ_x//2),
-                int((x*self.occ_x//2)//self.grid_x)*2,
-                int((y*self.occ_y//2)//self.grid_y + self.occ_y//2),
-                # int((p[1]*self.occ_y//2)//self.grid_y),
-                int((z*self.occ_z//2)//self.grid_z + self.occ_z//2)
-            ]
+        points_camera = self.transform_points_to_camera(velodyine_points[:3].T)
+        indices, inside = self.camera_points_to_occupancy_indices(points_camera)
+        i, j, k = indices[inside].T
 
-            # if (
-            #     0 < i < self.occupancy_shape[0] and
-            #     0 < j < self.occupancy_shape[1] and
-            #     0 < k < self.occupancy_shape[2]
-            # ):
-            if (
-                # (0 <= img_x < w and 0 <= img_y < h) and
-                0 < i < self.occupancy_shape[0] and
-                0 < j < self.occupancy_shape[1] and
-                0 < k < self.occupancy_shape[2]
-                # 0 < xv < self.grid_x and 
-                # -self.grid_y < yv < self.grid_y and 
-                # -self.grid_z < zv < self.grid_z
-            ):
-                velodyine_points_camera.append((x,y,z))
-                occupancy_grid[i,j,k] = 1.0
-                # occupancy_mask_2d[i,j] = int(min(255, 255*max(0, (k-6)/(15-6))))
-                occupancy_mask_2d[i,j] = max(int(min(255, 255*max(0, (k-6)/(15-6)))), occupancy_mask_2d[i,j])
+        occupancy_grid[i, j, k] = 1.0
+        heights = (255*np.maximum(0, (k-6)/(15-6))).clip(max=255).astype(np.uint8)
+        np.maximum.at(occupancy_mask_2d, (i, j), heights)
 
         if type(self.sigma)!=type(None):
             occupancy_grid = gaus_blur_3D(occupancy_grid, sigma=self.sigma, n=self.gaus_n)
-        # velodyine_points_camera = []
-        # for index in range(velodyine_points.shape[1]):
-        #     velodyine_points_camera.append(velodyine_points[:,index])
-        
-        velodyine_points_camera = np.array(velodyine_points_camera, dtype=np.float32)
+
+        # Grid coordinates (x, y, z) = (Z_c, -X_c, -Y_c + Z_OFFSET) of the points inside the grid
+        points_camera = points_camera[inside]
+        velodyine_points_camera = np.stack((
+            points_camera[:, 2], -points_camera[:, 0], -points_camera[:, 1] + Z_OFFSET
+        ), axis=1).astype(np.float32)
 
         return {
             'occupancy_grid': occupancy_grid, 
             'occupancy_mask_2d': occupancy_mask_2d,
             'velodyine_points_camera': velodyine_points_camera
         }
-    
+
+    def transform_points_to_range_image(self, velodyine_points, shape=None):
+        """
+        Spherical projection of a sweep over v_fov/h_fov, see range_image.spherical_projection.
+        pixel_index refers to the rows of velodyine_points.
+        """
+        height, width = self.range_image_shape if shape is None else shape
+        projection = spherical_projection(velodyine_points, v_fov, h_fov, height, width)
+        return {
+            'range_image': projection['range_image'],
+            'range_mask': projection['mask'],
+            'range_point_index': projection['point_index'],
+            'range_pixel_index': projection['pixel_index'],
+        }
+
+    def transform_points_to_disparity(self, velodyine_points):
+        """
+        Sparse float32 disparity of the rectified camera 02/03 pair and its mask,
+        from velodyne points z-buffered into rectified camera 02
+        """
+        width, height = map(int, self.calib_cam_to_cam['S_rect_02'])
+        factor = self.image_reduction
+        image_scale = ((width // factor) / width, (height // factor) / height)
+        return lidar_disparity(velodyine_points, self.calib_cam_to_cam, self.calib_velo_to_cam,
+            (height // factor, width // factor), image_scale=image_scale)
+
+    def transform_points_to_bev(self, velodyine_points, channels=BEV_CHANNELS):
+        """
+        Bird's-eye-view raster of the points inside the occupancy grid, on its
+        (occ_x, occ_y) cells, as a (len(channels), occ_x, occ_y) float32 array.
+
+        Channels:
+            max_height      highest grid z (-Y_c + Z_OFFSET, metres) in the cell, 0 if empty
+            min_height      lowest grid z in the cell, 0 if empty
+            density         min(1, log(1 + count) / log(64)) as in MV3D
+            reflectance     mean reflectance, needs (N, 4) points
+        """
+        shape = tuple(self.occupancy_shape[:2])
+        bev = np.zeros((len(channels),) + shape, dtype=np.float32)
+
+        points_camera = self.transform_points_to_camera(velodyine_points)
+        indices, inside = self.camera_points_to_occupancy_indices(points_camera)
+        cells = np.ravel_multi_index((indices[inside, 0], indices[inside, 1]), shape)
+        heights = -points_camera[inside, 1] + Z_OFFSET
+        counts = np.bincount(cells, minlength=bev[0].size)
+        occupied = counts > 0
+
+        for channel, name in enumerate(channels):
+            raster = bev[channel].reshape(-1)
+            if name == 'max_height':
+                values = np.full(raster.size, -np.inf)
+                np.maximum.at(values, cells, heights)
+                raster[occupied] = values[occupied]
+            elif name == 'min_height':
+                values = np.full(raster.size, np.inf)
+                np.minimum.at(values, cells, heights)
+                raster[occupied] = values[occupied]
+            elif name == 'density':
+                raster[:] = np.minimum(1.0, np.log1p(counts) / np.log(64))
+            elif name == 'reflectance':
+                assert velodyine_points.shape[1] > 3, "reflectance needs (N, 4) velodyne points"
+                sums = np.bincount(cells, weights=velodyine_points[inside, 3], minlength=raster.size)
+                raster[occupied] = sums[occupied] / counts[occupied]
+            else:
+                raise ValueError("Unknown BEV channel: " + str(name))
+        return bev
+
     def transform_points_to_occupancy_grid_OLD(self, velodyine_points):
         occupancy_grid = np.zeros(self.occupancy_shape, dtype=np.float32)
         occupancy_mask_2d = np.zeros(self.occupancy_mask_2d_shape, dtype=np.uint8)
@@ -632,142 +894,245 @@ class KittiRaw(Dataset):
 
 
     def __getitem__(self, index):
-        id = self.img_list[index]
-        image_00 = os.path.join(self.image_00_path, 'data', id + ".png")
-        image_01 = os.path.join(self.image_01_path, 'data', id + ".png")
-        image_02 = os.path.join(self.image_02_path, 'data', id + ".png")
-        image_03 = os.path.join(self.image_03_path, 'data', id + ".png")
-        velodyine_points = os.path.join(self.velodyne_points_path, 'data', id + ".bin")
-        
-        assert os.path.exists(image_00), image_00
-        assert os.path.exists(image_01), image_01
-        assert os.path.exists(image_02), image_02
-        assert os.path.exists(image_03), image_03
-        assert os.path.exists(velodyine_points), velodyine_points
-
-        image_00_raw = cv2.imread(image_00)
-        image_01_raw = cv2.imread(image_01)
-        image_02_raw = cv2.imread(image_02)
-        image_03_raw = cv2.imread(image_03)
-        
-        x, y, w, h = self.roi_00
-        image_00 = cv2.undistort(image_00_raw, self.K_00, self.D_00, None, self.new_K_00)
-        image_00 = image_00[y:y+h, x:x+w]
-
-        x, y, w, h = self.roi_01
-        image_01 = cv2.undistort(image_01_raw, self.K_01, self.D_01, None, self.new_K_01)
-        image_01 = image_01[y:y+h, x:x+w]
-
-        x, y, w, h = self.roi_02
-        image_02 = cv2.undistort(image_02_raw, self.K_02, self.D_02, None, self.new_K_02)
-        image_02 = image_02[y:y+h, x:x+w]
+        # The cache holds decoded frames; per-sample stages (e.g. random
+        # augmentations) run again on every access
+        data = None if self.frame_cache is None else self.frame_cache.get(index)
+        if data is None:
+            data = self.load_frame(index)
+            if self.frame_cache is not None:
+                self.frame_cache.put(index, data)
+        return self.transform(data, self.field_plan[2])
+
+    def available_fields(self):
+        """Every field load_frame can return with the current options"""
+        fields = []
+        for cam in CAMERAS:
+            fields += ['image_' + cam, 'image_' + cam + '_raw', 'roi_' + cam, 'K_' + cam, 'R_' + cam, 'T_' + cam]
+        fields += ['calib_cam_to_cam', 'calib_imu_to_velo', 'calib_velo_to_cam']
+        fields += ['velodyine_points', 'occupancy_grid', 'occupancy_mask_2d', 'velodyine_points_camera']
+        fields += list(map(lambda cam: 'depth_image_' + cam, CAMERAS))
+        if self.bev_channels is not None:
+            fields += ['bev']
+        if self.range_image_shape is not None:
+            fields += RANGE_IMAGE_FIELDS
+        if self.stereo_disparity:
+            fields += DISPARITY_FIELDS
+        return fields
+
+    @property
+    def field_plan(self):
+        """(required fields, image decode ops, remaining per-sample stages) of the transform pipeline"""
+        if self._field_plan is None:
+            image_fields = list(itertools.chain(*map(lambda cam: ('image_' + cam, 'image_' + cam + '_raw'), CAMERAS)))
+            self._field_plan = self.transform.plan(self.available_fields(), image_fields)
+        return self._field_plan
+
+    def wants(self, *fields):
+        return any(map(lambda field: field in self.field_plan[0], fields))
+
+    def image_scales(self):
+        """(sx, sy) of the decoded camera images: the reduced decodes keep width // n by height // n pixels"""
+        factor = self.image_reduction
+        return (self.width // factor) / self.width, (self.height // factor) / self.height
+
+    def undistortion_maps(self, cam, box, size, source_size=None):
+        """
+        cv2.remap tables undistorting camera cam straight into the (x, y, w, h)
+        box of its full resolution undistorted image, resampled to size =
+        (width, height). source_size is the (width, height) of the raw image
+        when it was decoded at a reduced resolution. Cached.
+        """
+        key = (cam, box, size, source_size)
+        if key not in self._undistortion_maps:
+            x, y, w, h = box
+            sx, sy = size[0] / w, size[1] / h
+            # Pixel centres of the box map onto pixel centres of the output
+            A = np.array([
+                [sx, 0.0, sx*(0.5 - x) - 0.5],
+                [0.0, sy, sy*(0.5 - y) - 0.5],
+                [0.0, 0.0, 1.0]
+            ])
+            K = getattr(self, 'K_' + cam)
+            if source_size is not None:
+                K = scale_intrinsics(K, source_size[0] / self.width, source_size[1] / self.height)
+            self._undistortion_maps[key] = cv2.initUndistortRectifyMap(
+                K, getattr(self, 'D_' + cam), None,
+                A @ getattr(self, 'new_K_' + cam), size, cv2.CV_16SC2
+            )
+        return self._undistortion_maps[key]
+
+    def undistort_image(self, cam, image, ops=()):
+        """
+        Undistorts a raw image and crops it to roi_<cam>, at image_scale of the
+        full resolution. Leading Crop (boxes in output pixels) and Resize
+        stages of ops are folded into the remap tables, so the full resolution
+        image is never produced; the other stages run afterwards.
+        """
+        ops = list(ops)
+        if image.ndim == 2: # already single channel, Grayscale stages are no-ops
+            ops = list(filter(lambda op: not isinstance(op, Grayscale), ops))
+        x, y, w, h = getattr(self, 'roi_' + cam)
+        size = self.scaled_roi(cam)[2:]
+        while ops and isinstance(ops[0], Crop):
+            cx, cy, cw, ch = ops.pop(0).box
+            # (x, y, w, h) stays in full resolution pixels, size in output pixels
+            sx, sy = size[0] / w, size[1] / h
+            cw, ch = max(0, min(cw, size[0] - cx)), max(0, min(ch, size[1] - cy))
+            x, y, w, h = x + cx / sx, y + cy / sy, cw / sx, ch / sy
+            size = (cw, ch)
+        if ops and isinstance(ops[0], Resize):
+            size = ops.pop(0).size
+        source_size = None if self.image_reduction == 1 else (image.shape[1], image.shape[0])
+        map_1, map_2 = self.undistortion_maps(cam, (x, y, w, h), size, source_size)
+        if self.tensor_writer is not None and not ops:
+            return self.tensor_writer.remap(image, map_1, map_2, cv2.INTER_LINEAR)
+        image = cv2.remap(image, map_1, map_2, cv2.INTER_LINEAR)
+        image = apply_image_ops(image, ops)
+        return image if self.tensor_writer is None else self.tensor_writer.image(image)
+
+    def load_images(self, id):
+        """Decodes the raw and undistorted camera images the transform pipeline needs"""
+        _, decode_ops, _ = self.field_plan
+        data = dict()
+        for cam in CAMERAS:
+            field, raw_field = 'image_' + cam, 'image_' + cam + '_raw'
+            if not self.wants(field, raw_field):
+                continue
+            image_path = self.image_path(cam, id)
+            # Decode straight to grayscale for the gray cameras, or when every requested form
+            # of this camera ends up gray
+            gray = (cam in GRAY_CAMERAS and not self.gray_cameras_bgr) or all(map(
+                lambda key: any(map(lambda op: isinstance(op, Grayscale), decode_ops.get(key, []))),
+                filter(self.wants, (field, raw_field))
+            ))
+            image_raw = decode_image(self.file_source.read(image_path), image_decode_flag(gray, self.image_reduction), image_path)
+            if self.wants(raw_field):
+                image = apply_image_ops(image_raw, decode_ops.get(raw_field, []))
+                data[raw_field] = image if self.tensor_writer is None else self.tensor_writer.image(image)
+            if self.wants(field):
+                data[field] = self.undistort_image(cam, image_raw, decode_ops.get(field, []))
+        return data
 
-        x, y, w, h = self.roi_03
-        image_03 = cv2.undistort(image_03_raw, self.K_03, self.D_03, None, self.new_K_03)
-        image_03 = image_03[y:y+h, x:x+w]
+    def wants_lidar(self):
+        return self.wants(*LIDAR_FIELDS)
 
+    def frame_paths(self, index):
+        """Files load_frame(index) reads with the current field plan, in reading order"""
+        id = self.img_list[index]
+        paths = list(map(
+            lambda cam: self.image_path(cam, id),
+            filter(lambda cam: self.wants('image_' + cam, 'image_' + cam + '_raw'), CAMERAS)
+        ))
+        if self.wants_lidar():
+            paths += list(map(lambda i: self.velodyne_path(self.raw_img_list[i]), self.sweep_positions(index)))
+        return paths
+
+    def scaled_roi(self, cam):
+        """roi_<cam> in the pixels of the undistorted images at image_scale"""
+        return tuple(map(lambda value: int(round(value * self.image_scale)), getattr(self, 'roi_' + cam)))
+
+    def calibration_fields(self):
+        # Writable copies: the shared calibration is read-only and its mappingproxy
+        # calib dicts cannot be pickled back from DataLoader workers
+        data = dict()
+        for cam in CAMERAS:
+            data['roi_' + cam] = getattr(self, 'roi_' + cam)
+            for name in ('K_', 'R_', 'T_'):
+                data[name + cam] = np.array(getattr(self, name + cam))
+            if self.image_reduction != 1:
+                data['roi_' + cam] = self.scaled_roi(cam)
+                data['K_' + cam] = scale_intrinsics(getattr(self, 'K_' + cam), *self.image_scales())
+        for name in ('calib_cam_to_cam', 'calib_imu_to_velo', 'calib_velo_to_cam'):
+            data[name] = {key: np.array(value) if isinstance(value, np.ndarray) else value for key, value in getattr(self, name).items()}
+        return data
 
-        # velodyine_points = np.fromfile(velodyine_points, dtype=np.float32)
-        # velodyine_points = np.reshape(velodyine_points, (velodyine_points.shape[0]//4, 4))
-        velodyine_points = np.fromfile(velodyine_points, dtype=np.float32).reshape(-1, 4)[:,:3]
+    def load_velodyne_scan(self, index):
+        """(N, 4) points of the frame after ground removal, if enabled"""
+        return self.remove_ground(self.load_velodyne_points(index))
 
+    def remove_ground(self, velodyine_scan):
         if self.ground_removal:
-            velodyine_points = velodyine_points * np.array([1.0,1.0,-1.0]) # revert the z axis
-            velodyine_points = self.process(velodyine_points)
-            velodyine_points = velodyine_points * np.array([1.0,1.0,-1.0]) # revert the z axis
-        
-        occupancy_grid_data = self.transform_points_to_occupancy_grid(velodyine_points)
-
-        P_rect = self.calib_cam_to_cam['P_rect_00'].reshape(3, 4)[:3,:3]
-        image_points = self.transform_points_to_image_space(velodyine_points, self.roi_00, self.K_00, self.R_00, self.T_00, P_rect, color_fn=depth_color)
-        image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        dilatation_size = 3
-        dilation_shape = cv2.MORPH_ELLIPSE
-        element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-                                        (dilatation_size, dilatation_size))
-        depth_image_00 = cv2.dilate(image_points, element)
-
-        P_rect = self.calib_cam_to_cam['P_rect_01'].reshape(3, 4)[:3,:3]
-        image_points = self.transform_points_to_image_space(velodyine_points, self.roi_01, self.K_01, self.R_01, self.T_01, P_rect, color_fn=depth_color)
-        image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        dilatation_size = 3
-        dilation_shape = cv2.MORPH_ELLIPSE
-        element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-                                        (dilatation_size, dilatation_size))
-        depth_image_01 = cv2.dilate(image_points, element)
-
-        P_rect = self.calib_cam_to_cam['P_rect_02'].reshape(3, 4)[:3,:3]
-        image_points = self.transform_points_to_image_space(velodyine_points, self.roi_02, self.K_02, self.R_02, self.T_02, P_rect, color_fn=depth_color)
-        image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        dilatation_size = 3
-        dilation_shape = cv2.MORPH_ELLIPSE
-        element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-                                        (dilatation_size, dilatation_size))
-        depth_image_02 = cv2.dilate(image_points, element)
-
-        P_rect = self.calib_cam_to_cam['P_rect_03'].reshape(3, 4)[:3,:3]
-        image_points = self.transform_points_to_image_space(velodyine_points, self.roi_03, self.K_03, self.R_03, self.T_03, P_rect, color_fn=depth_color)
-        image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
-        dilatation_size = 3
-        dilation_shape = cv2.MORPH_ELLIPSE
-        element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
-                                        (dilatation_size, dilatation_size))
-        depth_image_03 = cv2.dilate(image_points, element)
-
-        data = {
-            'image_00': image_00, 
-            'image_01': image_01, 
-            'image_02': image_02, 
-            'image_03': image_03,
-            'image_00_raw': image_00_raw, 
-            'image_01_raw': image_01_raw, 
-            'image_02_raw': image_02_raw, 
-            'image_03_raw': image_03_raw,
-            'roi_00': self.roi_00,
-            'roi_01': self.roi_01,
-            'roi_02': self.roi_02,
-            'roi_03': self.roi_03,
-            'K_00': self.K_00,
-            'K_01': self.K_01,
-            'K_02': self.K_02,
-            'K_03': self.K_03,
-            
-            'R_00': self.R_00,
-            'R_01': self.R_01,
-            'R_02': self.R_02,
-            'R_03': self.R_03,
-
-            'T_00': self.T_00,
-            'T_01': self.T_01,
-            'T_02': self.T_02,
-            'T_03': self.T_03,
-
-            'calib_cam_to_cam': self.calib_cam_to_cam,
-            'calib_imu_to_velo': self.calib_imu_to_velo,
-            'calib_velo_to_cam': self.calib_velo_to_cam,
-
-            'velodyine_points': velodyine_points, 
-            'occupancy_grid': occupancy_grid_data['occupancy_grid'],
-            'occupancy_mask_2d': occupancy_grid_data['occupancy_mask_2d'],
-            'velodyine_points_camera': occupancy_grid_data['velodyine_points_camera'],
-
-            'depth_image_00': depth_image_00,
-            'depth_image_01': depth_image_01,
-            'depth_image_02': depth_image_02,
-            'depth_image_03': depth_image_03,
-        }
-        for key in self.transform:
-            data[key] = self.transform[key](data[key])
+            velodyine_scan = velodyine_scan * np.array([1.0,1.0,-1.0,1.0]) # revert the z axis
+            velodyine_scan = self.process(velodyine_scan)
+            velodyine_scan = velodyine_scan * np.array([1.0,1.0,-1.0,1.0]) # revert the z axis
+        return velodyine_scan
+
+    def lidar_raster_fields(self, velodyine_scan, velodyine_sweep=None):
+        """
+        bev, range image and disparity fields wanted of a scan; disparity uses
+        velodyine_sweep, the points before ground removal, when given
+        """
+        data = dict()
+        if self.wants(*DISPARITY_FIELDS):
+            data.update(self.transform_points_to_disparity(velodyine_scan if velodyine_sweep is None else velodyine_sweep))
+        if self.wants('bev'):
+            data['bev'] = self.transform_points_to_bev(velodyine_scan, self.bev_channels)
+        if self.wants(*RANGE_IMAGE_FIELDS):
+            data.update(self.transform_points_to_range_image(velodyine_scan))
+        return data
+
+    def finish_frame(self, data):
+        """Drops the fields nothing asked for; __getitem__ runs the remaining per-sample stages"""
+        required, _, _ = self.field_plan
+        data = {key: value for key, value in data.items() if key in required}
+        if self.tensor_writer is not None:
+            for key, value in data.items():
+                if isinstance(value, np.ndarray):
+                    data[key] = self.tensor_writer.array(value)
         return data
 
-def get_kitti_tree(kitti_raw_base_path):
-    date_folder_list = list(filter(os.path.isdir, glob.glob(os.path.join(kitti_raw_base_path, '*'))))
-    date_folder_list = list(filter(lambda i: len(i.split('_'))==3, date_folder_list))
+    def load_frame(self, index):
+        """Decoded fields of frame index, before the per-sample stages of the transform pipeline"""
+        id = self.img_list[index]
+        data = self.load_images(id)
+        data.update(self.calibration_fields())
+
+        if self.wants_lidar():
+            velodyine_sweep = self.load_velodyne_points(index)
+            velodyine_scan = self.remove_ground(velodyine_sweep)
+            velodyine_points = velodyine_scan[:,:3]
+            data['velodyine_points'] = velodyine_points
+            data.update(self.lidar_raster_fields(velodyine_scan, velodyine_sweep))
+
+            if self.wants('occupancy_grid', 'occupancy_mask_2d', 'velodyine_points_camera'):
+                data.update(self.transform_points_to_occupancy_grid(velodyine_points))
+
+            for cam in CAMERAS:
+                if not self.wants('depth_image_' + cam):
+                    continue
+                P_rect = self.calib_cam_to_cam['P_rect_' + cam].reshape(3, 4)[:3,:3]
+                shape = None
+                if self.image_reduction != 1:
+                    P_rect = scale_intrinsics(P_rect, *self.image_scales())
+                    shape = (self.height // self.image_reduction, self.width // self.image_reduction)
+                image_points = self.transform_points_to_image_space(
+                    velodyine_points, data['roi_' + cam], data['K_' + cam],
+                    getattr(self, 'R_' + cam), getattr(self, 'T_' + cam), P_rect, color_fn=depth_color, shape=shape
+                )
+                image_points = cv2.normalize(image_points - np.min(image_points.flatten()), None, 0.0, 1.0, norm_type=cv2.NORM_MINMAX)
+                dilatation_size = 3
+                dilation_shape = cv2.MORPH_ELLIPSE
+                element = cv2.getStructuringElement(dilation_shape, (2 * dilatation_size + 1, 2 * dilatation_size + 1),
+                                                (dilatation_size, dilatation_size))
+                data['depth_image_' + cam] = cv2.dilate(image_points, element)
+
+        return self.finish_frame(data)
+
+def list_folders(path, file_source=None):
+    """Sub-folders of path, through file_source when given"""
+    if file_source is None:
+        return list(filter(os.path.isdir, glob.glob(os.path.join(path, '*'))))
+    names = sorted(filter(lambda name: not name.startswith('.'), file_source.listdir(path)))
+    return list(filter(file_source.isdir, map(lambda name: os.path.join(path, name), names)))
+
+def get_kitti_tree(kitti_raw_base_path, file_source=None):
+    date_folder_list = list_folders(kitti_raw_base_path, file_source)
+    date_folder_list = list(filter(lambda i: len(os.path.basename(i).split('_'))==3, date_folder_list))
     kitti_tree = dict()
     for date_folder in date_folder_list:
         date_id = date_folder.split('/')[-1]
         # print(date_id)
-        sub_folder_list = list(filter(os.path.isdir, glob.glob(os.path.join(date_folder, '*'))))
+        sub_folder_list = list_folders(date_folder, file_source)
         sub_folder_list = list(filter(lambda i: len(i.split('/')[-1].split('_'))==6, sub_folder_list))
         sub_folder_list = list(map(lambda i: i.split('/')[-1], sub_folder_list))
 
@@ -775,9 +1140,65 @@ def get_kitti_tree(kitti_raw_base_path):
         # print(sub_folder_list)
     return kitti_tree
 
+def precompute_drive_trajectory(kwargs):
+    """Pool worker: computes, resumes or validates the cached trajectory of one drive"""
+    try:
+        KittiRaw(**kwargs)
+    except Exception as exc:
+        return kwargs['date_folder'], kwargs['sub_folder'], type(exc).__name__ + ": " + str(exc)
+    return kwargs['date_folder'], kwargs['sub_folder'], None
+
+def run_drive_jobs(jobs, num_workers):
+    """
+    Yields precompute_drive_trajectory results of jobs, one fresh process per
+    drive. A worker dying without a Python exception (e.g. a segfault in
+    OpenCV) breaks the whole executor, so the drives left unfinished are
+    retried one at a time and only the one that crashes alone is reported.
+    """
+    unfinished = []
+    with ProcessPoolExecutor(num_workers, max_tasks_per_child=1) as executor:
+        futures = {executor.submit(precompute_drive_trajectory, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+    for job in unfinished:
+        with ProcessPoolExecutor(1, max_tasks_per_child=1) as executor:
+            try:
+                yield executor.submit(precompute_drive_trajectory, job).result()
+            except BrokenProcessPool:
+                yield job['date_folder'], job['sub_folder'], "BrokenProcessPool: worker process crashed"
+
+def precompute_trajectories(kitti_raw_base_path, num_workers=None, kitti_tree=None, **kwargs):
+    """
+    Warms the trajectory cache of every drive under kitti_raw_base_path using a
+    process pool, one drive per process. A failing drive, even one crashing
+    its worker, does not stop the others.
+    Returns {(date_folder, sub_folder): None on success or the error message}
+    """
+    if kitti_tree is None:
+        kitti_tree = get_kitti_tree(kitti_raw_base_path, kwargs.get('file_source'))
+    kwargs = dict(kwargs, kitti_raw_base_path=kitti_raw_base_path, compute_trajectory=True)
+    jobs = []
+    for date_folder in kitti_tree:
+        for sub_folder in kitti_tree[date_folder]:
+            jobs.append(dict(kwargs, date_folder=date_folder, sub_folder=sub_folder))
+
+    results = dict()
+    for date_folder, sub_folder, error in tqdm.tqdm(run_drive_jobs(jobs, num_workers), total=len(jobs), desc="Drives"):
+        results[(date_folder, sub_folder)] = error
+        if error is not None:
+            print("Trajectory failed for", sub_folder, ":", error)
+    return results
+
 def get_kitti_raw(**kwargs):
     kitti_raw_base_path=kwargs['kitti_raw_base_path']
-    kitti_tree = get_kitti_tree(kitti_raw_base_path)
+    kitti_tree = get_kitti_tree(kitti_raw_base_path, kwargs.get('file_source'))
+    num_workers = kwargs.pop('num_workers', None)
+    if kwargs.get('compute_trajectory', False) and num_workers:
+        precompute_trajectories(kitti_tree=kitti_tree, num_workers=num_workers, **kwargs)
+        kwargs['invalidate_cache'] = False
     kitti_raw = []
     for date_folder in kitti_tree:
         for sub_folder in kitti_tree[date_folder]:
@@ -998,6 +1419,7 @@ if __name__ == "__main__":
     main(None)
     exit()
     if plot3d:
+        from torch.multiprocessing import Process
         image_loop_proc = Process(target=main, args=(point_cloud_array, ))
         image_loop_proc.start()
         
@@ -0,0 +1,53 @@
+import numpy as np
+
+RANGE_IMAGE_CHANNELS = ('range', 'x', 'y', 'z', 'reflectance')
+
+def spherical_projection(velodyine_points, v_fov, h_fov, height=64, width=1024):
+    '''
+    Projects a LiDAR sweep onto a (height, width) range image.
+
+    Rows span v_fov (top row = highest pitch) and columns span h_fov (left
+    column = largest yaw, i.e. the left of the vehicle), both in degrees. When
+    several points fall on the same pixel the nearest one is kept.
+
+    Args:
+        velodyine_points: (N, 3) or (N, 4) x,y,z[,reflectance] velodyne points
+    Returns:
+        dict with
+            range_image   (5, height, width) float32 range, x, y, z, reflectance (0 where empty)
+            mask          (height, width) bool, pixels holding a point
+            point_index   (height, width) int64 index of the point kept in each pixel, -1 where empty
+            pixel_index   (N,) int64 flat pixel of every point, -1 outside the field of view,
+                          to back-project per-pixel predictions to all points
+    '''
+    points = np.asarray(velodyine_points)
+    xyz = points[:, :3].astype(np.float64)
+    ranges = np.linalg.norm(xyz, axis=1)
+    yaw = np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0]))
+    pitch = np.degrees(np.arcsin(np.divide(xyz[:, 2], ranges, out=np.zeros_like(ranges), where=ranges > 0)))
+
+    u = np.floor((h_fov[1] - yaw) / (h_fov[1] - h_fov[0]) * width).astype(np.int64)
+    v = np.floor((v_fov[1] - pitch) / (v_fov[1] - v_fov[0]) * height).astype(np.int64)
+    inside = (ranges > 0) & (0 <= u) & (u < width) & (0 <= v) & (v < height)
+    pixel_index = np.where(inside, v * width + u, -1)
+
+    # Nearest point first, np.unique keeps the first occurrence of every pixel
+    candidates = np.flatnonzero(inside)
+    candidates = candidates[np.argsort(ranges[candidates], kind='stable')]
+    pixels, first = np.unique(pixel_index[candidates], return_index=True)
+    kept = candidates[first]
+
+    range_image = np.zeros((len(RANGE_IMAGE_CHANNELS), height * width), dtype=np.float32)
+    range_image[0, pixels] = ranges[kept]
+    range_image[1:4, pixels] = xyz[kept].T
+    if points.shape[1] > 3:
+        range_image[4, pixels] = points[kept, 3]
+    point_index = np.full(height * width, -1, dtype=np.int64)
+    point_index[pixels] = kept
+
+    return {
+        'range_image': range_image.reshape(len(RANGE_IMAGE_CHANNELS), height, width),
+        'mask': (point_index >= 0).reshape(height, width),
+        'point_index': point_index.reshape(height, width),
+        'pixel_index': pixel_index,
+    }
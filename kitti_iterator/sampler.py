@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+
+from .helper import lazy_import
+
+torch = lazy_import('torch')
+
+def drive_lengths(datasets):
+    '''Frame counts of a list or ConcatDataset of drive datasets, or a list of counts'''
+    datasets = getattr(datasets, 'datasets', datasets)
+    return list(map(lambda dataset: dataset if isinstance(dataset, (int, np.integer)) else len(dataset), datasets))
+
+def drive_chunks(lengths, chunk_size, indices=None):
+    '''
+    Splits the frames of every drive (all of them, or the sorted subset of
+    ConcatDataset indices given) into ceil(count / chunk_size) runs of
+    near-equal size, as arrays of ConcatDataset indices
+    '''
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if indices is not None:
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        assert len(indices) == 0 or (indices[0] >= 0 and indices[-1] < offsets[-1]), "indices out of range"
+    chunks = []
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        if indices is None:
+            frames = np.arange(start, stop)
+        else:
+            frames = indices[np.searchsorted(indices, start):np.searchsorted(indices, stop)]
+        count = -(-len(frames) // chunk_size)
+        bounds = np.linspace(0, len(frames), count + 1).round().astype(np.int64)
+        chunks += list(map(lambda bound: frames[bound[0]:bound[1]], zip(bounds[:-1], bounds[1:])))
+    return chunks
+
+class DistributedDriveSampler:
+    '''
+    Sampler over a collection of drives (the ConcatDataset of get_kitti_raw)
+    for distributed training.
+
+    Drives are cut into contiguous chunks of at most chunk_size frames, the
+    chunks are shuffled with seed + epoch (identically on every rank) and the
+    resulting frame sequence is split into num_replicas contiguous spans of
+    equal length. Every rank therefore gets the same number of frames, read in
+    runs of consecutive frames of one drive, and only the chunks at span
+    boundaries are shared between two ranks. As with DistributedSampler the
+    sequence is padded by wrapping around to a multiple of num_replicas, or
+    truncated with drop_last.
+
+    Only the frame counts are needed, so ranks can be simulated by building
+    one sampler per rank on a single machine.
+
+    Args:
+        datasets: list or ConcatDataset of drive datasets, or a list of frame counts
+        num_replicas, rank: default to the torch.distributed process group, else 1 and 0
+        chunk_size(int): longest run of consecutive frames of a drive
+        indices: ConcatDataset indices to sample from, e.g. a FrameStatsTable selection
+    '''
+
+    def __init__(self, datasets, num_replicas=None, rank=None, shuffle=True, seed=0, chunk_size=64, drop_last=False, indices=None):
+        if num_replicas is None or rank is None:
+            distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+            if num_replicas is None:
+                num_replicas = torch.distributed.get_world_size() if distributed else 1
+            if rank is None:
+                rank = torch.distributed.get_rank() if distributed else 0
+        assert 0 <= rank < num_replicas, (rank, num_replicas)
+        assert chunk_size >= 1, chunk_size
+        self.lengths = drive_lengths(datasets)
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.shuffle = shuffle
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.chunks = drive_chunks(self.lengths, chunk_size, indices)
+        self.total_size = sum(map(len, self.chunks))
+        if drop_last:
+            self.num_samples = self.total_size // num_replicas
+        else:
+            self.num_samples = -(-self.total_size // num_replicas)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def indices(self):
+        '''ConcatDataset indices of this rank for the current epoch'''
+        chunks = list(self.chunks)
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(chunks)
+        order = np.concatenate([np.zeros(0, dtype=np.int64)] + chunks)
+        padded_size = self.num_samples * self.num_replicas
+        if padded_size > len(order) and len(order):
+            order = np.resize(order, padded_size)
+        start = self.rank * self.num_samples
+        return order[start:start + self.num_samples]
+
+    def __iter__(self):
+        return iter(self.indices().tolist())
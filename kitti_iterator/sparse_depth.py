@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from .helper import lazy_import
+from .trajectory import write_header
+from .file_source import LocalFileSource, decode_image
+
+cv2 = lazy_import('cv2')
+
+SPARSE_DEPTH_CACHE_DIR = ".sparse_depth_cache"
+SPARSE_DEPTH_STORE_VERSION = 1
+SPARSE_DEPTH_HEADER = "header.json"
+SPARSE_DEPTH_OFFSETS = "offsets.npy"
+SPARSE_DEPTH_INDICES = "indices.npy"
+SPARSE_DEPTH_VALUES = "depth.npy"
+
+def decode_depth_png(path, file_source=None):
+    '''Metric float32 depth of a KITTI depth PNG (uint16 depth * 256), 0 where unknown'''
+    if file_source is None:
+        depth_png = cv2.imread(path, cv2.IMREAD_ANYDEPTH)
+    else:
+        depth_png = decode_image(file_source.read(path), cv2.IMREAD_ANYDEPTH, path)
+    assert depth_png is not None and depth_png.dtype == np.uint16, path
+    return depth_png.astype(np.float32) / 256.0
+
+def sparsify_depth(depth):
+    '''
+    Sparse form of a dense depth map: int32 flat pixel indices (row major) of
+    the valid pixels, their float32 depth and the (h, w) shape
+    '''
+    depth = np.asarray(depth, dtype=np.float32)
+    indices = np.flatnonzero(depth > 0).astype(np.int32)
+    return {
+        'indices': indices,
+        'depth': depth.ravel()[indices],
+        'shape': tuple(depth.shape),
+    }
+
+def densify_depth(sparse_depth, out=None):
+    '''Scatters a sparse depth map back into a dense float32 (h, w) array, reusing out if given'''
+    shape = tuple(sparse_depth['shape'])
+    if out is None:
+        out = np.zeros(shape, dtype=np.float32)
+    else:
+        assert out.shape == shape, (out.shape, shape)
+        out.fill(0)
+    out.reshape(-1)[sparse_depth['indices']] = sparse_depth['depth']
+    return out
+
+def resample_sparse_depth(sparse_depth, shape):
+    '''
+    Sparse depth on a smaller (h, w) grid: every valid pixel moves to the
+    nearest pixel of the map resampled by (w / width, h / height), pixel
+    centres onto pixel centres as with the reduced image decodes, and the
+    nearest depth is kept where several land. Unlike resizing the dense map
+    this neither blends depths nor fills unknown pixels.
+    '''
+    height, width = sparse_depth['shape']
+    h, w = shape
+    v, u = np.divmod(np.asarray(sparse_depth['indices'], dtype=np.int64), width)
+    u = np.round((u + 0.5) * (w / width) - 0.5).astype(np.int64).clip(0, w - 1)
+    v = np.round((v + 0.5) * (h / height) - 0.5).astype(np.int64).clip(0, h - 1)
+    # Nearest depth first, np.unique keeps the first occurrence of every pixel
+    order = np.argsort(sparse_depth['depth'], kind='stable')
+    pixels, first = np.unique((v * w + u)[order], return_index=True)
+    return {
+        'indices': pixels.astype(np.int32),
+        'depth': np.asarray(sparse_depth['depth'])[order][first],
+        'shape': (h, w),
+    }
+
+def sparse_depth_params(png_paths, file_source=None):
+    '''Frames a packed store depends on; any added, removed or rewritten PNG invalidates it'''
+    if file_source is None:
+        file_source = LocalFileSource()
+    digest = hashlib.sha1()
+    for path in png_paths:
+        size, mtime_ns = file_source.stat(path)
+        digest.update((os.path.basename(path) + ":" + str(size) + ":" + str(mtime_ns) + "\n").encode())
+    return {
+        'frame_count': len(png_paths),
+        'frame_digest': digest.hexdigest(),
+    }
+
+def save_array(path, array):
+    # Replaced atomically so stores still memory-mapping the old file keep reading it
+    with open(path + '.tmp', 'wb') as handle:
+        np.save(handle, array)
+    os.replace(path + '.tmp', path)
+
+class SparseDepthStore:
+    '''
+    Packed, memory-mapped valid pixels of every depth map of one drive camera.
+
+    A store is a folder holding four files:
+        header.json     version, (h, w) shape, frame ids and the parameters used
+        offsets.npy     (frame_count + 1,) int64 start of each frame in the packed arrays
+        indices.npy     (total_valid,) int32 flat pixel indices
+        depth.npy       (total_valid,) float32 metric depth
+
+    Frame `i` is the slice offsets[i]:offsets[i+1] of indices and depth.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SPARSE_DEPTH_HEADER), 'r') as handle:
+            self.header = json.load(handle)
+        assert self.header['version'] == SPARSE_DEPTH_STORE_VERSION, self.header
+        self.offsets = np.load(os.path.join(path, SPARSE_DEPTH_OFFSETS), mmap_mode='r')
+        self.indices = np.load(os.path.join(path, SPARSE_DEPTH_INDICES), mmap_mode='r')
+        self.depth = np.load(os.path.join(path, SPARSE_DEPTH_VALUES), mmap_mode='r')
+        assert self.offsets.shape == (len(self.ids) + 1,), self.offsets.shape
+        assert self.indices.shape == self.depth.shape == (self.offsets[-1],), self.indices.shape
+
+    @classmethod
+    def build(cls, path, png_paths, params=dict(), file_source=None):
+        '''Decodes every PNG once and packs its valid pixels into a new store at path'''
+        os.makedirs(path, exist_ok=True)
+        frames = list(map(lambda png_path: sparsify_depth(decode_depth_png(png_path, file_source)), png_paths))
+        shapes = set(map(lambda frame: frame['shape'], frames))
+        assert len(shapes) <= 1, "Depth maps of a drive differ in shape: " + str(shapes)
+        counts = list(map(lambda frame: len(frame['indices']), frames))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        save_array(os.path.join(path, SPARSE_DEPTH_OFFSETS), offsets)
+        save_array(os.path.join(path, SPARSE_DEPTH_INDICES),
+            np.concatenate([frame['indices'] for frame in frames] + [np.zeros(0, dtype=np.int32)]))
+        save_array(os.path.join(path, SPARSE_DEPTH_VALUES),
+            np.concatenate([frame['depth'] for frame in frames] + [np.zeros(0, dtype=np.float32)]))
+        write_header(path, {
+            'version': SPARSE_DEPTH_STORE_VERSION,
+            'shape': list(shapes.pop()) if shapes else [0, 0],
+            'ids': list(map(lambda png_path: os.path.basename(png_path).split(".png")[0], png_paths)),
+            'params': params,
+        })
+        return cls(path)
+
+    @staticmethod
+    def exists(path):
+        return all(map(
+            lambda name: os.path.exists(os.path.join(path, name)),
+            (SPARSE_DEPTH_HEADER, SPARSE_DEPTH_OFFSETS, SPARSE_DEPTH_INDICES, SPARSE_DEPTH_VALUES)
+        ))
+
+    @property
+    def ids(self):
+        return self.header['ids']
+
+    @property
+    def shape(self):
+        return tuple(self.header['shape'])
+
+    @property
+    def params(self):
+        return self.header['params']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        '''Sparse depth of frame index, copied out of the memory map so it pickles small'''
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return {
+            'indices': np.array(self.indices[start:stop]),
+            'depth': np.array(self.depth[start:stop]),
+            'shape': self.shape,
+        }
+
+    def __getstate__(self):
+        # Pickled by path, every process maps the same read-only pages
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+def open_sparse_depth_store(path, png_paths, invalidate_cache=False, file_source=None):
+    '''
+    Returns the SparseDepthStore at path, building it first when missing,
+    unreadable or computed from a different set of PNGs
+    '''
+    params = sparse_depth_params(png_paths, file_source)
+    if not invalidate_cache and SparseDepthStore.exists(path):
+        try:
+            store = SparseDepthStore(path)
+            if store.params == params:
+                return store
+            print("Sparse depth cache outdated, rebuilding: ", path)
+        except (OSError, ValueError, KeyError, AssertionError) as exc:
+            print("Sparse depth cache unreadable, rebuilding: ", path, exc)
+    return SparseDepthStore.build(path, png_paths, params, file_source)
@@ -0,0 +1,138 @@
+import sys
+
+import numpy as np
+
+from .helper import lazy_import
+
+cv2 = lazy_import('cv2')
+torch = lazy_import('torch')
+
+def torch_dtype(dtype):
+    '''torch dtype from a torch dtype, a name ('float16') or a numpy dtype'''
+    if dtype is None or isinstance(dtype, torch.dtype):
+        return dtype
+    return getattr(torch, np.dtype(dtype).name if not isinstance(dtype, str) else dtype)
+
+class PinnedBufferPool:
+    '''
+    Ring of preallocated page-locked tensors per (shape, dtype).
+
+    `acquire` hands out the buffers of a ring in turn, so a buffer comes back
+    after `size` more acquisitions of the same shape; size should exceed the
+    number of samples alive at once (e.g. batch_size * prefetch). A buffer
+    still in use when its turn comes, through its tensor or any view or
+    numpy array of its storage, is left to its holder and replaced by a new
+    one (counted in `reallocations`), so held samples are never overwritten.
+    Storage shared through other means (e.g. a raw data_ptr) is not tracked.
+
+    Pinned host memory lets `.to(device, non_blocking=True)` copy without
+    staging when the samples are consumed in the loading process
+    (num_workers=0 or a custom loader). Inside DataLoader workers buffers are
+    never pinned, which would initialise CUDA in the worker; use the
+    DataLoader's pin_memory there. Falls back to pageable memory without CUDA.
+    '''
+
+    def __init__(self, size=8):
+        assert size >= 1, size
+        self.size = size
+        self.rings = dict()
+        self.reallocations = 0
+
+    def allocate(self, shape, dtype):
+        from torch.utils.data import get_worker_info
+        pin = get_worker_info() is None and torch.cuda.is_available()
+        return torch.empty(shape, dtype=dtype, pin_memory=pin)
+
+    def acquire(self, shape, dtype):
+        key = (tuple(shape), dtype)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = [[], 0]
+        buffers, position = ring
+        if len(buffers) < self.size:
+            buffers.append(self.allocate(key[0], dtype))
+            return buffers[-1]
+        ring[1] = (position + 1) % self.size
+        if self.in_use(buffers[position]):
+            buffers[position] = self.allocate(key[0], dtype)
+            self.reallocations += 1
+        return buffers[position]
+
+    @staticmethod
+    def in_use(buffer):
+        # A free buffer is referred to by the ring list, this argument and getrefcount's;
+        # its storage by the buffer and the temporary storage object only
+        if sys.getrefcount(buffer) > 3:
+            return True
+        return torch._C._storage_Use_Count(buffer.untyped_storage()._cdata) > 2
+
+    def __getstate__(self):
+        # Workers build their own buffers
+        state = self.__dict__.copy()
+        state['rings'] = dict()
+        return state
+
+class TensorWriter:
+    '''
+    Writes images straight into channel-first (C, H, W) tensors of the
+    requested dtype, allocated from a PinnedBufferPool when given. scale
+    multiplies the values (e.g. 1/255 for float outputs), rgb reverses the
+    BGR channel order of OpenCV.
+    '''
+
+    def __init__(self, dtype=None, scale=None, rgb=False, pool=None):
+        self.dtype = torch_dtype(dtype)
+        self.scale = scale
+        self.rgb = rgb
+        self.pool = pool
+
+    def allocate(self, shape, dtype):
+        if self.pool is not None:
+            return self.pool.acquire(shape, dtype)
+        return torch.empty(shape, dtype=dtype)
+
+    def output_dtype(self, image):
+        return self.dtype if self.dtype is not None else torch_dtype(image.dtype)
+
+    def channel_order(self, channels):
+        return list(reversed(range(channels))) if self.rgb and channels == 3 else list(range(channels))
+
+    def finish(self, tensor):
+        if self.scale is not None:
+            tensor.mul_(self.scale)
+        return tensor
+
+    def image(self, image):
+        '''(H, W[, C]) numpy image to a (C, H, W) tensor, one copy'''
+        planes = image[:, :, None] if image.ndim == 2 else image
+        dtype = self.output_dtype(image)
+        tensor = self.allocate((planes.shape[2],) + planes.shape[:2], dtype)
+        source = torch.from_numpy(np.ascontiguousarray(planes))
+        tensor.copy_(source.permute(2, 0, 1)[self.channel_order(planes.shape[2])])
+        return self.finish(tensor)
+
+    def remap(self, image, map_1, map_2, interpolation):
+        '''
+        cv2.remap of an (H, W[, C]) image with every channel written straight
+        into its plane of the output tensor
+        '''
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        dtype = self.output_dtype(image)
+        height, width = map_1.shape[:2]
+        tensor = self.allocate((channels, height, width), dtype)
+        # cv2 writes into the planes directly for its own dtypes, other ones go through float32
+        direct = dtype in (torch.uint8, torch.float32) and (dtype == torch.uint8) == (image.dtype == np.uint8)
+        source = image if dtype != torch.float32 or image.dtype == np.float32 else image.astype(np.float32)
+        planes = [source] if channels == 1 else cv2.split(source)
+        for plane, channel in zip(self.channel_order(channels), range(channels)):
+            if direct:
+                cv2.remap(planes[channel], map_1, map_2, interpolation, dst=tensor[plane].numpy())
+            else:
+                tensor[plane].copy_(torch.from_numpy(cv2.remap(planes[channel], map_1, map_2, interpolation)))
+        return self.finish(tensor)
+
+    def array(self, value):
+        '''Other numpy outputs become tensors sharing their memory when possible'''
+        if not value.flags.writeable:
+            value = value.copy()
+        return torch.from_numpy(np.ascontiguousarray(value))
@@ -0,0 +1,237 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+TRAJECTORY_STORE_VERSION = 1
+TRAJECTORY_HEADER = "header.json"
+TRAJECTORY_POSITIONS = "positions.npy"
+TRAJECTORY_ROTATIONS = "rotations.npy"
+
+class TrajectoryStore:
+    '''
+    Columnar, memory-mapped store of per-frame camera poses.
+
+    A store is a folder holding three files:
+        header.json     version, frame_count, number of tracked frames and the parameters used
+        positions.npy   (frame_count, 3) float64 camera positions
+        rotations.npy   (frame_count, 3, 3) float64 camera rotations
+
+    Rows are written in frame order; rows at or past `tracked` have not been
+    computed yet and hold NaN. `checkpoint()` flushes the arrays before the
+    header so an interrupted run can resume from the last checkpointed frame.
+    '''
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, TRAJECTORY_HEADER), 'r') as handle:
+            self.header = json.load(handle)
+        assert self.header['version'] == TRAJECTORY_STORE_VERSION, self.header
+        self.positions = np.load(os.path.join(path, TRAJECTORY_POSITIONS), mmap_mode=mode)
+        self.rotations = np.load(os.path.join(path, TRAJECTORY_ROTATIONS), mmap_mode=mode)
+        assert self.positions.shape == (self.frame_count, 3), self.positions.shape
+        assert self.rotations.shape == (self.frame_count, 3, 3), self.rotations.shape
+
+    @classmethod
+    def create(cls, path, frame_count, params=dict()):
+        os.makedirs(path, exist_ok=True)
+        positions = np.lib.format.open_memmap(os.path.join(path, TRAJECTORY_POSITIONS),
+            mode='w+', dtype=np.float64, shape=(frame_count, 3))
+        rotations = np.lib.format.open_memmap(os.path.join(path, TRAJECTORY_ROTATIONS),
+            mode='w+', dtype=np.float64, shape=(frame_count, 3, 3))
+        positions[:] = np.nan
+        rotations[:] = np.nan
+        positions.flush()
+        rotations.flush()
+        del positions, rotations
+        write_header(path, {
+            'version': TRAJECTORY_STORE_VERSION,
+            'frame_count': frame_count,
+            'tracked': 0,
+            'params': params,
+        })
+        return cls(path, mode='r+')
+
+    @staticmethod
+    def exists(path):
+        return all(map(
+            lambda name: os.path.exists(os.path.join(path, name)),
+            (TRAJECTORY_HEADER, TRAJECTORY_POSITIONS, TRAJECTORY_ROTATIONS)
+        ))
+
+    @property
+    def frame_count(self):
+        return self.header['frame_count']
+
+    @property
+    def tracked(self):
+        return self.header['tracked']
+
+    @property
+    def params(self):
+        return self.header['params']
+
+    @property
+    def complete(self):
+        return self.tracked == self.frame_count
+
+    def __len__(self):
+        return self.frame_count
+
+    def write(self, index, position, rotation):
+        assert self.mode != 'r', "TrajectoryStore opened read-only: " + self.path
+        self.positions[index] = np.reshape(position, (3,))
+        self.rotations[index] = np.reshape(rotation, (3,3))
+
+    def checkpoint(self, tracked):
+        '''Flush rows [0, tracked) to disk and record them as valid in the header'''
+        self.positions.flush()
+        self.rotations.flush()
+        self.header['tracked'] = int(tracked)
+        write_header(self.path, self.header)
+
+    def get_pose(self, index):
+        '''Returns (position (3,), rotation (3,3)) views into the memory-mapped arrays'''
+        return self.positions[index], self.rotations[index]
+
+    def __getitem__(self, key):
+        if key in ('x', 'y', 'z'):
+            return self.positions[:, 'xyz'.index(key)]
+        if key == 'rot':
+            return self.rotations
+        return self.get_pose(key)
+
+    def __getstate__(self):
+        # Pickled by path, every process maps the same read-only pages
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'x': self.positions[:, 0], 'y': self.positions[:, 1], 'z': self.positions[:, 2],
+            'rot': list(self.rotations)
+        })
+
+def trajectory_params(img_list, scale_factor, num_features, tracker_config):
+    '''
+    Parameters a cached trajectory depends on, normalised through JSON so they
+    compare equal to the copy read back from a store header
+    '''
+    frame_digest = hashlib.sha1("\n".join(img_list).encode()).hexdigest()
+    return json.loads(json.dumps({
+        'scale_factor': float(scale_factor),
+        'num_features': int(num_features),
+        'tracker_config': tracker_config,
+        'frame_count': len(img_list),
+        'frame_digest': frame_digest,
+    }))
+
+def trajectory_key(params):
+    '''Short digest of the parameters, used to key stores computed with different settings'''
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+def prune_stale_trajectories(path):
+    '''
+    Removes the stores next to path that hold the same drive under another
+    trajectory_key, left over from runs with different parameters
+    '''
+    folder, name = os.path.split(path)
+    prefix, key = name.rsplit("_", 1)
+    for sibling in os.listdir(folder):
+        sibling_path = os.path.join(folder, sibling)
+        if sibling == name or not sibling.startswith(prefix + "_"):
+            continue
+        sibling_key = sibling[len(prefix) + 1:]
+        if len(sibling_key) == len(key) and "_" not in sibling_key and os.path.exists(os.path.join(sibling_path, TRAJECTORY_HEADER)):
+            print("Removing outdated trajectory cache: ", sibling_path)
+            shutil.rmtree(sibling_path, ignore_errors=True)
+
+def open_valid_trajectory(path, params):
+    '''
+    Returns the TrajectoryStore at path if it was computed with params, else None.
+    Missing, stale, mismatched or unreadable stores all count as invalid.
+    '''
+    if not TrajectoryStore.exists(path):
+        return None
+    try:
+        store = TrajectoryStore(path)
+    except (OSError, ValueError, KeyError, AssertionError) as exc:
+        print("Trajectory cache unreadable, recomputing: ", path, exc)
+        return None
+    if store.params != params or store.frame_count != params['frame_count']:
+        print("Trajectory cache parameters changed, recomputing: ", path)
+        return None
+    return store
+
+def write_header(path, header):
+    '''Atomically replace the header of the store at path'''
+    header_path = os.path.join(path, TRAJECTORY_HEADER)
+    with open(header_path + '.tmp', 'w') as handle:
+        json.dump(header, handle, indent=4)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(header_path + '.tmp', header_path)
+
+EARTH_RADIUS = 6378137.0
+
+def oxts_pose_matrices(oxts):
+    '''
+    Converts OXTS packets (N, >=6: lat, lon, alt, roll, pitch, yaw) into (N, 4, 4)
+    IMU-to-world poses using a Mercator projection, following the KITTI devkit
+    (convertOxtsToPose). Poses are relative to the first valid packet; rows of
+    NaN packets stay NaN.
+    '''
+    oxts = np.asarray(oxts, dtype=np.float64)
+    poses = np.full((oxts.shape[0], 4, 4), np.nan)
+    valid = np.flatnonzero(np.all(np.isfinite(oxts[:, :6]), axis=1))
+    if len(valid) == 0:
+        return poses
+    lat, lon, alt, roll, pitch, yaw = oxts[valid, :6].T
+
+    scale = np.cos(lat[0] * np.pi / 180.0)
+    t = np.stack((
+        scale * lon * np.pi * EARTH_RADIUS / 180.0,
+        scale * EARTH_RADIUS * np.log(np.tan((90.0 + lat) * np.pi / 360.0)),
+        alt
+    ), axis=1)
+
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    zeros, ones = np.zeros_like(roll), np.ones_like(roll)
+    Rx = np.stack((ones, zeros, zeros, zeros, cr, -sr, zeros, sr, cr), axis=1).reshape(-1, 3, 3)
+    Ry = np.stack((cp, zeros, sp, zeros, ones, zeros, -sp, zeros, cp), axis=1).reshape(-1, 3, 3)
+    Rz = np.stack((cy, -sy, zeros, sy, cy, zeros, zeros, zeros, ones), axis=1).reshape(-1, 3, 3)
+
+    pose = np.zeros((len(valid), 4, 4))
+    pose[:, :3, :3] = Rz @ Ry @ Rx
+    pose[:, :3, 3] = t
+    pose[:, 3, 3] = 1.0
+    poses[valid] = np.linalg.inv(pose[0]) @ pose
+    return poses
+
+OXTS_FIELDS = 30
+
+def load_oxts_packets(oxts_path, img_list, file_source=None):
+    '''(len(img_list), 30) OXTS packets (see oxts/dataformat.txt); frames without one are NaN'''
+    oxts = np.full((len(img_list), OXTS_FIELDS), np.nan)
+    for index, id in enumerate(img_list):
+        oxts_file = os.path.join(oxts_path, 'data', id + ".txt")
+        if file_source is None:
+            if os.path.exists(oxts_file):
+                packet = np.loadtxt(oxts_file)[:OXTS_FIELDS]
+                oxts[index, :len(packet)] = packet
+        elif file_source.exists(oxts_file):
+            packet = np.array(bytes(file_source.read(oxts_file)).split(), dtype=np.float64)[:OXTS_FIELDS]
+            oxts[index, :len(packet)] = packet
+    return oxts
+
+def load_oxts_poses(oxts_path, img_list, file_source=None):
+    '''(len(img_list), 4, 4) IMU-to-world poses; frames without an OXTS packet are NaN'''
+    return oxts_pose_matrices(load_oxts_packets(oxts_path, img_list, file_source)[:, :6])
@@ -0,0 +1,194 @@
+import numpy as np
+
+from .helper import lazy_import
+
+cv2 = lazy_import('cv2')
+
+class Transform:
+    '''
+    One stage of a Compose pipeline.
+
+    A stage reads the sample fields in `inputs` and writes those in `outputs`.
+    Per-sample stages run on every sample inside the dataset (and so inside
+    DataLoader workers); per-batch stages run on collated batches through
+    Compose.collate. Stages flagged `decodable` are image operations the
+    dataset may fold into decoding.
+    '''
+    inputs = ()
+    outputs = ()
+    per_batch = False
+    decodable = False
+
+    def __call__(self, data):
+        raise NotImplementedError
+
+class Lambda(Transform):
+    '''
+    data[field] = fn(data[inputs[0]], data[inputs[1]], ...), inputs defaulting
+    to (field,). A field computed only from other fields is never produced by
+    the dataset itself.
+    '''
+
+    def __init__(self, field, fn, inputs=None, per_batch=False):
+        self.field = field
+        self.fn = fn
+        self.inputs = (field,) if inputs is None else tuple(inputs)
+        self.outputs = (field,)
+        self.per_batch = per_batch
+
+    def __call__(self, data):
+        data[self.field] = self.fn(*map(lambda key: data[key], self.inputs))
+        return data
+
+class Select(Transform):
+    '''Keeps only fields, the dataset skips computing every other one'''
+
+    def __init__(self, *fields, per_batch=False):
+        self.fields = fields
+        self.inputs = fields
+        self.per_batch = per_batch
+
+    def __call__(self, data):
+        return {key: data[key] for key in self.fields}
+
+class ImageTransform(Transform):
+    '''In-place operation on image fields, applied field by field'''
+    decodable = True
+
+    def __init__(self, fields, per_batch=False):
+        self.fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        self.inputs = self.fields
+        self.outputs = self.fields
+        self.per_batch = per_batch
+
+    def apply(self, image):
+        raise NotImplementedError
+
+    def __call__(self, data):
+        for field in self.fields:
+            data[field] = self.apply(data[field])
+        return data
+
+class Crop(ImageTransform):
+    '''Crops the (x, y, w, h) box of HWC images'''
+
+    def __init__(self, fields, box, per_batch=False):
+        super().__init__(fields, per_batch)
+        self.box = tuple(map(int, box))
+
+    def apply(self, image):
+        x, y, w, h = self.box
+        if self.per_batch: # (b, h, w[, c]) batches
+            return image[:, y:y+h, x:x+w]
+        return image[y:y+h, x:x+w]
+
+class Resize(ImageTransform):
+    '''Resizes HWC images to size = (width, height)'''
+
+    def __init__(self, fields, size, interpolation=None, per_batch=False):
+        assert not per_batch, "Resize runs per sample, cv2 resizes one image at a time"
+        super().__init__(fields, per_batch)
+        self.size = tuple(map(int, size))
+        self.interpolation = interpolation
+
+    def apply(self, image):
+        interpolation = cv2.INTER_AREA if self.interpolation is None else self.interpolation
+        return cv2.resize(image, self.size, interpolation=interpolation)
+
+class Grayscale(ImageTransform):
+    '''BGR to single channel (h, w) images'''
+
+    def __init__(self, fields):
+        super().__init__(fields)
+
+    def apply(self, image):
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+class Cast(ImageTransform):
+    '''Casts to dtype, optionally multiplying by scale first (e.g. 1/255)'''
+
+    def __init__(self, fields, dtype, scale=None, per_batch=False):
+        super().__init__(fields, per_batch)
+        self.dtype = dtype
+        self.scale = scale
+
+    def apply(self, image):
+        if self.scale is not None:
+            return (image * self.scale).astype(self.dtype)
+        return image.astype(self.dtype)
+
+class Compose:
+    '''
+    Ordered transform pipeline with declared fields.
+
+    Per-sample stages must all come before per-batch ones. Given the fields a
+    dataset can produce, `plan()` works out
+        required    the fields that still reach the output, so the dataset
+                    skips the others (dropped by Select or overwritten by a
+                    Lambda that does not read them)
+        decode_ops  field -> leading decodable stages of that field, handed
+                    to the dataset's decoder
+        stages      the per-sample stages left to run on the decoded sample
+    '''
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        per_batch = list(map(lambda stage: stage.per_batch, self.stages))
+        assert per_batch == sorted(per_batch), "per-sample stages must come before per-batch stages"
+        self.sample_stages = list(filter(lambda stage: not stage.per_batch, self.stages))
+        self.batch_stages = list(filter(lambda stage: stage.per_batch, self.stages))
+
+    def required_fields(self, available):
+        '''Fields the dataset has to compute, by backward liveness over the stages'''
+        live = set(available)
+        for stage in self.stages:
+            live |= set(stage.outputs)
+        for stage in reversed(self.stages):
+            if isinstance(stage, Select):
+                live = set(stage.fields)
+                continue
+            written = live & set(stage.outputs)
+            live = (live - set(stage.outputs)) | (set(stage.inputs) if written else set())
+        return live & set(available)
+
+    def plan(self, available, decodable_fields=()):
+        required = self.required_fields(available)
+        decode_ops = dict()
+        stages = []
+        blocked = set()
+        for stage in self.sample_stages:
+            fields = set(stage.inputs) | set(stage.outputs)
+            if stage.decodable and fields <= set(decodable_fields) and not (fields & blocked):
+                for field in stage.fields:
+                    decode_ops.setdefault(field, []).append(stage)
+                continue
+            if not isinstance(stage, Select):
+                blocked |= fields
+            stages.append(stage)
+        return required, decode_ops, stages
+
+    def __call__(self, data, stages=None):
+        for stage in self.sample_stages if stages is None else stages:
+            data = stage(data)
+        return data
+
+    def collate(self, samples):
+        '''collate_fn for a DataLoader: default collation, then the per-batch stages'''
+        from torch.utils.data import default_collate
+        batch = default_collate(samples)
+        for stage in self.batch_stages:
+            batch = stage(batch)
+        return batch
+
+def as_pipeline(transform):
+    '''Accepts the legacy {field: fn} dict, a list of stages or a Compose'''
+    if isinstance(transform, Compose):
+        return transform
+    if isinstance(transform, dict):
+        return Compose([Lambda(key, fn) for key, fn in transform.items()])
+    return Compose(transform)
+
+def apply_image_ops(image, ops):
+    for op in ops:
+        image = op.apply(image)
+    return image
@@ -0,0 +1,36 @@
+import os
+import pytest
+
+KITTI_RAW_MINI = os.path.abspath("kitti_raw_mini")
+
+@pytest.fixture
+def kitti_raw_tmp(tmp_path):
+    '''
+    Writable copy of kitti_raw_mini whose sensor folders are symlinks,
+    so caches written next to the drive do not touch the repository
+    '''
+    date_folder, sub_folder = "2011_09_26", "2011_09_26_drive_0001_sync"
+    src_date = os.path.join(KITTI_RAW_MINI, date_folder)
+    dst_date = tmp_path / date_folder
+    (dst_date / sub_folder).mkdir(parents=True)
+    for name in os.listdir(src_date):
+        if name.endswith(".txt"):
+            os.symlink(os.path.join(src_date, name), dst_date / name)
+    for name in os.listdir(os.path.join(src_date, sub_folder)):
+        if not name.startswith("."):
+            os.symlink(os.path.join(src_date, sub_folder, name), dst_date / sub_folder / name)
+    return str(tmp_path)
+
+KITTI_DEPTH_MINI = os.path.abspath("kitti_depth_mini")
+
+@pytest.fixture
+def kitti_depth_tmp(tmp_path):
+    '''Writable copy of kitti_depth_mini whose camera folders are symlinks'''
+    sub_folder = "2011_09_26_drive_0001_sync"
+    groundtruth = os.path.join("train", sub_folder, "proj_depth", "groundtruth")
+    dst = tmp_path / "kitti_depth" / groundtruth
+    dst.mkdir(parents=True)
+    for name in os.listdir(os.path.join(KITTI_DEPTH_MINI, groundtruth)):
+        if not name.startswith("."):
+            os.symlink(os.path.join(KITTI_DEPTH_MINI, groundtruth, name), dst / name)
+    return str(tmp_path / "kitti_depth")
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def test_voxel_downsample_keeps_first_point():
+    from kitti_iterator.accumulation import accumulate_sweeps
+    sweep = np.array([[0.01, 0.01, 0.01, 1.0], [5.0, 0.0, 0.0, 0.5]], dtype=np.float32)
+    shift = np.eye(4)
+    shift[0, 3] = 0.02
+    points = accumulate_sweeps([sweep, sweep], np.stack((np.eye(4), shift)), voxel_size=0.1)
+    assert points.shape == (2, 4)
+    np.testing.assert_allclose(points, sweep) # the reference sweep wins its voxels
+
+
+def test_accumulated_velodyne_points(kitti_raw_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.trajectory import load_oxts_poses
+    dataset = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, accumulate_sweeps=2, accumulate_voxel_size=0.05)
+
+    poses = load_oxts_poses(dataset.oxts_path, dataset.img_list)
+    np.testing.assert_allclose(poses[0], np.eye(4), atol=1e-9)
+    assert np.isnan(poses[5]).all() # no OXTS packet past frame 4 in the mini drive
+
+    single = dataset.read_velodyne_points(dataset.img_list[2])
+    accumulated = dataset.load_velodyne_points(2)
+    assert accumulated.shape[1] == 4
+    assert len(accumulated) > len(single)
+    np.testing.assert_array_equal(accumulated[0], single[0])
+    assert len(dataset.load_velodyne_points(5)) == len(dataset.read_velodyne_points(dataset.img_list[5]))
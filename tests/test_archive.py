@@ -0,0 +1,51 @@
+import os
+import zipfile
+
+from conftest import KITTI_RAW_MINI
+
+def write_zip(zip_path, root, folder, compression):
+    with zipfile.ZipFile(zip_path, 'w', compression) as archive:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, folder)):
+            dirnames[:] = list(filter(lambda name: not name.startswith('.'), dirnames))
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                archive.write(path, os.path.relpath(path, root))
+
+
+def test_zip_archive_source(tmp_path):
+    from kitti_iterator.archive import ZipArchiveSource, archive_index_path
+    from kitti_iterator.kitti_raw_iterator import KittiRaw, get_kitti_tree
+    from kitti_iterator.transforms import Select
+    import pickle
+    import numpy as np
+    date_folder, sub_folder = "2011_09_26", "2011_09_26_drive_0001_sync"
+    drive_zip = str(tmp_path / (sub_folder + ".zip"))
+    write_zip(drive_zip, KITTI_RAW_MINI, os.path.join(date_folder, sub_folder), zipfile.ZIP_STORED)
+    with zipfile.ZipFile(str(tmp_path / (date_folder + "_calib.zip")), 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name in ("calib_cam_to_cam.txt", "calib_imu_to_velo.txt", "calib_velo_to_cam.txt"):
+            archive.write(os.path.join(KITTI_RAW_MINI, date_folder, name), os.path.join(date_folder, name))
+
+    source = ZipArchiveSource(str(tmp_path))
+    assert get_kitti_tree(str(tmp_path), source) == {date_folder: [sub_folder]}
+    assert os.path.exists(archive_index_path(drive_zip))
+    velodyne_bin = os.path.join(str(tmp_path), date_folder, sub_folder, "velodyne_points", "data", "0000000000.bin")
+    assert isinstance(source.read(velodyne_bin), memoryview) # stored members are not copied
+
+    fields = ('image_02', 'velodyine_points', 'calib_cam_to_cam', 'occupancy_grid')
+    kwargs = dict(grid_size=(40.0, 40.0, 8.0), scale=2.0, accumulate_sweeps=1, transform=[Select(*fields)])
+    extracted = KittiRaw(kitti_raw_base_path=KITTI_RAW_MINI, **kwargs)
+    archived = KittiRaw(kitti_raw_base_path=str(tmp_path), file_source=source, **kwargs)
+    assert archived.img_list == extracted.img_list
+    worker = pickle.loads(pickle.dumps(archived))
+    for dataset in (archived, worker):
+        for index in (0, 2):
+            expected, data = extracted[index], dataset[index]
+            for key in ('image_02', 'velodyine_points', 'occupancy_grid'):
+                assert np.array_equal(data[key], expected[key]), key
+            assert np.array_equal(data['calib_cam_to_cam']['P_rect_02'], expected['calib_cam_to_cam']['P_rect_02'])
+    assert np.array_equal(archived.get_sweep_poses()[:5], extracted.get_sweep_poses()[:5])
+
+    # Points are writable as with the local filesystem, although the member is a read-only view
+    single = KittiRaw(kitti_raw_base_path=str(tmp_path), file_source=source, transform=[Select('velodyine_points')])
+    assert archived.read_velodyne_points(single.img_list[0]).flags.writeable
+    assert single[0]['velodyine_points'].flags.writeable
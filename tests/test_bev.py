@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def test_bev_raster():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw, Z_OFFSET
+    dataset = KittiRaw(kitti_raw_base_path="kitti_raw_mini", grid_size=(40.0, 40.0, 8.0), scale=2.0)
+    scan = dataset.read_velodyne_points(dataset.img_list[0])[::10]
+    bev = dataset.transform_points_to_bev(scan)
+    assert bev.shape == (4, dataset.occ_x, dataset.occ_y) and bev.dtype == np.float32
+
+    # Per-cell reference over the points that fall inside the grid
+    points_camera = dataset.transform_points_to_camera(scan)
+    indices, inside = dataset.camera_points_to_occupancy_indices(points_camera)
+    cells = dict()
+    for (i, j, _), height, reflectance in zip(indices[inside], -points_camera[inside, 1] + Z_OFFSET, scan[inside, 3]):
+        cells.setdefault((i, j), []).append((height, reflectance))
+    assert (bev[2] > 0).sum() == len(cells)
+    for (i, j), values in cells.items():
+        heights, reflectances = np.array(values).T
+        np.testing.assert_allclose(bev[:, i, j], [
+            heights.max(), heights.min(), min(1.0, np.log1p(len(values)) / np.log(64)), reflectances.mean()
+        ], rtol=1e-5)
+
+    occupancy = dataset.transform_points_to_occupancy_grid(scan[:, :3])
+    assert np.all(bev[2][occupancy['occupancy_mask_2d'] > 0] > 0)
@@ -0,0 +1,40 @@
+def test_calibration_registry(kitti_raw_tmp, monkeypatch):
+    from kitti_iterator import calibration, kitti_raw_iterator
+    import os
+    import pytest
+    calls = []
+    open_calib = calibration.open_calib
+    monkeypatch.setattr(calibration, "open_calib", lambda path, file_source=None: calls.append(path) or open_calib(path, file_source))
+
+    first = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp)
+    second = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp)
+    assert len(calls) == 3
+    assert first.calibration is second.calibration
+    assert first.roi_02 == second.roi_02
+    assert not first.K_02.flags.writeable
+    with pytest.raises(AttributeError):
+        first.calibration.K_02 = None
+    with pytest.raises(TypeError):
+        first.calib_cam_to_cam['K_02'] = None
+
+    # Editing a calibration file invalidates the shared entry
+    calib_file = os.path.join(kitti_raw_tmp, "2011_09_26", "calib_velo_to_cam.txt")
+    stat = os.stat(calib_file)
+    os.utime(calib_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    third = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp)
+    os.utime(calib_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert len(calls) == 6
+    assert third.calibration is not first.calibration
+
+
+def test_samples_cross_dataloader_workers():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    from torch.utils.data import DataLoader
+    import numpy as np
+    dataset = KittiRaw(transform=[Select('image_02', 'K_02', 'roi_02', 'calib_cam_to_cam', 'calib_velo_to_cam')])
+    loader = DataLoader(dataset, batch_size=None, num_workers=1, timeout=60)
+    data = next(iter(loader))
+    assert np.allclose(data['K_02'].numpy(), dataset.K_02)
+    assert np.allclose(data['calib_cam_to_cam']['P_rect_02'].numpy(), dataset.calib_cam_to_cam['P_rect_02'])
+    assert not dataset.calib_cam_to_cam['P_rect_02'].flags.writeable
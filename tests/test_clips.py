@@ -0,0 +1,49 @@
+class CountingDataset:
+    def __init__(self, length):
+        self.length = length
+        self.loads = []
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        self.loads.append(index)
+        return {'index': index}
+
+
+def test_clip_sliding_window():
+    from kitti_iterator.clips import KittiClips, ClipSampler
+    dataset = CountingDataset(10)
+    clips = KittiClips(dataset, window=3, stride=1, dilation=2)
+    assert len(clips) == 6
+    assert [sample['index'] for sample in clips[1]] == [1, 3, 5]
+
+    dataset.loads.clear()
+    clips = KittiClips(dataset, window=3, stride=1, dilation=2)
+    for clip in clips:
+        assert len(clip) == 3
+    assert sorted(dataset.loads) == list(range(10)) # every frame decoded once
+
+    sampler = ClipSampler(clips, chunk_size=4, seed=1)
+    order = list(sampler)
+    assert sorted(order) == list(range(len(clips)))
+    assert order[order.index(0):order.index(0) + 4] == [0, 1, 2, 3]
+
+
+def test_overlapping_clips_do_not_alias():
+    from kitti_iterator.clips import KittiClips
+    import numpy as np
+
+    class ArrayDataset(CountingDataset):
+        def __getitem__(self, index):
+            super().__getitem__(index)
+            return {'image': np.full(4, index)}
+
+    dataset = ArrayDataset(5)
+    clips = KittiClips(dataset, window=3)
+    first = clips[0]
+    for sample in first:
+        sample['image'] -= 100 # in-place augmentation
+    second = clips[1]
+    assert [sample['image'][0] for sample in second] == [1, 2, 3]
+    assert dataset.loads == [0, 1, 2, 3] # frames 1 and 2 still reused
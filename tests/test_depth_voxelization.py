@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def reference_index(dataset, point):
+    # Scalar indexing of KittiRaw.transform_points_to_occupancy_grid
+    from kitti_iterator.kitti_raw_iterator import Z_OFFSET
+    x, y, z = point
+    x, y, z = z, x, -y
+    y = -y
+    z += Z_OFFSET
+    return (
+        int((x*dataset.occ_x//2)//dataset.grid_x)*2,
+        int((y*dataset.occ_y//2)//dataset.grid_y + dataset.occ_y//2),
+        int((z*dataset.occ_z//2)//dataset.grid_z + dataset.occ_z//2)
+    )
+
+
+def test_depth_voxelization():
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    dataset = KittiDepth(
+        kitti_depth_base_path="kitti_depth_mini",
+        kitti_raw_base_path="kitti_raw_mini",
+        grid_size=(40.0, 40.0, 8.0), scale=2.0,
+    )
+    points = np.random.default_rng(0).uniform((-20, -3, 0), (20, 3, 40), (500, 3))
+    indices, inside = dataset.camera_points_to_occupancy_indices(points)
+    for point, index, keep in zip(points, indices, inside):
+        expected = reference_index(dataset, point)
+        assert tuple(index) == expected
+        assert keep == all(0 < e < s for e, s in zip(expected, dataset.occupancy_shape))
+
+    # A single valid pixel lands in the voxel of its back-projected point
+    depth = np.zeros((dataset.height, dataset.width), dtype=np.float32)
+    depth[200, 600] = 10.0
+    occupancy_grid, voxel_grid = dataset.transform_depth_to_occupancy_grid(depth)
+    P_rect = dataset.calib_cam_to_cam['P_rect_02'].reshape(3, 4)
+    R_rect = dataset.calib_cam_to_cam['R_rect_00'].reshape(3, 3)
+    point = R_rect.T @ np.linalg.solve(P_rect[:3,:3], np.array([600.0, 200.0, 1.0]) * 10.0 - P_rect[:,3])
+    assert voxel_grid.tolist() == [list(reference_index(dataset, point))]
+    assert occupancy_grid.sum() == 1
+
+
+def test_depth_and_lidar_grids_share_a_frame():
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.disparity import velodyne_to_rectified_projection, project_depth
+    dataset = KittiDepth(
+        kitti_depth_base_path="kitti_depth_mini",
+        kitti_raw_base_path="kitti_raw_mini",
+        grid_size=(40.0, 40.0, 8.0), scale=2.0,
+    )
+    sweep = dataset.load_velodyne_points(0)
+    projection = velodyne_to_rectified_projection(dataset.calib_cam_to_cam, dataset.calib_velo_to_cam)
+    depth = project_depth(sweep, projection, (dataset.height, dataset.width))
+    _, depth_voxels = dataset.transform_depth_to_occupancy_grid(depth)
+
+    indices, inside = dataset.camera_points_to_occupancy_indices(dataset.transform_points_to_camera(sweep))
+    lidar_voxels = set(map(tuple, indices[inside].tolist()))
+    shared = sum(map(lambda voxel: tuple(voxel) in lidar_voxels, depth_voxels.tolist()))
+    assert len(depth_voxels) > 100 and shared > 0.98 * len(depth_voxels)
@@ -0,0 +1,29 @@
+def test_lidar_disparity_matches_depth_ground_truth(kitti_depth_tmp):
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.sparse_depth import decode_depth_png
+    from kitti_iterator.disparity import stereo_baseline
+    from kitti_iterator.transforms import Select
+    import os
+    import numpy as np
+    dataset = KittiDepth(kitti_depth_base_path=kitti_depth_tmp, kitti_raw_base_path="kitti_raw_mini",
+        stereo_disparity=True, transform=[Select('disparity', 'disparity_mask', 'image_02_raw', 'image_03_raw')])
+    data = dataset[0]
+    disparity, mask = data['disparity'], data['disparity_mask']
+    assert disparity.dtype == np.float32 and disparity.shape == mask.shape == data['image_02_raw'].shape[:2]
+    assert mask.sum() > 10000 and np.all(disparity[mask] > 0) and np.all(disparity[~mask] == 0)
+
+    # Same pixels as the KITTI depth ground truth, which is accumulated from the same sensor
+    depth_gt = decode_depth_png(os.path.join(dataset.depth_02_path, dataset.img_list[0] + ".png"))
+    both = mask & (depth_gt > 0)
+    depth = stereo_baseline(dataset.calib_cam_to_cam) / disparity[both]
+    assert both.sum() > 0.3 * mask.sum() # the ground truth drops occluded and inconsistent pixels
+    assert np.median(np.abs(depth - depth_gt[both]) / depth_gt[both]) < 0.02
+
+
+def test_project_depth_keeps_nearest_point():
+    from kitti_iterator.disparity import project_depth
+    import numpy as np
+    projection = np.array([[10.0, 0, 2, 0], [0, 10.0, 2, 0], [0, 0, 1, 0]])
+    points = np.array([[0.0, 0.0, 4.0], [0.0, 0.0, 2.0], [0.1, 0.1, 1.0], [0.0, 0.0, -1.0]])
+    depth = project_depth(points, projection, (4, 4))
+    assert depth[2, 2] == 2.0 and depth[3, 3] == 1.0 and np.count_nonzero(depth) == 2
@@ -0,0 +1,29 @@
+import pickle
+import numpy as np
+
+
+def test_streaming_depth_evaluator():
+    from kitti_iterator.helper import compute_errors
+    from kitti_iterator.evaluation import DepthEvaluator, DEPTH_METRICS
+    from kitti_iterator.sparse_depth import sparsify_depth
+    rng = np.random.default_rng(0)
+    gts = rng.uniform(1, 50, (4, 8, 16))
+    gts[:, :4] = 0 # invalid pixels are skipped
+    preds = gts * rng.uniform(0.8, 1.2, gts.shape)
+
+    evaluator = DepthEvaluator()
+    evaluator.update(gts[:2], preds[:2], drive='a')
+    other = pickle.loads(pickle.dumps(DepthEvaluator().state()))
+    other = DepthEvaluator.from_state(other)
+    for gt, pred in zip(gts[2:], preds[2:]):
+        other.update_sparse(sparsify_depth(gt), pred, drive='b')
+    evaluator.merge(other)
+
+    valid = gts > 0
+    expected = compute_errors(gts[valid], preds[valid])
+    np.testing.assert_allclose([evaluator.metrics()[name] for name in DEPTH_METRICS], expected)
+    expected_a = compute_errors(gts[:2][valid[:2]], preds[:2][valid[:2]])
+    np.testing.assert_allclose([evaluator.drive_metrics()['a'][name] for name in DEPTH_METRICS], expected_a)
+
+    frame_means = np.mean([compute_errors(gt, pred, mask=gt > 0) for gt, pred in zip(gts, preds)], axis=0)
+    np.testing.assert_allclose([evaluator.metrics('frames')[name] for name in DEPTH_METRICS], frame_means)
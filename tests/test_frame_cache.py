@@ -0,0 +1,97 @@
+def test_frame_cache_lru_budget():
+    from kitti_iterator.frame_cache import FrameCache
+    import numpy as np
+    cache = FrameCache(max_bytes=3000)
+    for index in range(3):
+        cache.put(index, {'image': np.zeros(1000, dtype=np.uint8)})
+    assert cache.get(0) is not None # 0 becomes most recently used
+    cache.put(3, {'image': np.zeros(1000, dtype=np.uint8)})
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1)
+    assert stats['nbytes'] <= 3000 and stats['field_nbytes'] == {'image': 3000}
+
+
+def test_shared_frame_cache_between_processes():
+    from kitti_iterator.frame_cache import SharedFrameCache
+    import os
+    import pickle
+    import numpy as np
+    cache = SharedFrameCache(max_bytes=1 << 20)
+    worker_cache = pickle.loads(pickle.dumps(cache)) # what a spawned DataLoader worker receives
+    worker_cache.put(5, {'image': np.arange(10)})
+    assert np.array_equal(cache.get(5)['image'], np.arange(10))
+    del worker_cache
+    assert os.path.isdir(cache.path)
+    path = cache.path
+    del cache
+    assert not os.path.exists(path)
+
+
+def test_kitti_raw_frame_cache(kitti_raw_tmp):
+    from kitti_iterator import kitti_raw_iterator
+    import numpy as np
+    raw_iter = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp, frame_cache_bytes=1 << 30)
+    first = raw_iter[0]
+    second = raw_iter[0]
+    assert np.array_equal(first['image_02'], second['image_02'])
+    assert raw_iter.frame_cache.stats()['hits'] == 1
+
+
+def test_frame_cache_returns_independent_copies():
+    from kitti_iterator.frame_cache import FrameCache
+    import numpy as np
+    cache = FrameCache(max_bytes=1 << 20)
+    data = {'image': np.zeros(10), 'depth': {'depth': np.zeros(5)}}
+    cache.put(0, data)
+    data['image'][:] = 1 # the sample handed out on the miss
+    hit = cache.get(0)
+    hit['depth']['depth'][:] = 1
+    again = cache.get(0)
+    assert not again['image'].any() and not again['depth']['depth'].any()
+
+
+def test_kitti_raw_shared_frame_cache():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    import numpy as np
+    raw_iter = KittiRaw(frame_cache_bytes=1 << 30, frame_cache_shared=True,
+        transform=[Select('image_02', 'K_02', 'calib_cam_to_cam', 'velodyine_points')])
+    first = raw_iter[0]
+    second = raw_iter[0]
+    assert raw_iter.frame_cache.stats()['hits'] == 1
+    assert np.array_equal(first['velodyine_points'], second['velodyine_points'])
+    assert np.array_equal(first['calib_cam_to_cam']['P_rect_02'], second['calib_cam_to_cam']['P_rect_02'])
+
+
+def test_frame_cache_reruns_random_stages():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select, Lambda
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for shared in (False, True):
+        raw_iter = KittiRaw(frame_cache_bytes=1 << 30, frame_cache_shared=shared, transform=[
+            Lambda('noise', lambda image: rng.random(), inputs=['image_02']),
+            Lambda('image_02', lambda image: np.add(image, 1, out=image)), # must not reach the cached frame
+            Select('noise', 'image_02'),
+        ])
+        first, second = raw_iter[0], raw_iter[0]
+        assert raw_iter.frame_cache.stats()['hits'] == 1
+        assert first['noise'] != second['noise']
+        assert np.array_equal(first['image_02'], second['image_02'])
+        assert 'noise' not in raw_iter.frame_cache.get(0)
+
+
+def test_shared_frame_cache_field_accounting():
+    from kitti_iterator.frame_cache import SharedFrameCache
+    import numpy as np
+    cache = SharedFrameCache(max_bytes=2500)
+    cache.put(0, {'image': np.zeros(1000, dtype=np.uint8)})
+    cache.put(0, {'image': np.zeros(1000, dtype=np.uint8)}) # overwritten, counted once
+    cache.put(1, {'depth': np.zeros(1000, dtype=np.uint8)})
+    assert cache.stats()['field_nbytes'] == {'image': 1000, 'depth': 1000}
+    cache.put(2, {'depth': np.zeros(1000, dtype=np.uint8)}) # evicts 0
+    assert cache.get(0) is None
+    assert cache.stats()['field_nbytes'] == {'depth': 2000}
+    cache.clear()
+    assert cache.stats()['field_nbytes'] == dict() and len(cache) == 0
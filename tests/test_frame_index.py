@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def test_frame_id_index():
+    from kitti_iterator.frame_index import FrameIdIndex, CollectionFrameIndex
+    raw_ids = list(map(lambda i: "%010d" % i, range(6)))
+    index = FrameIdIndex(raw_ids, raw_ids[1:5], {'02': raw_ids[1:5], '03': raw_ids[2:5]})
+    assert index.raw_to_depth.tolist() == [-1, 0, 1, 2, 3, -1]
+    assert index.depth_to_raw.tolist() == [1, 2, 3, 4]
+    assert index.has_depth(['02', '03']).tolist() == [False, False, True, True, True, False]
+
+    collection = CollectionFrameIndex([index, FrameIdIndex(raw_ids[:3], raw_ids[:2])])
+    assert collection.drive.tolist() == [0] * 6 + [1] * 3
+    assert collection.raw_frames().tolist() == [1, 2, 3, 4, 6, 7]
+    assert collection.raw_frames(has_depth=False).tolist() == [0, 5, 8]
+    assert collection.raw_to_depth[collection.depth_to_raw].tolist() == list(range(6))
+    assert collection.depth_frames(['02']).tolist() == list(range(6))
+
+
+def test_kitti_depth_frame_index():
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.frame_index import get_frame_index
+    dataset = KittiDepth(kitti_depth_base_path="kitti_depth_mini", kitti_raw_base_path="kitti_raw_mini")
+    for depth_index, id in enumerate(dataset.img_list):
+        raw_index = dataset.raw_frame_position(depth_index)
+        assert dataset.raw_img_list[raw_index] == id
+        assert dataset.depth_frame_position(raw_index) == depth_index
+    assert dataset.depth_frame_position(0) == -1
+
+    collection = get_frame_index([dataset, dataset])
+    assert len(collection.raw_frames(cameras=['02', '03'])) == 2 * len(dataset)
@@ -0,0 +1,34 @@
+def test_frame_stats_table(kitti_raw_tmp, kitti_depth_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.frame_stats import get_frame_stats, FRAME_STATS
+    from kitti_iterator.sampler import DistributedDriveSampler
+    import os
+    import numpy as np
+    raw = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, grid_size=(40.0, 40.0, 8.0), scale=2.0)
+    depth = KittiDepth(kitti_depth_base_path=kitti_depth_tmp, kitti_raw_base_path=kitti_raw_tmp,
+        grid_size=(40.0, 40.0, 8.0), scale=2.0)
+    table = get_frame_stats([raw, depth], num_workers=2)
+    assert len(table) == len(raw) + len(depth)
+    assert np.array_equal(table['drive'], np.repeat([0, 1], [len(raw), len(depth)]))
+
+    # Depth frame 0 is raw frame 5, which has no OXTS packet in the mini drive
+    offset = len(raw)
+    assert np.array_equal(table['point_count'][[0, offset]],
+        [len(raw.load_velodyne_points(0)), len(raw.load_velodyne_points(5))])
+    assert table['occupied_voxels'][0] == raw[0]['occupancy_grid'].sum()
+    assert np.all(table['points_in_grid'] <= table['point_count'])
+    assert np.all((0 < table['ground_fraction']) & (table['ground_fraction'] < 1))
+    assert np.isfinite(table['speed'][0]) and np.isnan(table['speed'][offset])
+
+    # Cached next to the drive
+    paths = list(map(lambda store: store.path, table.stores))
+    mtimes = list(map(lambda path: os.path.getmtime(os.path.join(path, "header.json")), paths))
+    again = get_frame_stats([raw, depth], num_workers=0)
+    assert mtimes == list(map(lambda path: os.path.getmtime(os.path.join(path, "header.json")), paths))
+    for name in FRAME_STATS:
+        assert np.array_equal(again[name], table[name], equal_nan=True)
+
+    selected = table.indices(table['speed'] > 0)
+    sampler = DistributedDriveSampler([raw, depth], num_replicas=1, rank=0, indices=selected)
+    assert sorted(sampler) == selected.tolist()
@@ -0,0 +1,23 @@
+def test_gray_cameras_stay_single_channel():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    import numpy as np
+    fields = ('image_00', 'image_00_raw', 'image_01', 'image_02')
+    gray = KittiRaw(transform=[Select(*fields)])[0]
+    bgr = KittiRaw(transform=[Select(*fields)], gray_cameras_bgr=True)[0]
+
+    assert gray['image_00_raw'].ndim == gray['image_00'].ndim == gray['image_01'].ndim == 2
+    assert gray['image_02'].ndim == 3
+    assert bgr['image_00_raw'].shape == gray['image_00_raw'].shape + (3,)
+    assert bgr['image_00'].shape == gray['image_00'].shape + (3,)
+
+    # The PNGs are gray, the 3-channel layout only repeats the channel
+    assert np.array_equal(bgr['image_00_raw'][:, :, 1], gray['image_00_raw'])
+    assert np.array_equal(bgr['image_00'][:, :, 1], gray['image_00'])
+
+
+def test_gray_cameras_tensor_output():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    data = KittiRaw(transform=[Select('image_00', 'image_00_raw')], output_format='tensor')[0]
+    assert data['image_00'].shape[0] == data['image_00_raw'].shape[0] == 1
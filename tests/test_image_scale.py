@@ -0,0 +1,80 @@
+def test_half_resolution_matches_resized_full_resolution():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select, Crop
+    import cv2
+    import numpy as np
+    fields = ('image_02', 'image_02_raw', 'roi_02', 'K_02', 'depth_image_02')
+    full = KittiRaw(grid_size=(40.0, 40.0, 8.0), scale=2.0, transform=[Select(*fields)])
+    half = KittiRaw(grid_size=(40.0, 40.0, 8.0), scale=2.0, transform=[Select(*fields)], image_scale=0.5)
+    full_data, half_data = full[0], half[0]
+
+    h, w = full_data['image_02_raw'].shape[:2]
+    assert half_data['image_02_raw'].shape[:2] == (h // 2, w // 2)
+    x, y, roi_w, roi_h = half_data['roi_02']
+    assert half_data['image_02'].shape[:2] == (roi_h, roi_w)
+    assert abs(roi_w - full_data['roi_02'][2] / 2) <= 1 and abs(roi_h - full_data['roi_02'][3] / 2) <= 1
+
+    # Undistorting the reduced decode is close to shrinking the full resolution output
+    resized = cv2.resize(full_data['image_02'], (roi_w, roi_h), interpolation=cv2.INTER_AREA)
+    difference = np.abs(resized.astype(np.float32) - half_data['image_02'].astype(np.float32))
+    assert np.median(difference) <= 3.0 and difference.mean() < 8.0
+
+    # Crop boxes are in reduced pixels and still folded into the remap tables
+    cropped = KittiRaw(transform=[Select('image_02'), Crop('image_02', (10, 20, 100, 50))], image_scale=0.5)[0]
+    assert np.array_equal(cropped['image_02'], half_data['image_02'][20:70, 10:110])
+
+    # Intrinsics follow the image: pixel centres of the full image map to pixel centres of the half one
+    K, K_half = full_data['K_02'], half_data['K_02']
+    assert np.allclose(K_half[0, 0], K[0, 0] / 2) and np.allclose(K_half[0, 2], (K[0, 2] + 0.5) / 2 - 0.5)
+
+    # LiDAR projections are rendered at the reduced resolution
+    depth_full, depth_half = full_data['depth_image_02'], half_data['depth_image_02']
+    assert depth_half.shape[:2] == (h // 2, w // 2)
+    rows, cols = np.nonzero(depth_half[:, :, 0])
+    assert len(rows) > 0
+    full_rows, full_cols = np.nonzero(depth_full[:, :, 0])
+    assert abs(rows.mean() * 2 - full_rows.mean()) < 4 and abs(cols.mean() * 2 - full_cols.mean()) < 4
+
+
+def test_reduced_disparity_scales_with_image():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    import numpy as np
+    fields = ('disparity', 'disparity_mask', 'image_02_raw')
+    full = KittiRaw(stereo_disparity=True, transform=[Select(*fields)])[0]
+    quarter = KittiRaw(stereo_disparity=True, transform=[Select(*fields)], image_scale=0.25)[0]
+    assert quarter['disparity'].shape == quarter['image_02_raw'].shape[:2]
+    assert np.isclose(np.median(quarter['disparity'][quarter['disparity_mask']]) * 4,
+        np.median(full['disparity'][full['disparity_mask']]), rtol=0.1)
+
+
+def test_reduced_depth_ground_truth(kitti_depth_tmp):
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.disparity import stereo_baseline
+    from kitti_iterator.transforms import Select
+    import numpy as np
+    kwargs = dict(kitti_depth_base_path=kitti_depth_tmp, kitti_raw_base_path="kitti_raw_mini",
+        grid_size=(40.0, 40.0, 8.0), scale=2.0, stereo_disparity=True)
+    fields = ('image_02_raw', 'depth_image_02', 'occupancy_grid', 'disparity', 'disparity_mask')
+    full = KittiDepth(transform=[Select(*fields)], **kwargs)[0]
+    half = KittiDepth(transform=[Select(*fields)], image_scale=0.5, **kwargs)[0]
+    sparse = KittiDepth(transform=[Select('depth_sparse_02')], image_scale=0.5, sparse_depth=True, **kwargs)[0]
+
+    shape = half['image_02_raw'].shape[:2]
+    assert half['depth_image_02'].shape[:2] == shape and tuple(sparse['depth_sparse_02']['shape']) == shape
+    assert half['disparity'].shape == shape
+    # Pooled, not interpolated: about a quarter of the valid pixels, only depths of the full map
+    valid_full = np.count_nonzero(full['depth_image_02'][:, :, 0])
+    valid_half = np.count_nonzero(half['depth_image_02'][:, :, 0])
+    assert valid_full / 4 < valid_half < valid_full
+    assert np.array_equal(half['depth_image_02'][:, :, 0].ravel()[sparse['depth_sparse_02']['indices']],
+        sparse['depth_sparse_02']['depth'].astype(np.uint8))
+    assert np.array_equal(half['occupancy_grid'], full['occupancy_grid'])
+
+    # Aligned with the LiDAR disparity rendered at the reduced resolution
+    depth_gt = np.zeros(shape, dtype=np.float32)
+    depth_gt.ravel()[sparse['depth_sparse_02']['indices']] = sparse['depth_sparse_02']['depth']
+    both = half['disparity_mask'] & (depth_gt > 0)
+    depth = 0.5 * stereo_baseline(KittiDepth(**kwargs).calib_cam_to_cam) / half['disparity'][both]
+    assert both.sum() > 0.3 * half['disparity_mask'].sum()
+    assert np.median(np.abs(depth - depth_gt[both]) / depth_gt[both]) < 0.02
@@ -0,0 +1,20 @@
+IMPORT_TIME_BUDGET = 1.0 # seconds, numpy included
+HEAVY_MODULES = ('torch', 'cv2', 'pandas', 'scipy', 'yaml', 'tqdm', 'open3d')
+
+def test_import_time_budget():
+    import subprocess
+    import sys
+    code = "\n".join([
+        "import sys, time",
+        "start_time = time.perf_counter()",
+        "import kitti_iterator.kitti_raw_iterator, kitti_iterator.kitti_depth_iterator",
+        "import_time = time.perf_counter() - start_time",
+        "kitti_tree = kitti_iterator.kitti_raw_iterator.get_kitti_tree('kitti_raw_mini')",
+        "assert kitti_tree == {'2011_09_26': ['2011_09_26_drive_0001_sync']}, kitti_tree",
+        "print(import_time)",
+        "print(' '.join(m for m in " + repr(HEAVY_MODULES) + " if m in sys.modules))",
+    ])
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    import_time, loaded = output.split("\n")[:2]
+    assert loaded == "", "heavy modules imported eagerly: " + loaded
+    assert float(import_time) < IMPORT_TIME_BUDGET, import_time
@@ -0,0 +1,52 @@
+def test_pickled_state_is_slim(kitti_raw_tmp):
+    from kitti_iterator import kitti_raw_iterator
+    from kitti_iterator.calibration import get_calibration
+    import pickle
+    import numpy as np
+    raw_iter = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp, ground_removal=True,
+        grid_size=(40.0, 40.0, 8.0), scale=2.0)
+    before = len(pickle.dumps(raw_iter))
+    expected = raw_iter[0]
+    after = len(pickle.dumps(raw_iter))
+    assert after == before and after < 64 * 1024, (before, after)
+
+    worker_iter = pickle.loads(pickle.dumps(raw_iter))
+    assert worker_iter.calibration is get_calibration(raw_iter.kitti_raw_path)
+    assert worker_iter.roi_02 == raw_iter.roi_02 and worker_iter.x_02 == raw_iter.x_02
+    data = worker_iter[0]
+    for key in ('image_02', 'occupancy_grid', 'velodyine_points'):
+        assert np.array_equal(data[key], expected[key]), key
+
+
+def test_pickled_depth_state(kitti_depth_tmp):
+    from kitti_iterator import kitti_depth_iterator
+    import pickle
+    import numpy as np
+    depth_iter = kitti_depth_iterator.KittiDepth(kitti_depth_base_path=kitti_depth_tmp,
+        kitti_raw_base_path="kitti_raw_mini", sparse_depth=True)
+    expected = depth_iter[0]
+    payload = pickle.dumps(depth_iter)
+    store = depth_iter.sparse_depth_stores['02']
+    assert len(payload) < store.indices.nbytes
+    worker_iter = pickle.loads(payload)
+    assert isinstance(worker_iter.sparse_depth_stores['02'].indices, np.memmap)
+    data = worker_iter[0]
+    assert np.array_equal(data['depth_sparse_02']['depth'], expected['depth_sparse_02']['depth'])
+
+
+def test_dataloader_workers_end_to_end(kitti_raw_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select
+    from torch.utils.data import DataLoader
+    import numpy as np
+    dataset = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, grid_size=(40.0, 40.0, 8.0), scale=2.0,
+        transform=[Select('image_02', 'K_02', 'calib_velo_to_cam', 'occupancy_grid')])
+    expected = list(map(dataset.__getitem__, range(4)))
+    # fork shares the dataset with the workers, spawn sends them its pickled state
+    for context in ('fork', 'spawn'):
+        loader = DataLoader(dataset, batch_size=None, num_workers=2, timeout=120,
+            sampler=range(4), multiprocessing_context=context)
+        for data, reference in zip(loader, expected):
+            for key in ('image_02', 'K_02', 'occupancy_grid'):
+                assert np.array_equal(data[key].numpy(), reference[key]), (context, key)
+            assert np.allclose(data['calib_velo_to_cam']['R'].numpy(), reference['calib_velo_to_cam']['R'])
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def test_spherical_projection():
+    from kitti_iterator.range_image import spherical_projection
+    points = np.array([
+        [10.0, 0.0, 0.0, 0.1],
+        [5.0, 0.0, 0.0, 0.2],   # same pixel as the first one but nearer
+        [0.0, 10.0, 0.0, 0.3],  # yaw 90, left edge of a (-90, 90) field of view
+        [-10.0, 0.0, 0.0, 0.4], # behind the sensor
+    ], dtype=np.float32)
+    projection = spherical_projection(points, v_fov=(-10, 10), h_fov=(-90, 90), height=4, width=8)
+    range_image, mask = projection['range_image'], projection['mask']
+    assert range_image.shape == (5, 4, 8) and mask.sum() == 2
+    assert projection['pixel_index'].tolist()[:2] == [2 * 8 + 4] * 2
+    assert projection['pixel_index'][3] == -1
+    np.testing.assert_allclose(range_image[:, 2, 4], [5.0, 5.0, 0.0, 0.0, 0.2])
+    assert projection['point_index'][2, 4] == 1
+    assert projection['pixel_index'][2] == 2 * 8 + 0
+
+
+def test_range_image_output(kitti_raw_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    dataset = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, range_image_shape=(64, 1024))
+    scan = dataset.read_velodyne_points(dataset.img_list[0])
+    data = dataset.transform_points_to_range_image(scan)
+    kept = data['range_point_index'][data['range_mask']]
+    np.testing.assert_allclose(data['range_image'][0][data['range_mask']], np.linalg.norm(scan[kept, :3], axis=1), rtol=1e-5)
+    assert data['range_mask'].mean() > 0.3
+    visible = data['range_pixel_index'] >= 0
+    assert np.all(data['range_mask'].reshape(-1)[data['range_pixel_index'][visible]])
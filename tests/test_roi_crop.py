@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def test_roi_crop_keeps_grid_outputs(kitti_raw_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw, h_fov
+    from kitti_iterator.helper import in_h_range_points
+    dataset = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, grid_size=(40.0, 40.0, 8.0), scale=2.0, roi_crop='fov')
+    scan = dataset.read_velodyne_points(dataset.img_list[0])
+    cropped = dataset.load_velodyne_points(0)
+    np.testing.assert_array_equal(cropped, scan[in_h_range_points(scan, scan[:, 0], scan[:, 1], h_fov)])
+
+    dataset.roi_crop = ['fov', 'grid']
+    cropped = dataset.load_velodyne_points(0)
+    assert len(cropped) < len(scan) / 2
+    full = dataset.transform_points_to_occupancy_grid(scan[:, :3])
+    crop = dataset.transform_points_to_occupancy_grid(cropped[:, :3])
+    for key in full:
+        np.testing.assert_array_equal(full[key], crop[key])
+
+    # The BEV raster is not FOV limited, the grid box alone leaves it unchanged
+    dataset.roi_crop = ['grid']
+    np.testing.assert_array_equal(dataset.transform_points_to_bev(scan[::7]), dataset.transform_points_to_bev(
+        dataset.crop_velodyne_points(scan[::7])))
+
+
+def test_roi_crop_mixed_stages():
+    from kitti_iterator.kitti_raw_iterator import KittiRaw, is_velodyne_bounds
+    bounds = ((0, 30), (-10, 10), (-3, 3))
+    assert is_velodyne_bounds(bounds) and is_velodyne_bounds(np.array(bounds, dtype=float))
+    assert not is_velodyne_bounds(['fov', 'grid', bounds]) and not is_velodyne_bounds(['fov', bounds])
+
+    assert KittiRaw(roi_crop=bounds).roi_crop == [bounds]
+    dataset = KittiRaw(grid_size=(40.0, 40.0, 8.0), scale=2.0, roi_crop=['fov', 'grid', bounds])
+    assert dataset.roi_crop == ['fov', 'grid', bounds]
+    points = dataset.load_velodyne_points(0)
+    x, y, z = points[:, :3].T
+    assert len(points) > 0 and x.max() <= 30 and abs(y).max() <= 10 and abs(z).max() <= 3
+    dataset.roi_crop = ['fov', 'grid']
+    assert len(points) < len(dataset.load_velodyne_points(0))
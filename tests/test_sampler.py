@@ -0,0 +1,35 @@
+def test_distributed_drive_sampler_balanced():
+    from kitti_iterator.sampler import DistributedDriveSampler
+    import numpy as np
+    lengths = [30, 1100, 77, 250, 8]
+    num_replicas = 4
+    samplers = [
+        DistributedDriveSampler(lengths, num_replicas=num_replicas, rank=rank, seed=3, chunk_size=50)
+        for rank in range(num_replicas)
+    ]
+    for sampler in samplers:
+        sampler.set_epoch(2)
+    shards = [sampler.indices() for sampler in samplers]
+    assert all(map(lambda shard: len(shard) == len(samplers[0]), shards))
+    merged = np.concatenate(shards)
+    assert set(merged.tolist()) == set(range(sum(lengths)))
+    assert len(merged) - sum(lengths) < num_replicas
+
+    # Runs of consecutive frames: few jumps per rank
+    for shard in shards:
+        assert np.count_nonzero(np.diff(shard) != 1) <= len(shard) // 25 + 1
+
+    # Same epoch, same order; a new epoch reshuffles
+    assert np.array_equal(DistributedDriveSampler(lengths, 4, 1, seed=3, chunk_size=50, drop_last=False).indices(),
+        DistributedDriveSampler(lengths, 4, 1, seed=3, chunk_size=50).indices())
+    samplers[1].set_epoch(3)
+    assert not np.array_equal(samplers[1].indices(), shards[1])
+
+
+def test_distributed_drive_sampler_drop_last():
+    from kitti_iterator.sampler import DistributedDriveSampler
+    import numpy as np
+    samplers = [DistributedDriveSampler([5, 6], num_replicas=3, rank=rank, shuffle=False, chunk_size=4, drop_last=True)
+        for rank in range(3)]
+    shards = list(map(lambda sampler: list(sampler), samplers))
+    assert shards == [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+
+
+def test_sparse_depth_store(kitti_depth_tmp):
+    from kitti_iterator.kitti_depth_iterator import KittiDepth
+    from kitti_iterator.sparse_depth import decode_depth_png, densify_depth, open_sparse_depth_store
+    dataset = KittiDepth(
+        kitti_depth_base_path=kitti_depth_tmp,
+        kitti_raw_base_path="kitti_raw_mini",
+        sparse_depth=True,
+    )
+    store = dataset.sparse_depth_stores['02']
+    assert len(store) == len(dataset) == 5
+
+    png_path = os.path.join(dataset.depth_02_path, dataset.img_list[1] + ".png")
+    dense = decode_depth_png(png_path)
+    sparse = store[1]
+    assert sparse['depth'].dtype == np.float32
+    assert sparse['depth'].nbytes + sparse['indices'].nbytes < dense.nbytes / 2
+    np.testing.assert_array_equal(densify_depth(sparse), dense)
+
+    # Reopening reuses the packed store, a different frame set rebuilds it
+    pngs = list(map(lambda id: os.path.join(dataset.depth_02_path, id + ".png"), dataset.img_list))
+    assert open_sparse_depth_store(store.path, pngs).header == store.header
+    rebuilt = open_sparse_depth_store(store.path, pngs[1:])
+    assert len(rebuilt) == 4
+    np.testing.assert_array_equal(rebuilt[0]['indices'], sparse['indices'])
+
+    data = dataset.load_frame(1)
+    assert 'depth_image_02' not in data
+    np.testing.assert_array_equal(data['depth_sparse_02']['indices'], sparse['indices'])
+    assert data['occupancy_grid'].shape == tuple(dataset.occupancy_shape)
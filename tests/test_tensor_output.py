@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def test_tensor_output(kitti_raw_tmp):
+    import torch
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Select, Resize
+    numpy_data = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, transform=[Select('image_02', 'image_03_raw', 'K_02')])[0]
+    dataset = KittiRaw(
+        kitti_raw_base_path=kitti_raw_tmp, transform=[Select('image_02', 'image_03_raw', 'K_02')],
+        output_format='tensor', tensor_dtype='float32', tensor_scale=1/255, tensor_rgb=True, pinned_pool_size=2
+    )
+    data = dataset[0]
+    image = data['image_02']
+    assert isinstance(image, torch.Tensor) and image.dtype == torch.float32 and image.is_contiguous()
+    # Float remapping skips the uint8 rounding of the numpy path
+    np.testing.assert_allclose(image.numpy(), numpy_data['image_02'].transpose(2, 0, 1)[::-1] / 255, atol=1/255)
+    np.testing.assert_allclose(data['image_03_raw'].numpy(), numpy_data['image_03_raw'].transpose(2, 0, 1)[::-1] / 255, atol=1e-6)
+    assert isinstance(data['K_02'], torch.Tensor)
+
+    # The pool hands a buffer out again after pinned_pool_size samples once nothing holds it
+    pointer = image.data_ptr()
+    del data, image
+    assert dataset[1]['image_02'].data_ptr() != pointer
+    assert dataset[2]['image_02'].data_ptr() == pointer
+
+    uint8 = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, output_format='tensor',
+        transform=[Resize('image_02', (300, 80)), Select('image_02')])[0]['image_02']
+    assert uint8.shape == (3, 80, 300) and uint8.dtype == torch.uint8
+
+
+def test_pinned_pool_wrap_around_keeps_held_buffers():
+    import torch
+    from kitti_iterator.tensor_output import PinnedBufferPool
+    pool = PinnedBufferPool(size=2)
+    first = pool.acquire((4,), torch.float32)
+    first.fill_(1.0)
+    pool.acquire((4,), torch.float32)
+    third = pool.acquire((4,), torch.float32) # ring wraps onto first, which is still held
+    third.fill_(3.0)
+    assert third.data_ptr() != first.data_ptr() and torch.all(first == 1.0)
+    assert pool.reallocations == 1
+
+    pointer = third.data_ptr()
+    del first, third
+    pool.acquire((4,), torch.float32)
+    assert pool.acquire((4,), torch.float32).data_ptr() == pointer # released, reused
+    assert pool.reallocations == 1
+
+
+def test_pinned_pool_does_not_pin_in_workers(monkeypatch):
+    import torch
+    import torch.utils.data
+    from kitti_iterator.tensor_output import PinnedBufferPool
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    monkeypatch.setattr(torch.utils.data, "get_worker_info", lambda: object())
+    assert not PinnedBufferPool(size=1).acquire((4,), torch.float32).is_pinned()
+
+
+def test_pinned_pool_keeps_buffers_shared_through_views():
+    import torch
+    from kitti_iterator.tensor_output import PinnedBufferPool
+    pool = PinnedBufferPool(size=1)
+    for hold in (lambda buffer: buffer.numpy(), lambda buffer: buffer[1:]):
+        buffer = pool.acquire((4,), torch.float32)
+        buffer.fill_(1.0)
+        view = hold(buffer)
+        del buffer
+        reallocations = pool.reallocations
+        pool.acquire((4,), torch.float32).fill_(9.0)
+        assert (view == 1.0).all() and pool.reallocations == reallocations + 1
+
+    # Once the views are gone the buffer goes back to the ring
+    buffer = pool.acquire((4,), torch.float32)
+    address, reallocations = buffer.data_ptr(), pool.reallocations
+    view = buffer.numpy()
+    del view, buffer
+    assert pool.acquire((4,), torch.float32).data_ptr() == address and pool.reallocations == reallocations
@@ -0,0 +1,108 @@
+import os
+
+from kitti_iterator.file_source import LocalFileSource
+
+
+def test_trajectory_store_resume(tmp_path):
+    from kitti_iterator.trajectory import TrajectoryStore
+    import numpy as np
+    path = str(tmp_path / "2011_09_26_drive_0001_sync")
+    store = TrajectoryStore.create(path, 4, {'scale_factor': 1.0})
+    for index in range(2):
+        store.write(index, [index, 0.0, 0.0], np.eye(3))
+    store.checkpoint(2)
+    store.write(2, [2.0, 0.0, 0.0], np.eye(3)) # not counted: never checkpointed
+    del store
+
+    store = TrajectoryStore(path)
+    assert TrajectoryStore.exists(path)
+    assert store.tracked == 2 and not store.complete
+    assert store.params == {'scale_factor': 1.0}
+    assert isinstance(store.positions, np.memmap)
+    position, rotation = store.get_pose(1)
+    assert np.allclose(position, [1.0, 0.0, 0.0])
+    assert np.allclose(rotation, np.eye(3))
+    assert np.allclose(store['x'][:2], [0.0, 1.0])
+
+
+def write_trajectory_cache(kitti_raw_base_path, num_features=5000):
+    from kitti_iterator import kitti_raw_iterator
+    from kitti_iterator.trajectory import TrajectoryStore, trajectory_params, trajectory_key
+    import os
+    import numpy as np
+    img_list = sorted(map(lambda x: x.split(".png")[0], os.listdir(os.path.join(
+        kitti_raw_base_path, "2011_09_26", "2011_09_26_drive_0001_sync", "image_00", "data"))))
+    params = trajectory_params(img_list, 1.0, num_features, "LK_SHI_TOMASI")
+    path = os.path.join(kitti_raw_base_path, "2011_09_26", "2011_09_26_drive_0001_sync",
+        kitti_raw_iterator.TRAJECTORY_CACHE_DIR, "2011_09_26_drive_0001_sync_" + trajectory_key(params))
+    store = TrajectoryStore.create(path, len(img_list), params)
+    for index in range(len(img_list)):
+        store.write(index, [0.0, 0.0, float(index)], np.eye(3))
+    store.checkpoint(len(img_list))
+    return len(img_list)
+
+
+def test_trajectory_cache_validation(kitti_raw_tmp, monkeypatch):
+    from kitti_iterator import kitti_raw_iterator
+    import numpy as np
+    frame_count = write_trajectory_cache(kitti_raw_tmp)
+
+    computed = []
+    monkeypatch.setattr(kitti_raw_iterator.KittiRaw, "compute_slam", lambda self, *args, **kwargs: computed.append(args))
+
+    # Valid cache: loaded as is, the tracker is never touched
+    raw_iter = kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp, compute_trajectory=True)
+    assert computed == []
+    assert np.allclose(raw_iter.trajectory['z'], np.arange(frame_count))
+
+    # Different tracker parameters: recomputed
+    kitti_raw_iterator.KittiRaw(kitti_raw_base_path=kitti_raw_tmp, compute_trajectory=True, num_features=2000)
+    assert len(computed) == 1
+
+
+class CrashingSource(LocalFileSource):
+    # Kills the worker process of drive 9998 outright, as a segfault would
+    def listdir(self, path):
+        if "drive_9998" in path:
+            os._exit(1)
+        return super().listdir(path)
+
+
+def test_precompute_trajectories_survives_crashed_workers(kitti_raw_tmp):
+    from kitti_iterator import kitti_raw_iterator
+    write_trajectory_cache(kitti_raw_tmp)
+    os.makedirs(os.path.join(kitti_raw_tmp, "2011_09_26", "2011_09_26_drive_9998_sync", "image_00", "data"))
+    results = kitti_raw_iterator.precompute_trajectories(
+        kitti_raw_tmp,
+        num_workers=2,
+        file_source=CrashingSource(),
+    )
+    assert results[("2011_09_26", "2011_09_26_drive_0001_sync")] is None
+    assert "crashed" in results[("2011_09_26", "2011_09_26_drive_9998_sync")]
+
+
+def test_precompute_trajectories_isolates_failures(kitti_raw_tmp):
+    from kitti_iterator import kitti_raw_iterator
+    write_trajectory_cache(kitti_raw_tmp)
+    results = kitti_raw_iterator.precompute_trajectories(
+        kitti_raw_tmp,
+        num_workers=2,
+        kitti_tree={"2011_09_26": ["2011_09_26_drive_0001_sync", "2011_09_26_drive_9999_sync"]},
+    )
+    assert results[("2011_09_26", "2011_09_26_drive_0001_sync")] is None
+    assert "2011_09_26_drive_9999_sync" in results[("2011_09_26", "2011_09_26_drive_9999_sync")]
+
+
+def test_prune_stale_trajectories(kitti_raw_tmp):
+    from kitti_iterator import kitti_raw_iterator
+    from kitti_iterator.trajectory import prune_stale_trajectories
+    import os
+    cache = os.path.join(kitti_raw_tmp, "2011_09_26", "2011_09_26_drive_0001_sync", kitti_raw_iterator.TRAJECTORY_CACHE_DIR)
+    write_trajectory_cache(kitti_raw_tmp, num_features=2000)
+    old = set(os.listdir(cache))
+    write_trajectory_cache(kitti_raw_tmp, num_features=5000)
+    new, = set(os.listdir(cache)) - old
+    os.makedirs(os.path.join(cache, "2011_09_26_drive_0002_sync_0123456789ab")) # another drive, kept
+
+    prune_stale_trajectories(os.path.join(cache, new))
+    assert sorted(os.listdir(cache)) == sorted([new, "2011_09_26_drive_0002_sync_0123456789ab"])
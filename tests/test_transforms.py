@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def test_transform_plan():
+    from kitti_iterator.transforms import Compose, Lambda, Select, Resize, Cast, Grayscale
+    pipeline = Compose([
+        Grayscale('image_02'),
+        Resize('image_02', (64, 32)),
+        Lambda('image_03', lambda image: image[::2], inputs=['image_02']), # overwrites image_03
+        Cast('image_02', np.float32, scale=1/255),
+        Select('image_02', 'image_03', 'K_02'),
+        Lambda('image_02', lambda batch: batch * 2, per_batch=True),
+    ])
+    required, decode_ops, stages = pipeline.plan(['image_02', 'image_03', 'K_02', 'velodyine_points'], ['image_02', 'image_03'])
+    assert required == {'image_02', 'K_02'}
+    # The Lambda reading image_02 blocks pushing the later Cast into decoding
+    assert list(map(type, decode_ops['image_02'])) == [Grayscale, Resize]
+    assert list(map(type, stages)) == [Lambda, Cast, Select]
+
+
+def test_pipeline_pushdown(kitti_raw_tmp):
+    from kitti_iterator.kitti_raw_iterator import KittiRaw
+    from kitti_iterator.transforms import Crop, Resize, Cast, Select
+    dataset = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, transform=[
+        Crop('image_02', (100, 50, 800, 200)),
+        Resize('image_02', (400, 100)),
+        Cast('image_02', np.float32, scale=1/255),
+        Select('image_02', 'K_02'),
+    ])
+    def no_lidar(index):
+        raise AssertionError("LiDAR is not needed by the pipeline")
+    dataset.load_velodyne_points = no_lidar
+
+    data = dataset[0]
+    assert sorted(data) == ['K_02', 'image_02']
+    assert data['image_02'].shape == (100, 400, 3) and data['image_02'].dtype == np.float32
+
+    # Folding crop and resize into the undistortion matches undistorting at full resolution
+    full = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, transform=[Select('image_02')])[0]['image_02']
+    reference = full[50:250, 100:900].reshape(100, 2, 400, 2, 3).mean(axis=(1, 3)) / 255
+    assert np.abs(data['image_02'] - reference).mean() < 0.02
+
+    legacy = KittiRaw(kitti_raw_base_path=kitti_raw_tmp, transform={'image_02': lambda image: image[:10]})
+    assert 'image_02' in legacy.field_plan[0] and 'velodyine_points' in legacy.field_plan[0]